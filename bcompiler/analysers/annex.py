@@ -1,14 +1,20 @@
+import collections
 import datetime
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
 
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import Font, Alignment, Border, Side
 from openpyxl.styles.colors import Color
 from openpyxl.styles.fills import PatternFill
 
-from .utils import MASTER_XLSX, logger, get_number_of_projects, project_titles_in_master
-from ..utils import ROOT_PATH, runtime_config, CONFIG_FILE, project_data_from_master
+from .utils import MASTER_XLSX, logger, project_titles_in_master
+from ..core.cache import cached_project_data
+from ..process.cleansers import clean_many
+from ..utils import ROOT_PATH, runtime_config, CONFIG_FILE
 
 runtime_config.read(CONFIG_FILE)
 
@@ -34,6 +40,40 @@ fg_colour_map = {
 }
 
 
+# keys in column A of the master for the values shown on an annex; the project
+# name comes from the title row
+ANNEX_KEYS = collections.OrderedDict([
+    ('SRO_name', 'SRO Full Name'),
+    ('WLC_value', 'Total Forecast'),
+    ('project_stage', 'BICC approval point'),
+    ('SRO_conf', 'Departmental DCA'),
+    ('SoP', 'Project MM20 Forecast - Actual'),
+    ('ipa_rag', 'GMPP - IPA DCA'),
+    ('finance_DCA', 'SRO Finance confidence'),
+    ('benefits_DCA', 'SRO Benefits RAG'),
+    ('SRO_Comm', 'Departmental DCA Narrative'),
+])
+
+AnnexData = collections.namedtuple('AnnexData', ['project_name'] + list(ANNEX_KEYS))
+
+
+def annex_key_rows(keys: Iterable) -> Dict[str, Optional[int]]:
+    """
+    Resolves ANNEX_KEYS to master rows, given the keys in column A of the
+    master in row order. Returns {field: row}; the first row with a key is
+    used, and a key that is not in the master gives None.
+    """
+    index = {}
+    for row, key in enumerate(clean_many(keys), start=1):
+        index.setdefault(key, row)
+    rows = {}
+    for field, key in ANNEX_KEYS.items():
+        rows[field] = index.get(key)
+        if rows[field] is None:
+            logger.warning(f"Cannot find {key} in the master. It will be left blank in the annexes.")
+    return rows
+
+
 def abbreviate_project_stage(stage: str):
     if stage == "Outline Business Case":
         return "OBC"
@@ -53,10 +93,45 @@ def process_master(source_wb, project_number, dca_map, diff: list):
      the workbook from the function, along with the project name which is used
      to name the file. d_map is a dict of DCA values for each project
     """
+    ws2 = source_wb.active
+    key_rows = annex_key_rows(cell.value for cell in ws2['A'])
+    data = AnnexData(ws2.cell(row=1, column=project_number).value,
+                     *[ws2.cell(row=row, column=project_number).value if row else None
+                       for row in key_rows.values()])
+    if data.project_name in diff:
+        dca_last_quarter = None
+    else:
+        dca_last_quarter = dca_map[data.project_name]
+    return build_annex(data, dca_last_quarter), data.project_name
 
+
+def annex_data(master: str) -> List[AnnexData]:
+    """
+    The values needed for every project's annex, read from master in a single
+    pass. The rows for ANNEX_KEYS are found from column A, then each project's
+    values are taken from those rows.
+    """
+    wb = load_workbook(master, read_only=True)
+    rows = list(wb.active.iter_rows(values_only=True))
+    wb.close()
+    key_rows = annex_key_rows(values[0] if values else None for values in rows)
+    wanted = [rows[0]] + [rows[row - 1] if row else () for row in key_rows.values()]
+
+    # as get_number_of_projects(), count the titles then take that many columns from B
+    project_count = len([title for title in rows[0][1:] if title is not None])
+
+    return [AnnexData(*[values[col - 1] if col <= len(values) else None for values in wanted])
+            for col in range(2, project_count + 2)]
+
+
+def build_annex(data: AnnexData, dca_last_quarter=None):
+    """
+    Creates a new workbook and populates it with a project's annex: data from
+    the master and dca_last_quarter, the project's Departmental DCA from the
+    comparison master.
+    """
     wb = Workbook()
     sheet = wb.active
-    ws2 = source_wb.active
 
     al = Alignment(horizontal="left", vertical="top", wrap_text=True,
                    shrink_to_fit=True)
@@ -82,19 +157,19 @@ def process_master(source_wb, project_number, dca_map, diff: list):
 
     bold18Font = Font(size=18, bold=True)
 
-    project_name = ws2.cell(row=1, column=project_number).value
-    SRO_name = ws2.cell(row=59, column=project_number).value
-    WLC_value = ws2.cell(row=304, column=project_number).value
-    project_stage = abbreviate_project_stage(ws2.cell(row=281, column=project_number).value)
-    SRO_conf = ws2.cell(row=57, column=project_number).value
+    project_name = data.project_name
+    SRO_name = data.SRO_name
+    WLC_value = data.WLC_value
+    project_stage = abbreviate_project_stage(data.project_stage)
+    SRO_conf = data.SRO_conf
     # SRO_conf_last_qtr =
-    SoP = ws2.cell(row=201, column=project_number).value
-    ipa_rag = ws2.cell(row=1274, column=project_number).value
+    SoP = data.SoP
+    ipa_rag = data.ipa_rag
     if isinstance(SoP, datetime.datetime):
         SoP = SoP.date()
-    finance_DCA = ws2.cell(row=280, column=project_number).value
-    benefits_DCA = ws2.cell(row=1152, column=project_number).value
-    SRO_Comm = ws2.cell(row=58, column=project_number).value
+    finance_DCA = data.finance_DCA
+    benefits_DCA = data.benefits_DCA
+    SRO_Comm = data.SRO_Comm
 # red_color = 'ffc7ce'
 # red_fill = styles.PatternFill(start_color=red_color, end_color=red_color, fill_type='solid')
 # sheet.conditional_formatting.add('B5', CellIsRule(operator='containsText', formula=['Amber/Green'], fill=red_fill))
@@ -135,8 +210,7 @@ def process_master(source_wb, project_number, dca_map, diff: list):
     sheet['B7'].value = SRO_conf
     sheet['B7'].border = thin_border
     sheet['C7'].value = 'DCA last quarter'
-    if not project_name in diff:
-        sheet['D7'].value = dca_map[project_name]
+    sheet['D7'].value = dca_last_quarter
     sheet['D7'].border = thin_border
     sheet['E7'].value = 'IPA DCA'
     sheet['F7'].border = thin_border
@@ -178,11 +252,11 @@ def process_master(source_wb, project_number, dca_map, diff: list):
             if cell.value in ['Green', 'Amber/Green', 'Amber', 'Amber/Red', 'Red']:
                 cell.fill = _pattern(cell.value)
 
-    return wb, project_name  # outputs a tuple of (wb, project_name) <- parens are optional!
+    return wb
 
 
-def _dca_map(master_file: str):
-    d = project_data_from_master(master_file)
+def _dca_map(master_file: str, cache_dir=None):
+    d = cached_project_data(master_file, cache_dir)
     ds = {}
     for item in d.items():
         ds.update({item[0]: item[1]['Departmental DCA']})
@@ -190,23 +264,56 @@ def _dca_map(master_file: str):
 
 
 
-def run(compare_master=None, output_path=None, user_provided_master_path=None):
+def _save_annex(data: AnnexData, dca_last_quarter, output_dir: str):
+    """
+    Builds and saves a project's annex. Returns (file name, seconds taken), or
+    (file name, None) if the file could not be saved because it is open.
+    """
+    start = time.perf_counter()
+    file_name = "{}_ANNEX.xlsx".format(data.project_name.replace('/', '_'))
+    output_wb = build_annex(data, dca_last_quarter)
+    try:
+        output_wb.save(os.path.join(output_dir, file_name))
+    except PermissionError:
+        return file_name, None
+    return file_name, time.perf_counter() - start
+
+
+def _log_timings(timings: dict, elapsed: float) -> None:
+    for file_name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        logger.debug(f"{file_name}: {seconds:.2f}s")
+    if timings:
+        slowest = max(timings, key=timings.get)
+        logger.info(f"Saved {len(timings)} annexes in {elapsed:.2f}s "
+                    f"(mean {sum(timings.values()) / len(timings):.2f}s per file, "
+                    f"slowest {slowest} at {timings[slowest]:.2f}s)")
+
+
+def run(compare_master=None, output_path=None, user_provided_master_path=None, jobs=1,
+        cache_dir=None):
 
     if user_provided_master_path:
         logger.info(f"Using master file: {user_provided_master_path}")
-        q2 = load_workbook(user_provided_master_path)
-        projects_in_current_master = project_titles_in_master(user_provided_master_path)
+        master = user_provided_master_path
     else:
         logger.info(f"Using default master file (refer to config.ini)")
-        q2 = load_workbook(MASTER_XLSX)
-        projects_in_current_master = project_titles_in_master(MASTER_XLSX)
+        master = MASTER_XLSX
+
+    # everything needed from the master, for every project, in one read
+    try:
+        projects = annex_data(master)
+    except FileNotFoundError:
+        logger.critical("Please ensure you specify a master file in the command or use the correctly named"
+                        " master file in your auxiliary directory.")
+        sys.exit(1)
+    projects_in_current_master = [data.project_name for data in projects]
 
     if compare_master:
         projects_in_compare_master = project_titles_in_master(compare_master)
         diff = set(projects_in_current_master).difference(projects_in_compare_master)
         if diff:
             logger.warning("{} not present in compare master.".format(", ".join(diff)))
-        dca_map = _dca_map(compare_master)
+        dca_map = _dca_map(compare_master, cache_dir)
         logger.info(f"Running annex analyser using {compare_master} as comparison.")
     else:
         compare_master = os.path.join(
@@ -216,38 +323,44 @@ def run(compare_master=None, output_path=None, user_provided_master_path=None):
         if diff:
             logger.warning("{} not present in compare master.".format(", ".join(diff)))
         try:
-            dca_map = _dca_map(compare_master)
+            dca_map = _dca_map(compare_master, cache_dir)
         except FileNotFoundError:
             logger.critical(f"Cannot find {compare_master} in /Documents/bcompiler directory. Either put it there or"
                             f" or call annex with --compare option.")
             sys.exit(1)
         logger.info(f"Running annex analyser using {compare_master} as comparison.")
 
-
-    # get the number of projects, so we know how many times to loop
-    project_count = get_number_of_projects(q2)
-
-    for p in range(2, project_count + 2):  # start at 2, representating col B in master; go until number of projects plus 2
-
-        # pass out master and project number into the process_master() function
-        # we capture the workbook object and project name in a tuple (these are the objects passed out by the return statement inside process_master() function
-        output_wb, project_name = process_master(q2, p, dca_map, diff)
-        if '/' in project_name:
-            project_name = project_name.replace('/', '_')
-
-        # save the file, using the project_name variable in the file name
-        try:
-            if output_path:
-                output_wb.save(os.path.join(output_path[0], f'{project_name}_ANNEX.xlsx'))
-                logger.info(f"{project_name}_ANNEX.xlsx to {output_path}")
-            else:
-                output_path = os.path.join(ROOT_PATH, 'output')
-                output_wb.save(os.path.join(output_path, f'{project_name}_ANNEX.xlsx'))
-                logger.info(f"{project_name}_ANNEX.xlsx to {output_path}")
-                output_path = ""
-        except PermissionError:
-            logger.critical(f"Cannot save {project_name}_ANNEX.xlsx file - you already have it open. Close and run again.")
-            return
+    if output_path:
+        output_dir = output_path[0]
+    else:
+        output_dir = os.path.join(ROOT_PATH, 'output')
+
+    annexes = [(data, None if data.project_name in diff else dca_map[data.project_name])
+               for data in projects]
+
+    start = time.perf_counter()
+    timings = {}
+    if jobs > 1 and len(annexes) > 1:
+        logger.info(f"Saving {len(annexes)} annexes using {jobs} processes")
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        saved = as_completed([executor.submit(_save_annex, data, dca, output_dir)
+                              for data, dca in annexes])
+        saved = (future.result() for future in saved)
+    else:
+        executor = None
+        saved = (_save_annex(data, dca, output_dir) for data, dca in annexes)
+
+    try:
+        for count, (file_name, seconds) in enumerate(saved, start=1):
+            if seconds is None:
+                logger.critical(f"Cannot save {file_name} file - you already have it open. Close and run again.")
+                return
+            timings[file_name] = seconds
+            logger.info(f"[{count}/{len(annexes)}] {file_name} to {output_dir} ({seconds:.2f}s)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _log_timings(timings, time.perf_counter() - start)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,8 @@
-from itertools import zip_longest
 from pathlib import PurePath
+from typing import Dict, List, Tuple
 
-import copy
 import os
+import numpy as np
 from openpyxl import Workbook
 from openpyxl.chart import ScatterChart, Reference, Series
 from openpyxl.drawing.line import LineProperties
@@ -13,37 +13,42 @@ from ..utils import logger, ROOT_PATH, CONFIG_FILE, runtime_config
 runtime_config.read(CONFIG_FILE)
 
 
-def _calc_quarter_totals(global_data: dict):
-    global_totals = {}
-    q1_entries = [item[1][1] for item in iter(global_data.items())]
-    q2_entries = [item[1][2] for item in iter(global_data.items())]
-    q3_entries = [item[1][3] for item in iter(global_data.items())]
-    q4_entries = [item[1][4] for item in iter(global_data.items())]
-    global_totals['q1', 'rdel'] = round(sum([item['RDEL Total Forecast'] for item in q1_entries]), 2)
-    global_totals['q1', 'cdel'] = round(sum([item['CDEL Total Forecast'] for item in q1_entries]), 2)
-    global_totals['q1', 'non-gov'] = round(sum([item['Non-Gov Total Forecast'] for item in q1_entries]), 2)
-    global_totals['q1', 'total_forecast'] = round(sum([item['Total Forecast'] for item in q1_entries]), 2)
-    global_totals['q1', 'total_forecast_sr'] = round(sum([item['Total Forecast SR (20/21)'] for item in q1_entries]), 2)
-
-    global_totals['q2', 'rdel'] = round(sum([item['RDEL Total Forecast'] for item in q2_entries]), 2)
-    global_totals['q2', 'cdel'] = round(sum([item['CDEL Total Forecast'] for item in q2_entries]), 2)
-    global_totals['q2', 'non-gov'] = round(sum([item['Non-Gov Total Forecast'] for item in q2_entries]), 2)
-    global_totals['q2', 'total_forecast'] = round(sum([item['Total Forecast'] for item in q2_entries]), 2)
-    global_totals['q2', 'total_forecast_sr'] = round(sum([item['Total Forecast SR (20/21)'] for item in q2_entries]), 2)
-
-    global_totals['q3', 'rdel'] = round(sum([item['RDEL Total Forecast'] for item in q3_entries]), 2)
-    global_totals['q3', 'cdel'] = round(sum([item['CDEL Total Forecast'] for item in q3_entries]), 2)
-    global_totals['q3', 'non-gov'] = round(sum([item['Non-Gov Total Forecast'] for item in q3_entries]), 2)
-    global_totals['q3', 'total_forecast'] = round(sum([item['Total Forecast'] for item in q3_entries]), 2)
-    global_totals['q3', 'total_forecast_sr'] = round(sum([item['Total Forecast SR (20/21)'] for item in q3_entries]), 2)
-
-    global_totals['q4', 'rdel'] = round(sum([item['RDEL Total Forecast'] for item in q4_entries]), 2)
-    global_totals['q4', 'cdel'] = round(sum([item['CDEL Total Forecast'] for item in q4_entries]), 2)
-    global_totals['q4', 'non-gov'] = round(sum([item['Non-Gov Total Forecast'] for item in q4_entries]), 2)
-    global_totals['q4', 'total_forecast'] = round(sum([item['Total Forecast'] for item in q4_entries]), 2)
-    global_totals['q4', 'total_forecast_sr'] = round(sum([item['Total Forecast SR (20/21)'] for item in q4_entries]), 2)
-
-    return global_totals
+def _financial_data(projects: list, masters: list,
+                    target_keys: list) -> Tuple[Dict[Tuple[str, int], list], np.ma.MaskedArray]:
+    """
+    Pulls target_keys for every project from every master. Returns the values
+    as pulled, {(project, master index): values}, which has no entry where a
+    project is not in a master, and the same values in a masked array indexed
+    by (project, master, key) in which anything that is not a number is masked.
+    """
+    pulled = {}
+    values = np.zeros((len(projects), len(masters), len(target_keys)))
+    mask = np.ones(values.shape, dtype=bool)
+    for pi, p in enumerate(projects):
+        for mi, m in enumerate(masters):
+            try:
+                p_data = m[p]
+            except KeyError:
+                logger.warning(f"Cannot find {p} in {m.quarter}")
+                continue
+            d = p_data.pull_keys(target_keys, flat=True)
+            pulled[p, mi] = d
+            for ki, v in enumerate(d[:len(target_keys)]):
+                if isinstance(v, (int, float)):
+                    values[pi, mi, ki] = v
+                    mask[pi, mi, ki] = False
+    return pulled, np.ma.masked_array(values, mask=mask)
+
+
+def _calc_quarter_totals(values: np.ma.MaskedArray, masters: list) -> Dict[int, List[float]]:
+    """
+    Totals of each key over all projects, from the array made by
+    _financial_data(), keyed by quarter number (1 to 4), to 2 decimal places.
+    """
+    by_master = values.sum(axis=0).filled(0)
+    totals = np.zeros((4, values.shape[2]))
+    np.add.at(totals, [m.quarter.quarter - 1 for m in masters], by_master)
+    return {q: [round(t, 2) for t in totals[q - 1].tolist()] for q in range(1, 5)}
 
 
 def _replace_underscore(name: str):
@@ -94,7 +99,7 @@ def _create_chart(worksheet):
     return worksheet
 
 
-def run(output_path=None):
+def run(output_path=None, cache_dir=None):
     q1 = Quarter(int(runtime_config['AnalyserFinancialAnalysis']['q1'].split()[0]),
                  int(runtime_config['AnalyserFinancialAnalysis']['q1'].split()[1]))
     q2 = Quarter(int(runtime_config['AnalyserFinancialAnalysis']['q2'].split()[0]),
@@ -111,29 +116,18 @@ def run(output_path=None):
     q3_path = PurePath(runtime_config['AnalyserFinancialAnalysis']['q3_master'])
     q4_path = PurePath(runtime_config['AnalyserFinancialAnalysis']['q4_master'])
 
-    master_q1 = Master(q1, master_repo_path / q1_path)
-    master_q2 = Master(q2, master_repo_path / q2_path)
-    master_q3 = Master(q3, master_repo_path / q3_path)
-    master_q4 = Master(q4, master_repo_path / q4_path)
+    master_q1 = Master(q1, master_repo_path / q1_path, cache_dir=cache_dir)
+    master_q2 = Master(q2, master_repo_path / q2_path, cache_dir=cache_dir)
+    master_q3 = Master(q3, master_repo_path / q3_path, cache_dir=cache_dir)
+    master_q4 = Master(q4, master_repo_path / q4_path, cache_dir=cache_dir)
 
     target_keys = runtime_config['AnalyserFinancialAnalysis']['target_keys'].split('\n')
 
     # projects from latest master
     projects = master_q2.projects
+    masters = [master_q3, master_q4, master_q1, master_q2]
 
-    project_totals = {key: t for key in target_keys for t in [0]}
-    # issue is here - in using a single dict in a list
-    project_totals = {q: copy.copy(pt) for q in range(1, 5) for pt in [project_totals]}
-    global_totals = {}
-
-    def _update_total(keys: list, inner_target_keys: list, data: list, quarter=None):
-        keys, inner_target_keys = inner_target_keys, keys
-        z = list(zip_longest(keys, data))
-        for t in z:
-            try:
-                project_totals[quarter][t[0]] += t[1]
-            except TypeError:
-                pass
+    pulled, values = _financial_data(projects, masters, target_keys)
 
     # set up sheets
     for p in projects:
@@ -144,34 +138,15 @@ def run(output_path=None):
         header = Row(2, start_row + 1, target_keys)
         header.bind(ws)
 
-        for m in [master_q3, master_q4, master_q1, master_q2]:
-            try:
-                p_data = m[p]
-            except KeyError:
-                logger.warning(f"Cannot find {p} in {m.quarter}")
+        for mi, m in enumerate(masters):
+            if (p, mi) not in pulled:
                 continue
-            if m.quarter.quarter == 1:
-                d = p_data.pull_keys(target_keys, flat=True)
-                _update_total(target_keys, target_keys, d, m.quarter.quarter)
-            if m.quarter.quarter == 2:
-                d = p_data.pull_keys(target_keys, flat=True)
-                _update_total(target_keys, target_keys, d, m.quarter.quarter)
-            if m.quarter.quarter == 3:
-                d = p_data.pull_keys(target_keys, flat=True)
-                _update_total(target_keys, target_keys, d, m.quarter.quarter)
-            elif m.quarter.quarter == 4:
-                d = p_data.pull_keys(target_keys, flat=True)
-                _update_total(target_keys, target_keys, d, m.quarter.quarter)
             ws.cell(row=start_row + 2, column=1, value=str(m.quarter))
-            r = Row(2, start_row + 2, d)
+            r = Row(2, start_row + 2, pulled[p, mi])
             r.bind(ws)
 
             start_row += 1
 
-        global_totals[p] = project_totals
-        project_totals = {key: t for key in target_keys for t in [0]}
-        project_totals = {q: copy.copy(pt) for q in range(1, 5) for pt in [project_totals]}
-
         _create_chart(ws)
 
         if output_path:
@@ -183,7 +158,7 @@ def run(output_path=None):
             logger.info(f"Saved {p}_FINANCIAL_ANALYSIS.xlsx to {output_path}")
             output_path = None
 
-    tots = _calc_quarter_totals(global_totals)
+    tots = _calc_quarter_totals(values, masters)
 
     wb = Workbook()
     ws = wb.active
@@ -196,13 +171,9 @@ def run(output_path=None):
         ws.cell(row=start_row + 2, column=1, value=q)
         start_row += 1
 
-    q1s = [t[1] for t in iter(tots.items()) if t[0][0] == 'q1']
-    q2s = [t[1] for t in iter(tots.items()) if t[0][0] == 'q2']
-    q3s = [t[1] for t in iter(tots.items()) if t[0][0] == 'q3']
-    q4s = [t[1] for t in iter(tots.items()) if t[0][0] == 'q4']
     start_row = 1
-    for i in [q3s, q4s, q1s, q2s]:
-        Row(2, start_row + 2, i).bind(ws)
+    for q in [3, 4, 1, 2]:
+        Row(2, start_row + 2, tots[q]).bind(ws)
         start_row += 1
 
     _create_chart(ws)
@@ -1,78 +1,145 @@
 """
 Analyser for outputting ad hoc data from a master, based on given keyword.
+Several keywords can be searched for at once.
 """
 import reprlib
 import sys
+from typing import Dict, Iterable, List, Tuple, Union
 
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
 
-from .utils import MASTER_XLSX, logger, get_number_of_projects
-from ..utils import runtime_config, CONFIG_FILE, project_data_from_master
+from .utils import MASTER_XLSX, logger
+from ..core.cache import cached_project_data
+from ..utils import runtime_config, CONFIG_FILE
 
 runtime_config.read(CONFIG_FILE)
 
 
-def process_master(source_wb, project_number, search_term) -> list:
-    source_sheet = source_wb.active
-    project_name = source_sheet.cell(row=1, column=project_number).value
-    p_data = project_data_from_master(source_wb, opened_wb=True)[project_name]
-    data = [item for item in p_data.items() if search_term in item[0]]
-    if not data:
-        logger.warning(f"No matching keyword found in {project_name}")
-    return (project_name, data)
-
-
-def run(output_path=None, user_provided_master_path=None, search_term: str=None, xlsx: bool=False):
+class KeyIndex:
+    """
+    An index of master keys for substring searches.
+
+    Each key is entered under every run of N characters it contains, so a
+    search only checks the keys that contain every run of N characters in
+    the search term, rather than every key in the master. Keys are returned
+    in master order.
+    """
+    N = 3
+
+    def __init__(self, keys: Iterable) -> None:
+        # the same key may appear more than once, and blank rows give None
+        self.keys = [key for key in dict.fromkeys(keys) if isinstance(key, str)]
+        self._grams: Dict[str, List[int]] = {}
+        for pos, key in enumerate(self.keys):
+            for gram in {key[i:i + self.N] for i in range(len(key) - self.N + 1)}:
+                self._grams.setdefault(gram, []).append(pos)
+        self._results: Dict[str, List[str]] = {}
+
+    def search(self, term: str) -> List[str]:
+        """
+        Returns the keys that contain term.
+        """
+        try:
+            return self._results[term]
+        except KeyError:
+            pass
+        if len(term) < self.N:
+            candidates = range(len(self.keys))
+        else:
+            postings = sorted(
+                (self._grams.get(term[i:i + self.N], []) for i in range(len(term) - self.N + 1)),
+                key=len)
+            candidates = sorted(set(postings[0]).intersection(*postings[1:]))
+        result = [self.keys[pos] for pos in candidates if term in self.keys[pos]]
+        self._results[term] = result
+        return result
+
+
+def search_master(master_data: dict, search_terms: List[str]) -> Dict[str, List[Tuple[str, list]]]:
+    """
+    Searches the keys of a parsed master (as from project_data_from_master)
+    for each of search_terms.
+
+    Returns {search_term: [(project_name, [(key, value), ...]), ...]}, with
+    projects in master order.
+    """
+    keys = (key for p_data in master_data.values() for key in p_data)
+    index = KeyIndex(keys)
+    results = {}
+    for term in search_terms:
+        matched = index.search(term)
+        projects = []
+        for project_name, p_data in master_data.items():
+            data = [(key, p_data[key]) for key in matched if key in p_data]
+            if not data:
+                logger.warning(f"No matching keyword found in {project_name}")
+            projects.append((project_name, data))
+        results[term] = projects
+    return results
+
+
+def run(output_path=None, user_provided_master_path=None, search_term: Union[str, List[str]] = None,
+        xlsx: bool = False, cache_dir=None):
+    """
+    search_term may be a single search term or a list of them. The master is
+    only parsed once however many terms there are.
+    """
     if user_provided_master_path:
         logger.info(f"Using master file: {user_provided_master_path}")
-        wb = load_workbook(user_provided_master_path)
+        master_path = user_provided_master_path
     else:
         logger.info(f"Using default master file (refer to config.ini)")
-        wb = load_workbook(MASTER_XLSX)
+        master_path = MASTER_XLSX
 
-    project_count = get_number_of_projects(wb)
+    search_terms = [search_term] if isinstance(search_term, str) else list(search_term)
+    results = search_master(cached_project_data(master_path, cache_dir), search_terms)
 
     if not xlsx:
-        print("{:<50}{:<50}{:<10}".format("Project", "Key", "Value"))
-        print("{:*<140}".format(""))
-
         r = reprlib.Repr()
         r.maxstring = 48
 
-        for p in range(2, project_count + 2):
-
-            # do the work
-            project_name, data = process_master(wb, p, search_term)
-
-            for item in data:
-                print("{:<50}{:<50}{:<10}".format(
-                    r.repr(project_name),
-                    r.repr(item[0]),
-                    r.repr(item[1])))
+        for term, projects in results.items():
+            if len(search_terms) > 1:
+                print(f"\nSearch term: {term}")
+            print("{:<50}{:<50}{:<10}".format("Project", "Key", "Value"))
+            print("{:*<140}".format(""))
+
+            for project_name, data in projects:
+                for item in data:
+                    print("{:<50}{:<50}{:<10}".format(
+                        r.repr(project_name),
+                        r.repr(item[0]),
+                        r.repr(item[1])))
     else:
         output_wb = Workbook()
-        ws = output_wb.active
-        ws.title = "Results of search"
-
-        start_row = 1
-
-        def val_gen(row, p_name, t, ws):
-            yield ws.cell(column=1, row=row, value=p_name)
-            yield ws.cell(column=2, row=row, value=t[0])
-            yield ws.cell(column=3, row=row, value=t[1])
-
-        for p in range(2, project_count + 2):
-            # do the work
-            project_name, data = process_master(wb, p, search_term)
-            logger.info(f"Processing {project_name}")
-
-            for i, item in enumerate(data, start_row):
-                g = val_gen(start_row, project_name, item, ws)
-                for cell in range(1, 4):
-                    next(g)
-                start_row += 1
+
+        for n, (term, projects) in enumerate(results.items()):
+            if n == 0:
+                ws = output_wb.active
+            else:
+                ws = output_wb.create_sheet()
+            if len(search_terms) > 1:
+                ws.title = _sheet_title(f"Results for {term}")
+            else:
+                ws.title = "Results of search"
+
+            row = 1
+            for project_name, data in projects:
+                logger.info(f"Processing {project_name}")
+                for item in data:
+                    ws.cell(column=1, row=row, value=project_name)
+                    ws.cell(column=2, row=row, value=item[0])
+                    ws.cell(column=3, row=row, value=item[1])
+                    row += 1
         output_wb.save(xlsx[0])
 
 
+def _sheet_title(title: str) -> str:
+    # Excel sheet titles are at most 31 characters and cannot contain these
+    for char in '\\/*?:[]':
+        title = title.replace(char, ' ')
+    return title[:31]
+
+
 if __name__ == '__main__':
     run()
@@ -2,15 +2,16 @@
 """
 Analyser to do Reference Class Forecasting on master documents.
 """
+import functools
 import operator
-import copy
 import datetime
 import os
 import logging
 import re
 import sys
 
-from typing import List, Tuple, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple, Dict, Optional
 
 from collections import namedtuple
 from openpyxl import Workbook
@@ -43,12 +44,12 @@ cells_we_want_to_capture = ['Reporting period (GMPP - Snapshot Date)',
                             'Project MM21 Forecast - Actual']
 
 
-def _process_masters(path: str) -> Tuple[Quarter, Dict[str, Tuple]]:
+def _process_masters(path: str, cache_dir: Optional[str] = None) -> Tuple[Quarter, Dict[str, Tuple]]:
     hold = {}
     year = path[-9:][:4]
     quarter = path[-11]
     q = Quarter(int(quarter), int(year))
-    m = Master(q, path)
+    m = Master(q, path, cache_dir=cache_dir)
     for p in m.projects:
         pd = m[p]
         hold[p] = pd.pull_keys(cells_we_want_to_capture)
@@ -56,8 +57,25 @@ def _process_masters(path: str) -> Tuple[Quarter, Dict[str, Tuple]]:
 
 
 
-def create_rcf_output(path: str):
-    return _process_masters(path)
+def create_rcf_output(path: str, cache_dir: Optional[str] = None):
+    return _process_masters(path, cache_dir)
+
+
+def _parsed_masters(paths: List[str], jobs: int = 1,
+                    cache_dir: Optional[str] = None) -> Iterator[Tuple[Quarter, Dict[str, Tuple]]]:
+    """
+    Yields create_rcf_output() for each of paths, in the order given. With jobs
+    greater than 1 the masters are parsed in a pool of worker processes, and each
+    is yielded as soon as it and the masters before it are ready.
+    """
+    parse = functools.partial(create_rcf_output, cache_dir=cache_dir)
+    if jobs > 1 and len(paths) > 1:
+        logger.info(f"Parsing {len(paths)} masters using {jobs} processes")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from executor.map(parse, paths)
+    else:
+        for path in paths:
+            yield parse(path)
 
 
 def _main_keys(dictionary) -> list:
@@ -110,6 +128,11 @@ def _replace_underscore(name: str):
     return name.replace('/', '_')
 
 
+def _file_title(project_name: str) -> str:
+    name = _replace_underscore(project_name).replace(' ', '_')
+    return f"{name}_RCF.xlsx"
+
+
 def _get_master_files_and_order_them(path: str):
     m = [f for f in os.listdir(path) if re.match(target_master_fn, f)]
     if len(m) == 0:
@@ -174,7 +197,40 @@ def _generate_chart(worksheet, top_row: int, leftmost_col: int) -> ScatterChart:
     return chart
 
 
-def run(output_path: str=None, user_provided_master_path: str=None,) -> None:
+def _write_master_row(ws, proj: str, d, start_row: int, chart_data_start_row: int,
+                      masters: list) -> None:
+    """
+    Writes a project's data from one master (d, from create_rcf_output()) to
+    its RCF worksheet: the headers, the master's row of values and
+    calculations at start_row, and the master's chart data from
+    chart_data_start_row.
+    """
+    h_row = _headers(proj, d)
+    _insert_gaps(h_row, [3, 6, 9, 12, 15, 18, 21])
+    Row(2, 2, h_row).bind(ws)
+
+    d_row = []
+    for x in _vals(proj, d):
+        d_row.append(x)
+
+    # make spaces in the row
+    _insert_gaps(d_row, [3, 6, 9, 12, 15, 18, 21])
+
+    # inject the calculations
+    _inject(d_row, operator.sub, 3, 2, 11)
+    _inject(d_row, operator.sub, 6, 5, 2)
+    _inject(d_row, operator.sub, 9, 8, 5)
+    _inject(d_row, operator.sub, 15, 14, 8)
+    _inject(d_row, operator.sub, 18, 17, 14)
+    _inject(d_row, operator.sub, 21, 20, 17)
+
+    Row(2, start_row + 1, d_row).bind(ws)
+
+    _process_data_cols(ws, d_row, masters, h_row, chart_data_start_row)
+
+
+def run(output_path: str=None, user_provided_master_path: str=None, jobs: int=1,
+        cache_dir: str=None) -> None:
 
     if user_provided_master_path:
         logger.info(f"Using master file location: {user_provided_master_path}")
@@ -188,71 +244,29 @@ def run(output_path: str=None, user_provided_master_path: str=None,) -> None:
     else:
         output_path = output_path
 
-    file_queue: list = []
-    flag = False
+    # one workbook per project, across all the masters
+    workbooks: Dict[str, QueuedWorkbook] = {}
     try:
         mxs = _get_master_files_and_order_them(user_provided_master_path)
     except ValueError as e:
         logger.critical(f"No masters present in {user_provided_master_path}")
         sys.exit(1)
+    paths = [os.path.join(user_provided_master_path, f) for f in mxs]
     chart_data_start_row = 10
-    for start_row, f in list(enumerate(mxs, start=2)):
-        d = create_rcf_output(os.path.join(user_provided_master_path, f))
-        # create a header row first off
-        project_titles = _main_keys(d)
-        # then take a project at a time
-        for proj in project_titles:
-            if len(file_queue) > 0:
-                for t in file_queue:
-                    if proj == t.project_name:
-                        wb = t.workbook
-                        ws = wb.active
-                        flag = True
-                        break
-                    else:
-                        wb = Workbook()
-                        ws = wb.active
-            else:
+    for start_row, d in enumerate(_parsed_masters(paths, jobs, cache_dir), start=2):
+        for proj in _main_keys(d):
+            try:
+                ws = workbooks[proj].workbook.active
+            except KeyError:
                 wb = Workbook()
                 ws = wb.active
-            h_row = _headers(proj, d)
-            _insert_gaps(h_row, [3, 6, 9, 12, 15, 18, 21])
-            Row(2, 2, h_row).bind(ws)
-
-            d_row = []
-            for x in _vals(proj, d):
-                d_row.append(x)
-
-            # make spaces in the row
-            _insert_gaps(d_row, [3, 6, 9, 12, 15, 18, 21])
-
-            # inject the calculations
-            _inject(d_row, operator.sub, 3, 2, 11)
-            _inject(d_row, operator.sub, 6, 5, 2)
-            _inject(d_row, operator.sub, 9, 8, 5)
-            _inject(d_row, operator.sub, 15, 14, 8)
-            _inject(d_row, operator.sub, 18, 17, 14)
-            _inject(d_row, operator.sub, 21, 20, 17)
-
-            Row(2, start_row + 1, d_row).bind(ws)
-
-            # call process here
-            ws = _process_data_cols(ws, d_row, mxs, h_row, chart_data_start_row)
-            chart = _generate_chart(ws, 10, 2)
-            ws.add_chart(chart, "F10")
-
-            if flag:
-                continue
-            proj_pack = copy.deepcopy(proj)
-#           proj = ''.join([proj, ' ', str(d[0])])
-            proj = _replace_underscore(proj)
-            proj = proj.replace(' ', '_')
-            f_title = f"{proj}_RCF.xlsx"
-            file_queue.append(QueuedWorkbook(proj_pack, f_title, wb))
+                ws.add_chart(_generate_chart(ws, 10, 2), "F10")
+                workbooks[proj] = QueuedWorkbook(proj, _file_title(proj), wb)
+            _write_master_row(ws, proj, d, start_row, chart_data_start_row, mxs)
         chart_data_start_row += 1
 
     try:
-        for item in file_queue:
+        for item in workbooks.values():
             logger.info(f"Saving {item.file_title} to {output_path}")
             item.workbook.save(os.path.join(output_path, item.file_title))
     except PermissionError:
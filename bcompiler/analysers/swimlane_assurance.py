@@ -3,11 +3,12 @@ import datetime
 import os
 from typing import Tuple
 
+import numpy as np
 import openpyxl
 from openpyxl.chart import ScatterChart, Reference, Series
 # typing imports
 
-from .utils import MASTER_XLSX, logger, projects_in_master, diff_date_list, date_convertor
+from .utils import MASTER_XLSX, MasterBlock, day_offsets, logger, milestone_block
 from ..utils import ROOT_PATH, runtime_config, CONFIG_FILE
 
 runtime_config.read(CONFIG_FILE)
@@ -28,6 +29,9 @@ CHART_STYLE = int(runtime_config['AnalyserSwimlaneAssurance']['chart_style'])
 CHART_X_AXIS_MAJOR_UNIT = int(runtime_config['AnalyserSwimlaneAssurance']['chart_x_axis_major_unit'])
 CHART_Y_AXIS_MAJOR_UNIT = int(runtime_config['AnalyserSwimlaneAssurance']['chart_y_axis_major_unit'])
 
+# the milestone dates charted in Column C
+MILESTONE_ROWS = range(BLOCK_START + 3, BLOCK_END + 2, BLOCK_SKIP)
+
 if runtime_config['AnalyserSwimlane']['grey_markers'] in ['True', 'true', 'yes', 'on']:
     GREYMARKER = True
 else:
@@ -46,72 +50,15 @@ _marker_colours = [
 _grey_marker_colours = ["969696"] * 7
 
 
-def date_range_milestones(source_sheet, output_sheet, cols: tuple,
-                          start_row: int, column: int, date_ends: list):
-    """
-    Helper function to populate Column B in resulting milestones spreadsheet.
-    Uses start and end dates to define boundaries to milestones.
-    """
-    base_date = date_ends[0]
-    current_row = start_row
-    dates = diff_date_list(*date_ends)
-    for i in range(*cols):
-        time_line_date = source_sheet.cell(row=i, column=column).value
-        time_line_date = date_convertor(time_line_date)
-        try:
-            if time_line_date in dates:
-                output_sheet.cell(
-                    row=current_row,
-                    column=3,
-                    value=(time_line_date - base_date).days)
-                logger.debug(f"Using date range: written {time_line_date} to "
-                             f"row: {current_row} col: {column}")
-        except TypeError:
-            pass
-        finally:
-            current_row += 1
-    return output_sheet
-
-
-def date_diff_column(source_sheet, output_sheet, cols: tuple, start_row: int, column: int,
-                     interested_range: int):
-    """Helper function to populate Column B in the resulting milestones spreadsheet."""
-    today = datetime.date.today()
-    current_row = start_row
-    for i in range(*cols):
-        time_line_date = source_sheet.cell(row=i, column=column).value
-        time_line_date = date_convertor(time_line_date)
-        try:
-            difference = (time_line_date - today).days
-            if difference in range(1, interested_range):
-                output_sheet.cell(row=current_row, column=3, value=difference)
-                logger.debug(f"Not using date range: written {time_line_date} to "
-                             f"row: {current_row} col: {column}")
-        except TypeError:
-            pass
-        finally:
-            current_row += 1
-    return output_sheet
-
-
-def splat_date_range(dt: str):
-    """Helper function to parse a date in dd/mm/yy format to a list of ints."""
-    xs = dt.split('/')
-    if len(xs[-1]) == 2:
-        xs[-1] = "".join(["20", xs[-1]])
-        logger.debug(f"Handling two digit date in argument. Assuming year is {xs[-1]}.")
-    xs = [xs[2], xs[1], xs[0]]
-    logger.debug(f"Splatting {dt}")
-    return [int(i) for i in xs]
-
-
 def gather_data(start_row: int,
                 project_number: int,
                 newwb: openpyxl.Workbook,
                 block_start_row: int = BLOCK_START,
                 interested_range: int = DAY_RANGE,
                 master_path=None,
-                date_range=None):
+                date_range=None,
+                block: MasterBlock = None,
+                offsets: np.ma.MaskedArray = None):
     """
     Gather data from
     :type int: start_row
@@ -119,21 +66,25 @@ def gather_data(start_row: int,
     :type openpyxl.Workbook: newwb
     :type int: block_start_row
     :type int: interested_range
+    :type MasterBlock: block - the master's milestone rows, from milestone_block();
+        read from the master if not given
+    :type np.ma.MaskedArray: offsets - Column C for every project, from day_offsets();
+        calculated from block if not given
     :rtype: Tuple
     """
     newsheet: Worksheet = newwb.active
     col = project_number + 1
     start_row = start_row + 1
 
-    if master_path:
-        master = master_path
-        logger.debug(f"Using master path: {master_path}")
-    else:
-        master = MASTER_XLSX
-        logger.debug(f"Using master path: {master}")
-
-    wb = openpyxl.load_workbook(master)
-    sheet = wb.active
+    if block is None:
+        if master_path:
+            master = master_path
+            logger.debug(f"Using master path: {master_path}")
+        else:
+            master = MASTER_XLSX
+            logger.debug(f"Using master path: {master}")
+        block = milestone_block(master, min(block_start_row, BLOCK_START), BLOCK_END)
+    sheet = block
 
     # print project title
     newsheet.cell(
@@ -155,15 +106,12 @@ def gather_data(start_row: int,
         logger.debug(f"Writing {val} to row: {x} col: 2")
         x += 1
 
-    # process the sheet to populate Column B
-    if date_range:
-        newsheet = date_range_milestones(
-            sheet, newsheet, (BLOCK_START + 3, BLOCK_END + 2, BLOCK_SKIP), start_row, col,
-            [datetime.date(*splat_date_range(date_range[0])),
-             datetime.date(*splat_date_range(date_range[1]))])
-    else:
-        newsheet = date_diff_column(sheet, newsheet, (BLOCK_START + 3, BLOCK_END + 2, BLOCK_SKIP), start_row, col,
-                                    interested_range)
+    # populate Column C
+    if offsets is None:
+        offsets = day_offsets(sheet, MILESTONE_ROWS, interested_range, date_range)
+    for i, offset in enumerate(offsets[:, col - 1]):
+        if offset is not np.ma.masked:
+            newsheet.cell(row=start_row + i, column=3, value=int(offset))
 
     for i in range(start_row, start_row + MILESTONES_TO_COLLECT):
         newsheet.cell(row=i, column=4, value=project_number)
@@ -225,12 +173,14 @@ def run(output_path=None, user_provided_master_path=None, date_range=None):
 
     if user_provided_master_path:
         logger.info(f"Using master file: {user_provided_master_path}")
-        NUMBER_OF_PROJECTS = projects_in_master(user_provided_master_path)
+        block = milestone_block(user_provided_master_path, BLOCK_START, BLOCK_END)
     else:
         logger.info(f"Using default master file (refer to config.ini)")
-        NUMBER_OF_PROJECTS = projects_in_master(
+        block = milestone_block(
             os.path.join(ROOT_PATH,
-                         runtime_config['MasterForAnalysis']['name']))
+                         runtime_config['MasterForAnalysis']['name']), BLOCK_START, BLOCK_END)
+    NUMBER_OF_PROJECTS = len(block.projects)
+    offsets = day_offsets(block, MILESTONE_ROWS, DAY_RANGE, date_range)
 
     wb = openpyxl.Workbook()
     segment_series_generator = _segment_series()
@@ -250,7 +200,9 @@ def run(output_path=None, user_provided_master_path=None, date_range=None):
             block_start_row=BLOCK_START,
             interested_range=DAY_RANGE,
             master_path=user_provided_master_path,
-            date_range=date_range)[0]
+            date_range=date_range,
+            block=block,
+            offsets=offsets)[0]
 
     chart = ScatterChart()
     chart.title = CHART_TITLE
@@ -7,6 +7,7 @@ import sys
 
 from typing import List, Tuple
 
+import numpy as np
 from openpyxl import load_workbook
 
 from bcompiler.utils import ROOT_PATH, runtime_config
@@ -45,6 +46,135 @@ class DatamapData:
         return self._lines[position]
 
 
+BlockCell = collections.namedtuple('BlockCell', ['value'])
+
+
+class MasterBlock:
+    """
+    The project titles and a block of rows from a master, read once, read-only,
+    into memory.
+
+    cell(row=, column=) returns an object with a .value, as a worksheet's
+    does, so code written against a worksheet can use a MasterBlock instead.
+    Rows are numbered as in the master; only row 1 and first_row to last_row
+    are available.
+    """
+
+    def __init__(self, master: str, first_row: int, last_row: int) -> None:
+        self.master = master
+        self.first_row = first_row
+        self.last_row = last_row
+        wb = load_workbook(master, read_only=True)
+        ws = wb.active
+        self.titles = next(ws.iter_rows(max_row=1, values_only=True), ())
+        self.rows = list(ws.iter_rows(min_row=first_row, max_row=last_row, values_only=True))
+        wb.close()
+
+    @property
+    def projects(self) -> List:
+        """Project titles, as in projects_in_master()."""
+        return [title for title in self.titles[1:] if title is not None]
+
+    def value(self, row: int, column: int):
+        if row == 1:
+            values = self.titles
+        elif self.first_row <= row <= self.last_row:
+            try:
+                values = self.rows[row - self.first_row]
+            except IndexError:
+                # past the last row in the master
+                return None
+        else:
+            raise IndexError(
+                f"Row {row} is not in the block read from {self.master} "
+                f"(rows {self.first_row} to {self.last_row})")
+        return values[column - 1] if column <= len(values) else None
+
+    def cell(self, row: int, column: int) -> BlockCell:
+        return BlockCell(self.value(row, column))
+
+    def date_ordinals(self, rows: range) -> np.ndarray:
+        """
+        The values in rows as date ordinals, in an array with a row for each
+        of rows and a column for each column of the master (column A is index
+        0). Values that date_convertor() cannot make into a date are NaN.
+        """
+        width = max([len(self.titles)] + [len(values) for values in self.rows])
+        ordinals = np.full((len(rows), width), np.nan)
+        for i, row in enumerate(rows):
+            for col in range(2, width + 1):
+                value = date_convertor(self.value(row, col))
+                if isinstance(value, datetime.date):
+                    ordinals[i, col - 1] = value.toordinal()
+        return ordinals
+
+
+def load_master_block(master: str, first_row: int, last_row: int) -> MasterBlock:
+    """
+    Returns a MasterBlock, exiting with the same message as projects_in_master()
+    if the master cannot be found.
+    """
+    try:
+        return MasterBlock(master, first_row, last_row)
+    except FileNotFoundError:
+        logger.critical("Please ensure you specify a master file in the command or use the correctly named"
+                        " master file in your auxiliary directory.")
+        sys.exit(1)
+
+
+def milestone_block(master: str, block_start: int, block_end: int) -> MasterBlock:
+    """
+    Reads every row of the master that the swimlane analysers use, once: the
+    milestone rows from block_start to block_end and the dates just after.
+    """
+    return load_master_block(master, block_start, block_end + 2)
+
+
+def splat_date_range(dt: str):
+    """Helper function to parse a date in dd/mm/yy format to a list of ints."""
+    xs = dt.split('/')
+    if len(xs[-1]) == 2:
+        xs[-1] = "".join(["20", xs[-1]])
+        logger.debug(f"Handling two digit date in argument. Assuming year is {xs[-1]}.")
+    xs = [xs[2], xs[1], xs[0]]
+    logger.debug(f"Splatting {dt}")
+    return [int(i) for i in xs]
+
+
+def date_range_milestones(dates: np.ndarray, date_ends: list) -> np.ma.MaskedArray:
+    """
+    Helper function to calculate Column C in resulting milestones spreadsheet.
+    Uses start and end dates to define boundaries to milestones: gives the days
+    from the start date to each of dates, masked where outside the boundaries.
+    """
+    return days_in_window(dates, *date_ends)
+
+
+def date_diff_column(dates: np.ndarray, interested_range: int,
+                     today: datetime.date = None) -> np.ma.MaskedArray:
+    """
+    Helper function to calculate Column C in the resulting milestones spreadsheet,
+    counting days from today (the real today if not given).
+    """
+    return days_ahead(dates, today or datetime.date.today(), interested_range)
+
+
+def day_offsets(block: MasterBlock, rows: range, interested_range: int,
+                date_range=None, today: datetime.date = None) -> np.ma.MaskedArray:
+    """
+    Column C values for every project in the master, in one pass: an array with
+    a row per milestone date in rows and a column per master column, masked
+    where a milestone is not to be charted.
+    """
+    dates = block.date_ordinals(rows)
+    if date_range:
+        return date_range_milestones(
+            dates,
+            [datetime.date(*splat_date_range(date_range[0])),
+             datetime.date(*splat_date_range(date_range[1]))])
+    return date_diff_column(dates, interested_range, today)
+
+
 # IMPLEMENT A CLASS THAT SEEKS OUT ALL THE APPROVAL AND ASSURANCE MILESTONES
 # CELLS WE NEED AND MAKE THEM AN ITERATOR
 
@@ -91,6 +221,28 @@ def diff_date_list(start_date: datetime.date, end_date: datetime.date) -> list:
     return [end_date - datetime.timedelta(days=x) for x in range(0, (end_date - start_date).days)]
 
 
+def days_in_window(ordinals: np.ndarray, start: datetime.date,
+                   end: datetime.date) -> np.ma.MaskedArray:
+    """
+    Days from start to each of the date ordinals, masked unless the date is
+    after start and no later than end - the dates in diff_date_list(start, end).
+    """
+    offsets = ordinals - start.toordinal()
+    in_window = (offsets >= 1) & (offsets <= (end - start).days)
+    return np.ma.masked_array(offsets, mask=~in_window)
+
+
+def days_ahead(ordinals: np.ndarray, today: datetime.date,
+               interested_range: int) -> np.ma.MaskedArray:
+    """
+    Days from today to each of the date ordinals, masked unless it is at least
+    1 and less than interested_range.
+    """
+    offsets = ordinals - today.toordinal()
+    in_range = (offsets >= 1) & (offsets < interested_range)
+    return np.ma.masked_array(offsets, mask=~in_range)
+
+
 def get_number_of_projects(source_wb) -> int:
     """
     Simple helper function to get an accurate number of projects in a master.
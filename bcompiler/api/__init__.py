@@ -1,5 +1,6 @@
 from .api import project_data_from_master_api as project_data_from_master
 from ..core.master import Master as Master
 from ..core.row import Row as Row
+from ..core.series import MasterSeries as MasterSeries
 from ..core.temporal import FinancialYear as FinancialYear
 from ..core.temporal import Quarter as Quarter
@@ -5,18 +5,23 @@ import os
 import re
 import sys
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime
-from typing import Dict, List
+from itertools import repeat
+from typing import Dict, Iterator, List, Tuple, Union
 
 from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
 
-from bcompiler.process import Cleanser
 from bcompiler.process.cellformat import CellFormatState
 from bcompiler.process.simple_comparitor import FileComparitor, ParsedMaster
 from bcompiler.utils import DATAMAP_RETURN_TO_MASTER, OUTPUT_DIR, RETURNS_DIR
 from bcompiler.utils import runtime_config as config
-from bcompiler.process.cleansers import DATE_REGEX_TIME
-from bcompiler.process.datamap import Datamap
+from bcompiler.process.cleansers import (DATE_REGEX_TIME, clean, clean_cache, cleaning_cache,
+                                         set_clean_cache)
+from bcompiler.process.datamap import CompiledDatamap, DatamapTarget
+from bcompiler.process.cache import ReturnCache
+from bcompiler.process.extract import ReturnExtractor
 
 CELL_REGEX = re.compile('[A-Z]+[0-9]+')
 DROPDOWN_REGEX = re.compile('^\D*$')
@@ -49,82 +54,65 @@ def get_current_quarter(source_file: str) -> str:
     return q
 
 
-def parse_source_cells(source_file: str, datamap_source_file: str) -> \
+def _clean_source_value(v, target: DatamapTarget, source_file: str):
+    """
+    Tidies up a value read from a return and runs it through the Cleanser.
+    """
+    if v is None:
+        logger.debug(
+            "{} in {} is empty.".format(
+                target.cell_reference,
+                target.template_sheet))
+    elif type(v) == str:
+        v = v.rstrip()
+    elif type(v) == float:
+        v = decimal.Decimal(v)
+        v = v.quantize(decimal.Decimal('.01'), rounding=decimal.ROUND_HALF_EVEN)
+    else:
+        logger.debug(
+            "{} in {} is {}".format(
+                target.cell_reference,
+                target.template_sheet,
+                v))
+    # Cleanser only cleans strings
+    if isinstance(v, str):
+        v = clean(v)
+    return v
+
+
+def parse_source_cells(source_file: str, datamap: Union[str, CompiledDatamap]) -> \
         List[Dict[str, str]]:
     """
     Takes an Excel source file (populated template), and a datamap and extracts
     the data from the source file according to datamap mappings.
+
+    datamap should be a CompiledDatamap, built once per run. The path to a
+    datamap CSV file is also accepted, in which case it is compiled here.
     """
-    ls_of_dataline_dicts = []
-    wb = load_workbook(source_file, read_only=True, data_only=True)
-    datamap_obj = Datamap()
-    datamap_obj.cell_map_from_csv(datamap_source_file)
-    for item in datamap_obj.cell_map:
-        if item.template_sheet == "":
-            continue
-        if item.template_sheet is not None and item.cell_reference is not None:
+    if not isinstance(datamap, CompiledDatamap):
+        datamap = CompiledDatamap.from_csv(datamap)
+    values = [None] * len(datamap)
+    with ReturnExtractor(source_file) as extractor:
+        for sheet, targets in datamap.by_sheet.items():
+            wanted = [(t.row, t.column) for t in targets if t.row is not None]
             try:
-                ws = wb[item.template_sheet]
+                cells = extractor.cells(sheet, wanted)
             except KeyError as e:
                 logger.critical(f"{e}.{source_file} is not a BICC template. Not processing. Remove it!")
                 sys.exit()
-                pass
-            try:
-                v = ws[item.cell_reference].value
-            except IndexError:
-                logger.error(
-                    "Datamap wants sheet: {}; cellref: {} but this is out"
-                    "of range.\n\tFile: {}".format(
-                        item.template_sheet,
-                        item.cell_reference,
-                        source_file))
-                v = ""
-            except ValueError as e:
-                logger.critical(f"{e.args[0]} at cell {ws.title}:{item.cell_reference}. This value will NOT be transferred to master. Skipping...")
-                v = "NOT TRANSFERRED DUE TO ERROR: Refer to bcompiler log"
-                pass
-            else:
-                if v is None:
-                    logger.debug(
-                        "{} in {} is empty.".format(
-                            item.cell_reference,
-                            item.template_sheet))
-                elif type(v) == str:
-                    v = v.rstrip()
-                elif type(v) == float:
-                    v = decimal.Decimal(v)
-                    v = v.quantize(decimal.Decimal('.01'), rounding=decimal.ROUND_HALF_EVEN)
-                else:
-                    logger.debug(
-                        "{} in {} is {}".format(
-                            item.cell_reference,
-                            item.template_sheet,
-                            v))
-                try:
-                    c = Cleanser(v)
-                except IndexError:
-                    logger.error(
-                        ("Trying to clean an empty cell {} at sheet {} in {}. "
-                         "Ignoring.").format(
-                            item.cell_reference, item.template_sheet, source_file))
-                except TypeError:
-                    pass
-                else:
-                    v = c.clean()
-            destination_kv = dict(gmpp_key=(item.cell_key).rstrip(), gmpp_key_value=v)
-            ls_of_dataline_dicts.append(destination_kv)
-    return ls_of_dataline_dicts
+            for target in targets:
+                if target.row is None:
+                    logger.critical(f"Invalid cell reference at cell {sheet}:{target.cell_reference}. This value will NOT be transferred to master. Skipping...")
+                    values[target.index] = "NOT TRANSFERRED DUE TO ERROR: Refer to bcompiler log"
+                    continue
+                v = cells[(target.row, target.column)]
+                values[target.index] = _clean_source_value(v, target, source_file)
+    return [dict(gmpp_key=target.cell_key, gmpp_key_value=v)
+            for target, v in zip(datamap.targets, values)]
 
 
 def _index_projects(parsed_master: FileComparitor) -> dict:
-    _project_header_index = {}
-    wb = load_workbook(parsed_master.data.master_file)
-    ws = wb.active
-    _projects = parsed_master.data.projects
-    for cell in ws[1][1:]:
-        if cell.value in _projects:
-            _project_header_index[cell.value] = cell.col_idx
-    return _project_header_index
+    return parsed_master.data.project_header_index
 
 
 def parse_comparison_master(compare_master: str) -> FileComparitor:
@@ -138,18 +126,12 @@ def _remove_datetimes(out_map):
     return out_map
 
 
-def write_excel(source_file, count, workbook, compare_master=None, comparitor=None) -> None:
+def _master_column(out_map, count, comparitor=None) -> List[Tuple]:
     """
-    Writes all return data to a single master Excel sheet.
+    Returns the column of (value, fill, number_format) tuples for a single
+    return in the master, in datamap order. fill and number_format are None
+    where there is nothing to compare the value with.
     """
-    ws = workbook.active
-
-    # give it a title
-    ws.title = "Constructed BICC Data Master"
-
-
-    # this is the data from the source spreadsheet
-    out_map = parse_source_cells(source_file, DATAMAP_RETURN_TO_MASTER)
     out_map = _remove_datetimes(out_map)
 
     # we need to the project name to work out index order for comparing
@@ -176,145 +158,272 @@ def write_excel(source_file, count, workbook, compare_master=None, comparitor=No
                  "match. Alternatively, this could be a new file.").format(
                     project_name))
 
+    column = []
+    for d in out_map:
+        c_format = CellFormatState()
+
+        try:
+            d['gmpp_key'] = clean(d['gmpp_key'])
+            if count == 1:
+                compare_val = comparitor.compare(this_index, d['gmpp_key'].rstrip())
+            else:
+                compare_val = comparitor.compare(this_index, d['gmpp_key'])
+            if isinstance(compare_val, str) and compare_val is not None and re.match(DATE_REGEX_TIME, compare_val):
+                ds = compare_val.split(' ')
+                comps = [int(x) for x in ds[0].split('-')]
+                compare_val = datetime(*comps)
+        except (UnboundLocalError, AttributeError):
+            compare_val = False
+
+        # TODO - apply number format WITHOUT a compare_val
+
+        # if there is something to compare it
+        if compare_val:
+            c_format.action(
+                compare_val=compare_val,
+                this_val=d['gmpp_key_value'],
+                key=d['gmpp_key'])
+            formt = c_format.export_rule()
+            column.append((d['gmpp_key_value'], formt[0], formt[1] or None))
+        else:
+            # there is nothing to compare to so no formatting required
+            # just print the value
+            column.append((d['gmpp_key_value'], None, None))
+    return column
+
+
+def write_excel(source_file, count, workbook, compare_master=None, comparitor=None, out_map=None) -> None:
+    """
+    Writes all return data to a single master Excel sheet.
+
+    If out_map is given (i.e. the return has already been parsed, perhaps in
+    another process), source_file is not opened again.
+    """
+    ws = workbook.active
+
+    # give it a title
+    ws.title = "Constructed BICC Data Master"
+
+    # this is the data from the source spreadsheet
+    if out_map is None:
+        out_map = parse_source_cells(source_file, DATAMAP_RETURN_TO_MASTER)
+
     if count == 1:
-        i = 1
         # this one writes the first column, the keys
-        for d in out_map:
-            c = ws.cell(row=i, column=1)
-            c.value = d['gmpp_key']
-            i += 1
-        i = 1
+        for i, d in enumerate(out_map, start=1):
+            ws.cell(row=i, column=1).value = d['gmpp_key']
 
-        # then it writes the second column with the values
-        for d in out_map:
+    for i, (value, fill, number_format) in enumerate(
+            _master_column(out_map, count, comparitor), start=1):
+        c = ws.cell(row=i, column=count + 1)
+        c.value = value
+        if fill is not None:
+            c.fill = fill
+        if number_format is not None:
+            c.number_format = number_format
 
-            c = ws.cell(row=i, column=2)
-            c_format = CellFormatState()
 
-            try:
-                cs = Cleanser(d['gmpp_key'])
-                d['gmpp_key'] = cs.clean()
-                compare_val = comparitor.compare(this_index, d['gmpp_key'].rstrip())
-                if isinstance(compare_val, str) and compare_val is not None and re.match(DATE_REGEX_TIME, compare_val):
-                    ds = compare_val.split(' ')
-                    comps = [int(x) for x in ds[0].split('-')]
-                    compare_val = datetime(*comps)
-
-            except (UnboundLocalError, AttributeError):
-                compare_val = False
-
-            # TODO - apply number format WITHOUT a compare_val
-
-            # if there is something to compare it
-            if compare_val:
-                c_format.action(
-                    compare_val=compare_val,
-                    this_val=d['gmpp_key_value'],
-                    key=d['gmpp_key'])
-                formt = c_format.export_rule()
-                c.fill = formt[0]
-                if formt[1] == "":
-                    c.value = d['gmpp_key_value']
-                else:
-                    c.value = d['gmpp_key_value']
-                    c.number_format = formt[1]
-            else:
-                # there is nothing to compare to so no formatting required
-                # just print the value
-                c.value = d['gmpp_key_value']
-            i += 1
-    else:
-        i = 1
-        # now we have no need of the keys any more so we're just writing
-        # values here
-        for d in out_map:
-            c = ws.cell(row=i, column=count + 1)
-            c_format = CellFormatState()
+def _write_streamed_master(keys: List[str], columns: List[List[Tuple]], output_file: str) -> None:
+    """
+    Saves the master using openpyxl's write-only workbook. columns holds one
+    list of (value, fill, number_format) tuples per return, as built by
+    _master_column(); they are transposed into rows here because a
+    write-only worksheet can only be written a row at a time. That is why
+    all the columns have to be passed in at once, rather than written as
+    each return is parsed.
+    """
+    workbook = Workbook(write_only=True)
+    ws = workbook.create_sheet("Constructed BICC Data Master")
+    for key, row in zip(keys, zip(*columns)):
+        cells = [key]
+        for value, fill, number_format in row:
+            if fill is None and number_format is None:
+                cells.append(value)
+                continue
+            c = WriteOnlyCell(ws, value=value)
+            if fill is not None:
+                c.fill = fill
+            if number_format is not None:
+                c.number_format = number_format
+            cells.append(c)
+        ws.append(cells)
+    workbook.save(output_file)
+
+
+def clean_cache_size() -> int:
+    """
+    The number of cleaned values to cache during a compile, from the
+    cache_size option in the [Cleanser] section of config.ini. Caching is off
+    (0) if it is not set.
+    """
+    return config.getint('Cleanser', 'cache_size', fallback=0)
 
-            try:
-                cs = Cleanser(d['gmpp_key'])
-                d['gmpp_key'] = cs.clean()
-                compare_val = comparitor.compare(this_index, d['gmpp_key'])
-                if isinstance(compare_val, str) and compare_val is not None and re.match(DATE_REGEX_TIME, compare_val):
-                    ds = compare_val.split(' ')
-                    comps = [int(x) for x in ds[0].split('-')]
-                    compare_val = datetime(*comps)
-            except (UnboundLocalError, AttributeError):
-                compare_val = False
-
-            # if there is something to compare it
-            if compare_val:
-                c_format.action(
-                    compare_val=compare_val,
-                    this_val=d['gmpp_key_value'],
-                    key=d['gmpp_key'])
-                formt = c_format.export_rule()
-                c.fill = formt[0]
-                if formt[1] == "":
-                    c.value = d['gmpp_key_value']
-                else:
-                    c.value = d['gmpp_key_value']
-                    c.number_format = formt[1]
-            else:
-                # there is nothing to compare to so no formatting required
-                # just print the value
-                c.value = d['gmpp_key_value']
-            i += 1
 
+def _return_files(returns_dir: str) -> List[str]:
+    """
+    Returns paths to the spreadsheet files in returns_dir, sorted by file
+    name so that the column order of the compiled master is the same whether
+    returns are parsed serially or in parallel.
+    """
+    files = []
+    for file in sorted(os.listdir(returns_dir)):
+        if fnmatch.fnmatch(file, '*.xlsm') or fnmatch.fnmatch(file, '*.XLSX') or fnmatch.fnmatch(file, '*.xlsx'):
+            files.append(os.path.join(returns_dir, file))
+        elif fnmatch.fnmatch(file, '*.xlsm#') or fnmatch.fnmatch(file, '*.xlsx#'):
+            logger.warning("You have a file open in your spreadsheet program. Ignoring the lock file.")
+        else:
+            logger.warning("Non-spreadsheet file detected: {}.".format(file))
+    return files
+
+
+def _parse_counting_cleans(file: str, datamap: CompiledDatamap, cache_size: int):
+    """
+    parse_source_cells(file, datamap) in a worker process, with the hits,
+    misses and evictions of the worker's CleanCache while parsing it, so that
+    they can be added to the counts in the main process.
 
-def run(compare_master=None, comparitor=None):
+    The worker's CleanCache is set up to hold cache_size entries the first
+    time it parses a file, and kept for the files it parses after that.
     """
-    Run the compile function.
+    cache = clean_cache()
+    if (cache.maxsize if cache is not None else 0) != max(cache_size, 0):
+        cache = set_clean_cache(cache_size)
+    if cache is None:
+        return parse_source_cells(file, datamap), (0, 0, 0)
+    before = (cache.hits, cache.misses, cache.evictions)
+    out_map = parse_source_cells(file, datamap)
+    after = (cache.hits, cache.misses, cache.evictions)
+    return out_map, tuple(a - b for a, b in zip(after, before))
+
+
+def _counted_cleans(parsed) -> Iterator[List[Dict[str, str]]]:
     """
-    # if we want to do a comparison
-    if comparitor:
+    Adds the counts from each _parse_counting_cleans() result to the
+    CleanCache in use in this process, and yields the parsed data.
+    """
+    cache = clean_cache()
+    for out_map, (hits, misses, evictions) in parsed:
+        if cache is not None:
+            cache.hits += hits
+            cache.misses += misses
+            cache.evictions += evictions
+        yield out_map
 
-        workbook = Workbook()
-        count = 1
-        for file in os.listdir(RETURNS_DIR):
-            if fnmatch.fnmatch(file, '*.xlsm') or fnmatch.fnmatch(file, '*.XLSX') or fnmatch.fnmatch(file, '*.xlsx'):
-                logger.info("Processing {}".format(file))
-                write_excel(
-                    (os.path.join(RETURNS_DIR, file)),
-                    count=count,
-                    workbook=workbook,
-                    compare_master=None,
-                    comparitor=comparitor
-                )
-                count += 1
-            elif fnmatch.fnmatch(file, '*.xlsm#' or fnmatch.fnmatch(file, '*.xlsx#')):
-                logger.warning("You have a file open in your spreadsheet program. Ignoring the lock file.")
-            else:
-                logger.critical("There are no Excel files in {}. Copy some in there!".format(RETURNS_DIR))
-        q_string = config['QuarterData']['CurrentQuarter'].split()[0]
-        OUTPUT_FILE = '/'.join([OUTPUT_DIR, 'compiled_master_{}_{}.xlsx'.format(TODAY, q_string)])
-        workbook.save(OUTPUT_FILE)
+
+def _parsed_returns(files: List[str], datamap: CompiledDatamap, jobs: int = 1,
+                    cache: ReturnCache = None) -> Iterator[Tuple[str, List[Dict[str, str]]]]:
+    """
+    Yields (file, parsed data) for each file, in the order given. With jobs
+    greater than 1, the files are parsed in a pool of worker processes; the
+    results are still yielded in order so that the master can be written in
+    this process.
+
+    If cache is given, files it already holds are not parsed again and newly
+    parsed files are added to it. The CleanCache counts of the worker
+    processes are added to those of the CleanCache in use in this process.
+    """
+    cached = {}
+    if cache is not None:
+        for file in files:
+            out_map = cache.get(file)
+            if out_map is not None:
+                cached[file] = out_map
+        logger.info("{} of {} returns unchanged since last compile".format(len(cached), len(files)))
+    to_parse = [file for file in files if file not in cached]
+
+    if jobs > 1 and len(to_parse) > 1:
+        logger.info("Parsing {} returns using {} processes".format(len(to_parse), jobs))
+        # each worker has a cache of the same size as the one in use here
+        cleans = clean_cache()
+        cache_size = cleans.maxsize if cleans is not None else 0
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        parsed = _counted_cleans(executor.map(_parse_counting_cleans, to_parse, repeat(datamap),
+                                              repeat(cache_size)))
     else:
-        # we just want a straight master with no change indication
+        executor = None
+        parsed = (parse_source_cells(file, datamap) for file in to_parse)
+
+    try:
+        for file in files:
+            if file in cached:
+                yield file, cached[file]
+                continue
+            out_map = next(parsed)
+            if cache is not None:
+                cache.put(file, out_map)
+            yield file, out_map
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def run(compare_master=None, comparitor=None, jobs=1, write_only=False, incremental=False):
+    """
+    Run the compile function.
+
+    jobs is the number of processes used to parse the returns. The master
+    itself is always written by this process.
+
+    With write_only, each return is reduced to a column of values and
+    formats as it is compiled and the master is written at the end using
+    openpyxl's streaming writer, rather than building it cell by cell in an
+    in-memory workbook. This saves the memory taken by openpyxl's cell
+    objects, but memory still grows with the number of returns: each return
+    is a column of the master and the writer works a row at a time, so every
+    column is held until the last return has been parsed.
+
+    With incremental, parsed returns are cached in OUTPUT_DIR and only
+    returns that have changed since the last incremental compile (or were
+    not in it) are parsed again.
+    """
+    try:
+        files = _return_files(RETURNS_DIR)
+    except FileNotFoundError:
+        logger.critical("There is no 'returns' directory and therefore "
+                        "therefore no"
+                        " returns to compile. Ensure you have the path "
+                        "'bcompiler/source/returns' and dump your returns "
+                        " files in there. bcompiler -d may help.")
+        return
+    if not files:
+        logger.critical("There are no Excel files in {}. Copy some in there!".format(RETURNS_DIR))
+
+    datamap = CompiledDatamap.from_csv(DATAMAP_RETURN_TO_MASTER)
+    # the cache is only for this compile, so is put back as it was afterwards
+    with cleaning_cache(clean_cache_size()) as cleans:
+        cache = ReturnCache(OUTPUT_DIR, datamap) if incremental else None
         workbook = Workbook()
-        count = 1
-        try:
-            d = os.listdir(RETURNS_DIR)
-        except FileNotFoundError:
-            logger.critical("There is no 'returns' directory and therefore "
-                            "therefore no"
-                            " returns to compile. Ensure you have the path "
-                            "'bcompiler/source/returns' and dump your returns "
-                            " files in there. bcompiler -d may help.")
-            return
-        for file in d:
-            if fnmatch.fnmatch(file, '*.xlsm') or fnmatch.fnmatch(file, '*.XLSX') or fnmatch.fnmatch(file, '*.xlsx'):
-                logger.info("Processing {}".format(file))
-                write_excel(
-                    (os.path.join(RETURNS_DIR, file)),
-                    count=count,
-                    workbook=workbook,
-                )
-                count += 1
-            elif fnmatch.fnmatch(file, '*.xlsm#' or fnmatch.fnmatch(file, '*.xlsx#')):
-                logger.warning("You have a file open in your spreadsheet program. Ignoring the lock file.")
-            else:
-                logger.warning("Non-spreadsheet file detected: {}.", format(file))
+        keys = []
+        columns = []
+        for count, (file, out_map) in enumerate(_parsed_returns(files, datamap, jobs, cache), start=1):
+            logger.info("Processing {}".format(os.path.basename(file)))
+            # if we want to do a comparison, comparitor is passed along; otherwise
+            # we just want a straight master with no change indication
+            if write_only:
+                if count == 1:
+                    keys = [d['gmpp_key'] for d in out_map]
+                columns.append(_master_column(out_map, count, comparitor))
+                continue
+            write_excel(
+                file,
+                count=count,
+                workbook=workbook,
+                compare_master=None,
+                comparitor=comparitor,
+                out_map=out_map
+            )
         q_string = config['QuarterData']['CurrentQuarter'].split()[0]
         OUTPUT_FILE = '/'.join([OUTPUT_DIR, 'compiled_master_{}_{}.xlsx'.format(TODAY, q_string)])
-        workbook.save(OUTPUT_FILE)
+        if write_only:
+            _write_streamed_master(keys, columns, OUTPUT_FILE)
+        else:
+            workbook.save(OUTPUT_FILE)
+        if cache is not None:
+            cache.save()
+        if cleans is not None:
+            if jobs > 1:
+                used = "up to {} entries in each process".format(cleans.maxsize)
+            else:
+                used = "{} of {} entries used".format(len(cleans), cleans.maxsize)
+            logger.info("Cleanser cache: {} hits, {} misses, {} evictions ({})".format(
+                cleans.hits, cleans.misses, cleans.evictions, used))
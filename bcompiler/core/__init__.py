@@ -1,3 +1,4 @@
 from .row import Row
 from .temporal import Quarter, FinancialYear
 from .master import Master, ProjectData
+from .series import MasterSeries
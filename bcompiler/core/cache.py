@@ -0,0 +1,128 @@
+"""
+On-disk cache of parsed master spreadsheets.
+
+Parsing a large master with project_data_from_master() takes tens of
+seconds, and every analyser and every ``Master`` does it again. MasterCache
+keeps the parsed ``{project: {key: value}}`` data in a pickle file per
+master, so that the second and later loads of an unchanged master only cost
+unpickling it.
+
+The cache is only used when asked for: ``Master``, ``MasterSeries`` and the
+analysers take a ``cache_dir`` argument, which ``bcompiler --cache-masters``
+sets to CACHE_DIR.
+
+A cache file is used if the master's path, modification time and size are
+the same as when it was written. If the modification time or size have
+changed, the file's SHA-256 is checked too, so a master that has been copied
+or saved without changes is still a hit.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from typing import Optional
+
+import bcompiler
+from ..utils import ROOT_PATH, project_data_from_master
+
+logger = logging.getLogger('bcompiler.core.cache')
+
+CACHE_DIR = os.path.join(ROOT_PATH, ".cache", "masters")
+
+
+def _file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class MasterCache:
+    """
+    Parsed masters, stored as pickle files in cache_dir.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+
+    def cache_file(self, path: str) -> str:
+        """
+        The cache file for the master at path.
+        """
+        name = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.cache_dir, name + '.pickle')
+
+    def get(self, path: str) -> Optional[dict]:
+        """
+        Returns the cached data for the master at path, or None if there is
+        none or the master has changed.
+        """
+        cache_file = self.cache_file(path)
+        try:
+            with open(cache_file, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError, ImportError):
+            logger.warning("Ignoring unreadable master cache file {}".format(cache_file))
+            return None
+        if entry.get('version') != bcompiler.__version__ or entry.get('path') != os.path.abspath(path):
+            return None
+        stat = os.stat(path)
+        if (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+            return entry['data']
+        if entry['sha256'] == _file_digest(path):
+            # unchanged contents, so just bring the stored file details up to date
+            self._write(path, entry['data'], entry['sha256'])
+            return entry['data']
+        return None
+
+    def put(self, path: str, data: dict) -> None:
+        """
+        Stores data as the parsed form of the master at path.
+        """
+        self._write(path, data, _file_digest(path))
+
+    def _write(self, path: str, data: dict, sha256: str) -> None:
+        stat = os.stat(path)
+        entry = dict(
+            version=bcompiler.__version__,
+            path=os.path.abspath(path),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha256=sha256,
+            data=data)
+        cache_file = self.cache_file(path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = cache_file + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            logger.warning("Cannot write master cache file {}: {}".format(cache_file, e))
+
+    def project_data(self, path: str) -> dict:
+        """
+        project_data_from_master(path), from the cache if the master has not
+        changed since it was last parsed.
+        """
+        data = self.get(path)
+        if data is None:
+            logger.debug("Parsing {}".format(path))
+            data = project_data_from_master(path)
+            self.put(path, data)
+        else:
+            logger.debug("Using cached data for {}".format(path))
+        return data
+
+
+def cached_project_data(path: str, cache_dir: Optional[str] = None) -> dict:
+    """
+    project_data_from_master(path), via a MasterCache in cache_dir if it is
+    given.
+    """
+    if cache_dir is None:
+        return project_data_from_master(path)
+    return MasterCache(cache_dir).project_data(path)
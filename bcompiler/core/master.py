@@ -5,8 +5,10 @@ import unicodedata
 from pathlib import Path
 from typing import List, Tuple, Iterable, Optional, Any
 
-from ..utils import project_data_from_master
-from ..process.cleansers import DATE_REGEX_4
+from collections import OrderedDict
+
+from .cache import cached_project_data
+from ..process.cleansers import DATE_REGEX_4, clean_many
 from .temporal import Quarter
 
 from openpyxl import load_workbook
@@ -14,15 +16,30 @@ from openpyxl import load_workbook
 logger = logging.getLogger('bcompiler.utils')
 
 
+EN_DASH = unicodedata.lookup('EN DASH')
+HYPHEN_MINUS = unicodedata.lookup('HYPHEN-MINUS')
+
+
+def _normalise_key(key: str) -> str:
+    return key.replace(EN_DASH, HYPHEN_MINUS)
+
+
 class ProjectData:
     """
     ProjectData class
+
+    Lookups by key are resolved through indexes that are built from the data
+    the first time they are needed, so the data should not be changed after
+    a ProjectData has been created from it.
     """
     def __init__(self, d: dict) -> None:
         """
         :py:func:`OrderedDict` is easiest to get from project_data_from_master[x]
         """
         self._data = d
+        self._flat_index = None
+        self._key_positions = None
+        self._filter_results: dict = {}
 
     def __len__(self) -> int:
         return len(self._data)
@@ -30,36 +47,70 @@ class ProjectData:
     def __getitem__(self, item):
         return self._data[item]
 
+    def _build_flat_index(self) -> None:
+        """
+        Indexes the (key, value) items by stripped key with EN DASH replaced,
+        in data order, for pull_keys(flat=True).
+        """
+        self._flat_index = {}
+        for item in self._data.items():
+            if isinstance(item[0], str):
+                self._flat_index.setdefault(_normalise_key(item[0].strip()), []).append(item)
+
     def key_filter(self, key: str) -> List[Tuple]:
         """
         Return a list of (k, v) tuples if k in master key.
         """
-        data = [item for item in self._data.items() if key in item[0]]
+        try:
+            data = self._filter_results[key]
+        except KeyError:
+            data = [item for item in self._data.items() if key in item[0]]
+            self._filter_results[key] = data
         if not data:
             raise KeyError("Sorry, there is no matching data")
-        return (data)
+        return list(data)
 
     def pull_keys(self, input_iter: Iterable, flat=False) -> List[Tuple[Any, ...]]:
         """
         Returns a list of (key, value) tuples from ProjectData if key matches a
         key. The order of tuples is based on the order of keys passed in the iterable.
+
+        With flat=True, keys are matched ignoring surrounding whitespace and
+        treating EN DASH as a hyphen, and only the values are returned.
+
+        A key asked for more than once is returned that many times.
         """
+        first_index: dict = {}
+        counts: dict = {}
+        for idx, i in enumerate(input_iter):
+            first_index.setdefault(i, idx)
+            counts[i] = counts.get(i, 0) + 1
+
         if flat is True:
-            # search and replace troublesome EN DASH character
-            xs = [item for item in self._data.items()
-                  for i in input_iter if item[0].strip().replace(unicodedata.lookup('EN DASH'), unicodedata.lookup('HYPHEN-MINUS')) == i]
-            xs = [_convert_str_date_to_object(x) for x in xs]
-            ts = sorted(xs, key=lambda x: input_iter.index(x[0].strip().replace(unicodedata.lookup('EN DASH'), unicodedata.lookup('HYPHEN-MINUS'))))
-            ts = [item[1] for item in ts]
+            if self._flat_index is None:
+                self._build_flat_index()
+            ts = []
+            # first_index is in order of first appearance in input_iter
+            for i in first_index:
+                for item in self._flat_index.get(i, ()):
+                    ts.extend([_convert_str_date_to_object(item)[1]] * counts[i])
             return ts
         else:
-            xs = [item for item in self._data.items()
-                  for i in input_iter if item[0].replace(unicodedata.lookup('EN DASH'), unicodedata.lookup('HYPHEN-MINUS')) == i]
-            xs = [item for item in self._data.items()
-                  for i in input_iter if item[0] == i]
-            xs = [_convert_str_date_to_object(x) for x in xs]
-            ts = sorted(xs, key=lambda x: input_iter.index(x[0].replace(unicodedata.lookup('EN DASH'), unicodedata.lookup('HYPHEN-MINUS'))))
-            return ts
+            if self._key_positions is None:
+                self._key_positions = {key: pos for pos, key in enumerate(self._data)}
+            xs = []
+            for i in first_index:
+                if i not in self._data:
+                    continue
+                # ordered by where the key, with EN DASH replaced, is first
+                # asked for, then by position in the master
+                norm = _normalise_key(i)
+                if norm not in first_index:
+                    raise ValueError("{!r} is not in list".format(norm))
+                item = _convert_str_date_to_object((i, self._data[i]))
+                xs.append(((first_index[norm], self._key_positions[i]), [item] * counts[i]))
+            xs.sort(key=lambda x: x[0])
+            return [item for _, items in xs for item in items]
 
     def __repr__(self):
         return f"ProjectData() - with data: {id(self._data)}"
@@ -102,6 +153,18 @@ class Master:
 
         m1 = Master(Quarter(1, 2016), '/tmp/master_1_2016.xlsx')
 
+    Pass ``lazy=True`` to only read the keys and project titles up front. The
+    master xlsx is then kept open read-only and each project's data is read
+    the first time it is asked for, which is much quicker if you only need a
+    few projects from a large master::
+
+        m1 = Master(Quarter(1, 2016), '/tmp/master_1_2016.xlsx', lazy=True)
+        project_data = m1['Project Title']
+
+    Otherwise, if ``cache_dir`` is given, the parsed master is cached on disk
+    there (see :py:class:`bcompiler.core.cache.MasterCache`), so creating a
+    ``Master`` from the same, unchanged, master xlsx again is quick.
+
     Once you have a ``Master`` object, you can access project data from it, like this::
 
         project_data = m1['Project Title']
@@ -114,15 +177,89 @@ class Master:
         filename = m1.filename
         ..etc
     """
-    def __init__(self, quarter: Quarter, path: str) -> None:
+    def __init__(self, quarter: Quarter, path: str, lazy: bool = False,
+                 cache_dir: Optional[str] = None) -> None:
         self._quarter = quarter
         self.path = path
-        self._data = project_data_from_master(self.path)
-        self._project_titles = [item for item in self.data.keys()]
+        self.lazy = lazy
+        self._project_data: dict = {}
+        if lazy:
+            self._open_lazily()
+        else:
+            self._data = cached_project_data(self.path, cache_dir)
+            self._project_titles = [item for item in self.data.keys()]
         self.year = self._quarter.year
 
+    def _open_lazily(self) -> None:
+        """
+        Reads the keys in column A and the project titles in row 1, leaving
+        the workbook open read-only for _project_column() to read from.
+        """
+        self._wb = load_workbook(self.path, read_only=True)
+        self._ws = self._wb.active
+        header = next(self._ws.iter_rows(max_row=1, values_only=True), ())
+        col_a = [header[0] if header else None]
+        col_a.extend(row[0] if row else None
+                     for row in self._ws.iter_rows(min_row=2, max_col=1, values_only=True))
+        self._keys = clean_many(col_a)
+        # as in project_data_from_master, a title that appears twice takes
+        # the data from its last column
+        self._project_columns = {}
+        for col_idx, title in enumerate(header[1:], start=2):
+            if title is not None:
+                self._project_columns[title] = col_idx
+        self._project_titles = list(self._project_columns)
+        self._data = {}
+
+    def _read_projects(self, project_names) -> None:
+        """
+        Reads the data for each of project_names into _data, in a single pass
+        over the workbook.
+        """
+        columns = [(project_name, self._project_columns[project_name])
+                   for project_name in project_names]
+        if not columns:
+            return
+        min_col = min(col_idx for _, col_idx in columns)
+        max_col = max(col_idx for _, col_idx in columns)
+        read = [(OrderedDict(), col_idx - min_col) for _, col_idx in columns]
+        rows = self._ws.iter_rows(min_row=2, min_col=min_col, max_col=max_col, values_only=True)
+        for key, row in zip(self._keys[1:], rows):
+            for o, offset in read:
+                value = row[offset] if offset < len(row) else None
+                if type(value) == datetime.datetime:
+                    value = value.date()
+                o[key] = value
+        for (project_name, _), (o, _) in zip(columns, read):
+            self._data[project_name] = o
+
+    def _project_column(self, project_name) -> OrderedDict:
+        """
+        Returns the data for project_name, reading it from the workbook the
+        first time it is asked for.
+        """
+        if project_name not in self._data:
+            self._read_projects([project_name])
+        return self._data[project_name]
+
     def __getitem__(self, project_name):
-        return ProjectData(self._data[project_name])
+        # kept so that the indexes a ProjectData builds are reused
+        try:
+            return self._project_data[project_name]
+        except KeyError:
+            pass
+        if self.lazy:
+            project_data = ProjectData(self._project_column(project_name))
+        else:
+            project_data = ProjectData(self._data[project_name])
+        self._project_data[project_name] = project_data
+        return project_data
+
+    def close(self) -> None:
+        """Closes the master xlsx file if it was opened with ``lazy=True``.
+        """
+        if self.lazy:
+            self._wb.close()
 
     @property
     def data(self):
@@ -140,7 +277,14 @@ class Master:
             d = Master.data
             project_data = d['PROJECT_NAME']
 
+        With ``lazy=True``, this reads every project not already read.
+
         """
+        if self.lazy:
+            self._read_projects([project_name for project_name in self._project_titles
+                                 if project_name not in self._data])
+            return {project_name: self._data[project_name]
+                    for project_name in self._project_titles}
         return self._data
 
     @property
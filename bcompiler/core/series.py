@@ -0,0 +1,183 @@
+"""
+A run of masters for consecutive quarters, held as one table.
+"""
+import functools
+import logging
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import cached_project_data
+from .temporal import Quarter
+
+logger = logging.getLogger('bcompiler.utils')
+
+MASTER_FILE_NAME = re.compile(r'^master_(?P<quarter>[1-4])_(?P<year>\d{4})\.xlsx$')
+
+
+class MasterSeries:
+    """A series of :py:class:`bcompiler.api.Master` files, one for each quarter, read
+    from a directory of files named ``master_<quarter>_<year>.xlsx``, e.g.
+    ``master_1_2017.xlsx``.
+
+    Args:
+        directory (str): path to the directory containing the master xlsx files
+        jobs (int): number of processes used to parse the masters (default 1)
+        cache_dir (str): directory to cache the parsed masters in, as for
+            :py:class:`bcompiler.api.Master` (default None, no caching)
+
+    The masters are not read until their data is first asked for. They are then
+    all parsed, in parallel if ``jobs`` is more than 1, and every project's
+    data from every quarter is put into a single table, indexed by project,
+    quarter and key. Projects and keys do not have to be the same in every
+    master.
+
+    A project's values for a key, by quarter, are got like this::
+
+        from bcompiler.api import MasterSeries
+        series = MasterSeries('/tmp/masters')
+        series['Project Name 1', 'Total Forecast']
+
+    output: ``OrderedDict([(Quarter(3, 2016), 10.2), (Quarter(4, 2016), 11.0), ...])``
+
+    Only quarters whose master has that project and key are included.
+    :py:meth:`column` and :py:meth:`numeric` give a key's values for every
+    project and quarter as an array, for calculations across the whole series.
+    """
+
+    def __init__(self, directory: str, jobs: int = 1, cache_dir: Optional[str] = None) -> None:
+        self.directory = directory
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        found = []
+        for f in os.listdir(directory):
+            match = MASTER_FILE_NAME.match(f)
+            if match:
+                quarter = Quarter(int(match.group('quarter')), int(match.group('year')))
+                found.append((quarter, os.path.join(directory, f)))
+        if not found:
+            raise ValueError(f"No master files named master_<quarter>_<year>.xlsx in {directory}")
+        found.sort(key=lambda item: item[0].start_date)
+        self._paths: Dict[Quarter, str] = OrderedDict(found)
+        self._quarter_index = {quarter: idx for idx, quarter in enumerate(self._paths)}
+        self._values = None
+
+    @property
+    def quarters(self) -> List[Quarter]:
+        """The :py:class:`bcompiler.api.Quarter` of each master, in date order.
+        """
+        return list(self._paths)
+
+    @property
+    def paths(self) -> Dict[Quarter, str]:
+        """The path to the master xlsx file for each quarter.
+        """
+        return self._paths
+
+    @property
+    def projects(self) -> List[str]:
+        """Every project title in the series, in the order they first appear.
+        """
+        self._load()
+        return list(self._project_index)
+
+    @property
+    def keys(self) -> List[str]:
+        """Every key in the series, in the order they first appear.
+        """
+        self._load()
+        return list(self._key_index)
+
+    def _parsed_masters(self) -> List[dict]:
+        paths = list(self._paths.values())
+        parse = functools.partial(cached_project_data, cache_dir=self.cache_dir)
+        if self.jobs > 1 and len(paths) > 1:
+            logger.info(f"Parsing {len(paths)} masters using {self.jobs} processes")
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                return list(executor.map(parse, paths))
+        return [parse(path) for path in paths]
+
+    def _load(self) -> None:
+        """
+        Parses the masters and builds the table, if that has not been done.
+        """
+        if self._values is not None:
+            return
+        parsed = self._parsed_masters()
+
+        self._project_index: Dict[str, int] = OrderedDict()
+        self._key_index: Dict[str, int] = OrderedDict()
+        for data in parsed:
+            for project, project_data in data.items():
+                self._project_index.setdefault(project, len(self._project_index))
+                for key in project_data:
+                    self._key_index.setdefault(key, len(self._key_index))
+
+        shape = (len(self._project_index), len(parsed), len(self._key_index))
+        self._values = np.full(shape, None, dtype=object)
+        self._present = np.zeros(shape, dtype=bool)
+        for q_idx, data in enumerate(parsed):
+            # every project in a master normally has the same keys, so the
+            # columns they go in are only looked up again if the keys change
+            keys: Tuple = ()
+            columns = None
+            for project, project_data in data.items():
+                if tuple(project_data) != keys:
+                    keys = tuple(project_data)
+                    columns = np.array([self._key_index[key] for key in keys], dtype=int)
+                p_idx = self._project_index[project]
+                self._values[p_idx, q_idx, columns] = list(project_data.values())
+                self._present[p_idx, q_idx, columns] = True
+
+    def _index(self, project: str, key: str) -> Tuple[int, int]:
+        self._load()
+        try:
+            p_idx = self._project_index[project]
+        except KeyError:
+            raise KeyError(f"{project} is not in any master in {self.directory}")
+        try:
+            k_idx = self._key_index[key]
+        except KeyError:
+            raise KeyError(f"{key} is not a key in any master in {self.directory}")
+        return p_idx, k_idx
+
+    def __getitem__(self, item: Tuple[str, str]) -> Dict[Quarter, Any]:
+        project, key = item
+        p_idx, k_idx = self._index(project, key)
+        present = self._present[p_idx, :, k_idx]
+        values = self._values[p_idx, :, k_idx]
+        return OrderedDict((quarter, values[q_idx])
+                           for quarter, q_idx in self._quarter_index.items()
+                           if present[q_idx])
+
+    def column(self, key: str) -> np.ndarray:
+        """A key's values as an array indexed by (project, quarter), in the
+        order of :py:attr:`projects` and :py:attr:`quarters`. Where a project
+        or key is not in a quarter's master the value is ``None``.
+        """
+        self._load()
+        try:
+            k_idx = self._key_index[key]
+        except KeyError:
+            raise KeyError(f"{key} is not a key in any master in {self.directory}")
+        return self._values[:, :, k_idx]
+
+    def numeric(self, key: str) -> np.ma.MaskedArray:
+        """As :py:meth:`column`, but as a masked array of floats in which
+        anything that is not a number is masked, e.g. to total a key for every
+        quarter::
+
+            series.numeric('Total Forecast').sum(axis=0)
+        """
+        values = self.column(key)
+        mask = np.array([[not isinstance(v, (int, float)) for v in row] for row in values],
+                        dtype=bool).reshape(values.shape)
+        numbers = np.where(mask, 0, values).astype(float)
+        return np.ma.masked_array(numbers, mask=mask)
+
+    def __repr__(self):
+        return f"MasterSeries({self.directory!r})"
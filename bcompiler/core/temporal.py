@@ -114,6 +114,14 @@ class Quarter:
     def __repr__(self):
         return f"Quarter({self.quarter}, {self.year})"
 
+    def __eq__(self, other):
+        if not isinstance(other, Quarter):
+            return NotImplemented
+        return (self.quarter, self.year) == (other.quarter, other.year)
+
+    def __hash__(self):
+        return hash((self.quarter, self.year))
+
     @property
     def fy(self):
         """Return a :py:class:`core.temporal.FinancialYear` object.
@@ -19,15 +19,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 IN THE SOFTWARE. """
 
 import argparse
-import csv
 import datetime
+import functools
 import logging
 import os
 import re
 import sys
 import textwrap
+import time
 import unicodedata
-from typing import Dict, List
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 
 import colorlog
 from openpyxl import load_workbook
@@ -41,8 +44,10 @@ from bcompiler.analysers import (annex_run, financial_analyser_run,
                                  swimlane_run)
 from bcompiler.compile import parse_comparison_master
 from bcompiler.core import Master, Quarter
+from bcompiler.core.cache import CACHE_DIR as MASTER_CACHE_DIR
 from bcompiler.process import Cleanser
 from bcompiler.process.datamap import Datamap
+from bcompiler.templates import TemplatePatcher, TemplatePool
 from bcompiler.utils import (BLANK_TEMPLATE_FN, CLEANED_DATAMAP,
                              CURRENT_QUARTER, DATAMAP_MASTER_TO_RETURN,
                              DATAMAP_RETURN_TO_MASTER, OUTPUT_DIR, ROOT_PATH,
@@ -126,44 +131,25 @@ def keyword_args(args, func):
     """
     Helper function to parse commandline arguments related to --analyser keywords option.
     Func is a runner funtion defined elsewhere that does the work.
+
+    Every argument after 'keyword' is a search term.
     """
-    if args["xlsx"]:
-        if not args["master"]:  # user stipulates an output directory
-            try:
-                func(search_term=args["analyser"][1], xlsx=args["xlsx"])
-            except IndexError:
-                logger.critical(
-                    "You need to provide a search term, e.g. '--analyser keyword RAG'"
-                )
-            return
-        if args["master"]:  # user stipulates an output and a target master
-            try:
-                func(
-                    user_provided_master_path=args["master"][0],
-                    search_term=args["analyser"][1],
-                    xlsx=args["xlsx"],
-                )
-            except IndexError:
-                logger.critical(
-                    "You need to provide a search term, e.g. '--analyser keyword RAG'"
-                )
-            return
-        else:  # no options supplied - default options applied (saved to bcompiler/output, master from config.ini
-            try:
-                func(search_term=args["analyser"][1], xlsx=args["xlsx"])
-            except IndexError:
-                logger.critical(
-                    "You need to provide a search term, e.g. '--analyser keyword RAG'"
-                )
-            return
-    else:
-        try:
-            func(search_term=args["analyser"][1])
-        except IndexError:
-            logger.critical(
-                "You need to provide a search term, e.g. '--analyser keyword RAG'"
-            )
+    search_terms = args["analyser"][1:]
+    if not search_terms:
+        logger.critical(
+            "You need to provide a search term, e.g. '--analyser keyword RAG'"
+        )
         return
+    if args["xlsx"] and args["master"]:  # user stipulates an output and a target master
+        func(
+            user_provided_master_path=args["master"][0],
+            search_term=search_terms,
+            xlsx=args["xlsx"],
+        )
+    elif args["xlsx"]:  # default master from config.ini
+        func(search_term=search_terms, xlsx=args["xlsx"])
+    else:
+        func(search_term=search_terms)
 
 
 def get_parser():
@@ -245,6 +231,44 @@ def get_parser():
         help=("To be used with compile action; file path to master file "
               "to compare to compiled data"),
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help=("To be used with compile, --all or -r actions, or annex or rcf "
+              "analysers; number of processes used to parse the returns or "
+              "masters, save the forms or annexes, or count the rows in the "
+              "returns (default 1)"),
+    )
+    parser.add_argument(
+        "--write-only",
+        action="store_true",
+        help=("To be used with compile action; write the master using "
+              "openpyxl's streaming writer, which uses less memory"),
+    )
+    parser.add_argument(
+        "--patch-xml",
+        action="store_true",
+        help=("To be used with --all action; write each form by changing "
+              "only the populated cells in the template's XML, rather than "
+              "through openpyxl, which is much faster"),
+    )
+    parser.add_argument(
+        "--cache-masters",
+        action="store_true",
+        help=("To be used with --all action or the annex, keyword, financial "
+              "or rcf analysers; keep parsed masters in a cache in the "
+              "bcompiler directory, so that an unchanged master is not "
+              "parsed again"),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=("To be used with compile action; only parse returns that have "
+              "changed since the last incremental compile"),
+    )
     parser.add_argument(
         "-ll",
         "--loglevel",
@@ -406,109 +430,198 @@ def _initial_clean(key: str) -> str:
     return key
 
 
-def dm_tabs_list():
+def _form_cell_map() -> List:
     """
-    Takes the datamap and returns a list of all the different work sheet names in the dm.
+    The datamap's cells, with their keys cleaned to match those in the master.
     """
-
-    seen = []
-    with open(os.path.join(SOURCE_DIR, "datamap.csv"), "r") as f:
-        reader = csv.reader(f)
-        for line in reader:
-            seen.append(line[1])
-    from collections import OrderedDict
-
-    return list(OrderedDict.fromkeys(seen))[1:]
-
-
-def populate_blank_bicc_form(master_obj: Master, proj_num):
     datamap = Datamap()
     datamap.cell_map_from_csv(
         os.path.join(SOURCE_DIR, config["Datamap"]["name"]))
-    proj_data = master_obj.data
-    ls = master_obj.projects
-    test_proj = ls[int(proj_num)]
-    logger.info("Processing project {}.".format(test_proj))
-    test_proj_data = proj_data[test_proj]
-    blank = load_workbook(SOURCE_DIR + BLANK_TEMPLATE_FN, keep_vba=True)
-    ws_list = dm_tabs_list()
-    ws_summary = blank[ws_list[
-        0]]  # this sheet is treated differently as its connect to need for 'proj/prog name
-
     for item in datamap.cell_map:
         item.cell_key = _initial_clean(item.cell_key)
+    return datamap.cell_map
+
+
+# Where a datamap line is written in a form. sheet is None if the line's
+# sheet is not one the forms are populated on; the line is then only used to
+# warn about keys missing from the master.
+FormRoute = namedtuple('FormRoute', ['sheet', 'cell_reference', 'cell_key', 'kind'])
+
+# the value from the master is written
+ROUTE_VALUE = 0
+# the project's name is written, in the summary sheet
+ROUTE_NAME = 1
+# as ROUTE_VALUE, but the project's name is written in the summary sheet if
+# the master does not have the key
+ROUTE_NAME_IF_MISSING = 2
+
+DATE_STRING_RE = re.compile(r"(\d+/\d+/\d+)")
+
+
+def _form_routes(cell_map) -> Tuple[str, List[FormRoute]]:
+    """
+    Resolves cell_map, whose keys have already been cleaned, into the summary
+    sheet's name and a FormRoute for each line, so that populating each form
+    is a single pass over the routes. The first sheet in the datamap is the
+    summary sheet, which the project's name is written to.
+    """
+    sheets = list(OrderedDict.fromkeys(item.template_sheet for item in cell_map))
+    summary = sheets[0] if sheets else None
+    routes = []
+    for item in cell_map:
+        sheet = item.template_sheet or None
+        if "Project/Programme Name" not in item.cell_key:
+            kind = ROUTE_VALUE
+        elif sheet == summary:
+            kind = ROUTE_NAME
+        else:
+            kind = ROUTE_NAME_IF_MISSING
+        routes.append(FormRoute(sheet, item.cell_reference, item.cell_key, kind))
+    return summary, routes
+
+
+def _write_form_value(cell, value) -> None:
+    if isinstance(value, datetime.date):
+        cell.value = value
+        cell.number_format = "dd/mm/yyyy"
+        return
+    if isinstance(value, str) and DATE_STRING_RE.match(value):
+        cell.value = value
+        cell.number_format = "dd/mm/yyyy"
+    if value is None:
+        return
+    cell.value = Cleanser(str(value)).clean()
+
+
+def _populate_form(blank, summary: str, routes: List[FormRoute], test_proj,
+                   test_proj_data) -> None:
+    """
+    Writes the data for project test_proj into the blank template workbook,
+    following routes (see _form_routes).
+    """
+    sheets = {route.sheet: None for route in routes if route.sheet is not None}
+    for title in sheets:
+        sheets[title] = blank[title]
+    ws_summary = blank[summary]
+
+    for route in routes:
         try:
-            test_proj_data[item.cell_key]
+            value = test_proj_data[route.cell_key]
         except KeyError:
-            if "Project/Programme Name" in item.cell_key:
-                ws_summary[item.cell_reference].value = test_proj
-                continue
+            if route.kind != ROUTE_VALUE:
+                ws_summary[route.cell_reference].value = test_proj
             else:
                 logger.warning(
-                    f"Cannot find {item.cell_key} in {test_proj} - check for double spaces in cell in master. Skipping."
+                    f"Cannot find {route.cell_key} in {test_proj} - check for double spaces in cell in master. Skipping."
                 )
-                continue
-        """The first work sheet name in list is treated differently to the for loop below. This is because
-        as I understand it code is structured so that the first worksheet specifies the project/programme name"""
-        if item.template_sheet == ws_list[0]:
-            if "Project/Programme Name" in item.cell_key:
-                ws_summary[item.cell_reference].value = test_proj
-                continue
-            if isinstance(test_proj_data[item.cell_key], datetime.date):
-                ws_summary[item.cell_reference].value = test_proj_data[
-                    item.cell_key]
-                ws_summary[item.cell_reference].number_format = "dd/mm/yyyy"
-                continue
-            try:
-                if re.match(r"(\d+/\d+/\d+)", test_proj_data[item.cell_key]):
-                    ws_summary[item.cell_reference].value = test_proj_data[
-                        item.cell_key]
-                    ws_summary[
-                        item.cell_reference].number_format = "dd/mm/yyyy"
-            except TypeError:
-                pass
-            if test_proj_data[item.cell_key] is None:
-                continue
-            c = Cleanser(str(test_proj_data[item.cell_key]))
-            cleaned = c.clean()
-            ws_summary[item.cell_reference].value = cleaned
-        """for loop go through rest of worksheets in list"""
-        for tab in ws_list[1:]:
-            if item.template_sheet == tab:
-                ws = blank[tab]
-                if isinstance(test_proj_data[item.cell_key], datetime.date):
-                    c = Cleanser(str(test_proj_data[item.cell_key]))
-                    cleaned = c.clean()
-                    ws[item.cell_reference].value = test_proj_data[
-                        item.cell_key]
-                    ws[item.cell_reference].number_format = "dd/mm/yyyy"
-                    continue
-                try:
-                    if re.match(r"(\d+/\d+/\d+)",
-                                test_proj_data[item.cell_key]):
-                        ws[item.cell_reference].value = test_proj_data[
-                            item.cell_key]
-                        ws[item.cell_reference].number_format = "dd/mm/yyyy"
-                except TypeError:
-                    pass
-                if test_proj_data[item.cell_key] is None:
-                    continue
-                c = Cleanser(str(test_proj_data[item.cell_key]))
-                cleaned = c.clean()
-                ws[item.cell_reference].value = cleaned
-            else:
-                pass
+            continue
+        if route.kind == ROUTE_NAME:
+            ws_summary[route.cell_reference].value = test_proj
+        elif route.sheet is not None:
+            _write_form_value(sheets[route.sheet][route.cell_reference], value)
 
     imprint_current_quarter(ws_summary)
 
-    blank.save("/".join([
-        OUTPUT_DIR,
-        "{}_{}_Return.xlsm".format(test_proj.replace("/", "_"),
-                                   config["QuarterData"]["CurrentQuarter"]),
-    ]))
 
+class FormWriter:
+    """
+    Populates and saves a form for any project, using a datamap and blank
+    template that are only read once. The template is parsed into a
+    TemplatePool and each form is populated in a copy of it, or, if
+    patch_xml is True, each form is written by a TemplatePatcher, which
+    changes only the template's XML for the populated cells.
+    """
+
+    def __init__(self, cell_map: List, template_path: str, output_dir: str,
+                 patch_xml: bool = False) -> None:
+        self.summary, self.routes = _form_routes(cell_map)
+        self.output_dir = output_dir
+        if patch_xml:
+            self.template = TemplatePatcher(template_path)
+        else:
+            # the datamap cells, and the quarter in the summary sheet, are
+            # the only cells written to
+            cells = [(item.template_sheet, item.cell_reference) for item in cell_map]
+            cells.append((self.summary, "G3"))
+            self.template = TemplatePool(template_path, cells=cells)
+
+    def write(self, project: str, project_data) -> str:
+        """
+        Populates a form with project_data and saves it. Returns the file
+        name.
+        """
+        blank = self.template.copy()
+        _populate_form(blank, self.summary, self.routes, project, project_data)
+        file_name = "{}_{}_Return.xlsm".format(
+            project.replace("/", "_"), config["QuarterData"]["CurrentQuarter"])
+        blank.save("/".join([self.output_dir, file_name]))
+        return file_name
+
+
+# each worker process populating forms has its own FormWriter, made by the
+# first form it writes; it is never set in the process that runs the pool
+_form_writer = None
 
-def pop_all():
+
+def _timed_write(writer: FormWriter, project: str, project_data):
+    start = time.perf_counter()
+    file_name = writer.write(project, project_data)
+    return file_name, time.perf_counter() - start
+
+
+def _write_form(writer_args: tuple, project: str, project_data):
+    global _form_writer
+    if _form_writer is None:
+        _form_writer = FormWriter(*writer_args)
+    return _timed_write(_form_writer, project, project_data)
+
+
+def _form_writer_args(patch_xml: bool = False) -> tuple:
+    return (_form_cell_map(), SOURCE_DIR + BLANK_TEMPLATE_FN, OUTPUT_DIR, patch_xml)
+
+
+def populate_blank_bicc_form(master_obj: Master, proj_num):
+    proj_data = master_obj.data
+    ls = master_obj.projects
+    test_proj = ls[int(proj_num)]
+    logger.info("Processing project {}.".format(test_proj))
+    FormWriter(*_form_writer_args()).write(test_proj, proj_data[test_proj])
+
+
+def populate_all(master_obj: Master, jobs: int = 1, patch_xml: bool = False) -> None:
+    """
+    Populates a form for each project in master_obj. The datamap and template
+    are read once; if jobs is more than 1 the forms are populated and saved
+    by that many processes, each with its own FormWriter. See FormWriter for
+    patch_xml.
+    """
+    writer_args = _form_writer_args(patch_xml)
+    projects = master_obj.projects
+    proj_data = master_obj.data
+
+    start = time.perf_counter()
+    if jobs > 1 and len(projects) > 1:
+        logger.info(f"Populating {len(projects)} forms using {jobs} processes")
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        written = as_completed([executor.submit(_write_form, writer_args, p, proj_data[p])
+                                for p in projects])
+        written = (future.result() for future in written)
+    else:
+        executor = None
+        writer = FormWriter(*writer_args)
+        written = (_timed_write(writer, p, proj_data[p]) for p in projects)
+
+    try:
+        for count, (file_name, seconds) in enumerate(written, start=1):
+            logger.info(f"[{count}/{len(projects)}] {file_name} ({seconds:.2f}s)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    logger.info(f"Populated {len(projects)} forms in {OUTPUT_DIR} in "
+                f"{time.perf_counter() - start:.2f}s")
+
+
+def pop_all(jobs: int = 1, patch_xml: bool = False, cache_dir: Optional[str] = None):
     """
     Populates the blank bicc_template file with data from the master, one
     form for each project dataset.
@@ -516,16 +629,12 @@ def pop_all():
     m_path = os.path.join(ROOT_PATH, config["Master"]["name"])
     q_str = config["QuarterData"]["CurrentQuarter"]
     q = Quarter(int(q_str[1]), int(q_str[-4:]))
-    m = Master(q, m_path)
+    m = Master(q, m_path, cache_dir=cache_dir)
     if m.duplicate_keys(True):
         logger.critical(
             "Duplicate keys will not migrate to templates - you must "
             "remove duplicates to migrate all data from the master!")
-    number_of_projects = len(m.projects)
-    # we need to iterate through the master based on indexes so we use a range
-    # based on the number of projects
-    for p in range(number_of_projects):
-        populate_blank_bicc_form(m, p)
+    populate_all(m, jobs=jobs, patch_xml=patch_xml)
 
 
 def get_dropdown_data(header=None):
@@ -601,6 +710,8 @@ def main():
         logger.addHandler(fh)
         logger.addHandler(console)
 
+    master_cache_dir = MASTER_CACHE_DIR if args["cache_masters"] else None
+
     if args["version"]:
         print("{}".format(__version__))
         return
@@ -620,7 +731,7 @@ def main():
     if args["all"]:
         master = os.path.join(working_directory("source"), "master.csv")
         clean_datamap(DATAMAP_RETURN_TO_MASTER)
-        pop_all()
+        pop_all(jobs=args["jobs"], patch_xml=args["patch_xml"], cache_dir=master_cache_dir)
         return
     if args["analyser"]:
 
@@ -636,19 +747,22 @@ def main():
 
         # checking for swimlane_milestones analyser
         if "annex" in args["analyser"]:
-            analyser_args(args, annex_run)
+            analyser_args(args, functools.partial(annex_run, jobs=args["jobs"],
+                                                  cache_dir=master_cache_dir))
             return
 
         if "keyword" in args["analyser"]:
-            keyword_args(args, keyword_run)
+            keyword_args(args, functools.partial(keyword_run, cache_dir=master_cache_dir))
             return
 
         if "financial" in args["analyser"]:
-            analyser_args(args, financial_analyser_run)
+            analyser_args(args, functools.partial(financial_analyser_run,
+                                                  cache_dir=master_cache_dir))
             return
 
         if "rcf" in args["analyser"]:
-            rcf_args(args, rcf_run)
+            rcf_args(args, functools.partial(rcf_run, jobs=args["jobs"],
+                                             cache_dir=master_cache_dir))
             return
 
     if args["count-rows"]:
@@ -657,23 +771,26 @@ def main():
                 "-r option can only use --csv or --quiet, not both")
             return
         if args["csv"]:
-            row_data_formatter(csv_output=True)
+            row_data_formatter(csv_output=True, jobs=args["jobs"])
         elif args["quiet"]:
-            row_data_formatter(quiet=True)
+            row_data_formatter(quiet=True, jobs=args["jobs"])
         else:
-            row_data_formatter()
+            row_data_formatter(jobs=args["jobs"])
         return
     if args["compile"] and not args["compare"]:
         if directory_has_returns_check(os.path.join(SOURCE_DIR, "returns")):
             clean_datamap(DATAMAP_RETURN_TO_MASTER)
-            compile_returns.run()
+            compile_returns.run(jobs=args["jobs"], write_only=args["write_only"],
+                                incremental=args["incremental"])
         else:
             sys.exit(1)
     if args["compare"]:
         if directory_has_returns_check(os.path.join(SOURCE_DIR, "returns")):
             clean_datamap(DATAMAP_RETURN_TO_MASTER)
             comparitor = parse_comparison_master(args["compare"][0])
-            compile_returns.run(comparitor=comparitor)
+            compile_returns.run(comparitor=comparitor, jobs=args["jobs"],
+                                write_only=args["write_only"],
+                                incremental=args["incremental"])
         else:
             sys.exit(1)
 
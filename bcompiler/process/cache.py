@@ -0,0 +1,89 @@
+"""
+On-disk cache of parsed returns, used by ``bcompiler --incremental``.
+
+Each entry is the list of cleaned gmpp_key/gmpp_key_value dicts that
+parse_source_cells() produced for a return. Entries are keyed by the SHA-256
+of the return file together with the digest of the compiled datamap and the
+bcompiler version, so a return is only parsed again if it, the datamap or
+bcompiler itself has changed.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from typing import Dict, List, Optional
+
+import bcompiler
+from bcompiler.process.datamap import CompiledDatamap
+
+logger = logging.getLogger('bcompiler.process.cache')
+
+CACHE_FILE = '.bcompiler_returns_cache.pickle'
+
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 hex digest of the contents of path.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ReturnCache:
+    """
+    Parsed returns from a previous compile, stored in directory.
+
+    get() returns the cached data for a file, or None; put() records data
+    for a file. save() writes back only the entries that were got or put
+    during this run, so returns that have been removed or replaced drop out
+    of the cache.
+    """
+
+    def __init__(self, directory: str, datamap: CompiledDatamap) -> None:
+        self.path = os.path.join(directory, CACHE_FILE)
+        self._salt = "{}:{}".format(bcompiler.__version__, datamap.digest)
+        self._entries: Dict[str, bytes] = {}
+        self._used: Dict[str, bytes] = {}
+        self._keys: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, 'rb') as f:
+                self._entries = pickle.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            logger.warning("Cannot read return cache {}. Ignoring it.".format(self.path))
+            self._entries = {}
+
+    def _key(self, path: str) -> str:
+        if path not in self._keys:
+            self._keys[path] = "{}:{}".format(self._salt, file_digest(path))
+        return self._keys[path]
+
+    def get(self, path: str) -> Optional[List[Dict]]:
+        key = self._key(path)
+        try:
+            data = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[key] = data
+        return pickle.loads(data)
+
+    def put(self, path: str, out_map: List[Dict]) -> None:
+        # pickled straight away because compile goes on to modify out_map
+        self._used[self._key(path)] = pickle.dumps(out_map)
+
+    def save(self) -> None:
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self._used, f)
+        os.replace(tmp, self.path)
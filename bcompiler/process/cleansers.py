@@ -1,7 +1,10 @@
 import datetime
 import re
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import date
 from operator import itemgetter
+from typing import Iterable, List
 
 import colorlog
 from dateutil.parser import parse
@@ -28,10 +31,49 @@ PERCENT_REGEX = r"^(\d{1,3})%$"
 POUND_REGEX = r"^(-)?£(\d+(\.\d{1,2})?)(\d+)?$"  # handles negative numbers
 
 
+# Every cleaning rule as (c_type, pattern, fix, method). Where two rules match
+# a string the same number of times, the one listed first here is applied
+# first.
+_RULES = (
+    ("emdash", ENDASH_REGEX, ENDASH_FIX, "_endash"),
+    ("commas", COMMA_REGEX, COMMA_FIX, "_commas"),
+    ("leading_apostrophe", APOS_REGEX, APOS_FIX, "_apostrophe"),
+    ("newline", NL_REGEX, NL_FIX, "_newline"),
+    ("double_space", "  ", " ", "_doublespace"),
+    ("trailing_space", TRAILING_SPACE_REGEX, None, "_trailingspace"),
+    ("pipe_char", SPACE_PIPE_CHAR_REGEX, SPACE_PIPE_CHAR_FIX, "_space_pipe_char"),
+    ("date", DATE_REGEX, None, "_date"),
+    ("date_time", DATE_REGEX_TIME, None, "_date_time"),
+    ("int", INT_REGEX, None, "_int"),
+    ("float", FLOAT_REGEX, None, "_float"),
+    ("percent", PERCENT_REGEX, None, "_percent"),
+    ("pound", POUND_REGEX, None, "_pound"),
+)
+
+_COMPILED_RULES = tuple(
+    (c_type, re.compile(rule), fix, func) for c_type, rule, fix, func in _RULES)
+
+# matches somewhere in a string if, and only if, at least one rule does
+_ANY_RULE = re.compile("|".join("(?:{})".format(rule) for _, rule, _, _ in _RULES))
+
+_INT_RULE = next(rule for rule in _COMPILED_RULES if rule[0] == "int")
+
+# plain ASCII letters and digits, which only the "int" rule can match
+_PLAIN = re.compile(r"[A-Za-z0-9]+")
+
+
 class Cleanser:
     """
     Takes a string, and cleans it.
 
+    Each rule in _RULES is counted against the string as given. clean() then
+    applies the fix for each rule that matched, most matches first. Most
+    values need no cleaning at all, so the rules are only counted if a single
+    combined search finds that at least one of them matches, and strings of
+    plain ASCII letters and digits skip the regular expressions altogether.
+
+    Raises TypeError if given anything other than a string.
+
     Doctests:
     >>> t = "Text, with commas"
     >>> c = Cleanser(t)
@@ -45,119 +87,42 @@ class Cleanser:
     """
 
     def __init__(self, string):
+        if not isinstance(string, str):
+            raise TypeError(
+                "Cleanser expects a string, not {}".format(type(string).__name__))
         self.string = string
+        self._checks = self._analyse()
 
-        # a list of dicts that describe everything needed to fix errors in
-        # string passed to class constructor. Method self.clean() runs through
-        # them,  fixing each in turn.
-        self._checks = [
-            dict(
-                c_type="emdash",
-                rule=ENDASH_REGEX,
-                fix=ENDASH_FIX,
-                func=self._endash,
-                count=0,
-            ),
-            dict(
-                c_type="commas",
-                rule=COMMA_REGEX,
-                fix=COMMA_FIX,
-                func=self._commas,
-                count=0,
-            ),
-            dict(
-                c_type="leading_apostrophe",
-                rule=APOS_REGEX,
-                fix=APOS_FIX,
-                func=self._apostrophe,
-                count=0,
-            ),
-            dict(c_type="newline",
-                 rule=NL_REGEX,
-                 fix=NL_FIX,
-                 func=self._newline,
-                 count=0),
-            dict(
-                c_type="double_space",
-                rule="  ",
-                fix=" ",
-                func=self._doublespace,
-                count=0,
-            ),
-            dict(
-                c_type="trailing_space",
-                rule=TRAILING_SPACE_REGEX,
-                fix=None,
-                func=self._trailingspace,
-                count=0,
-            ),
-            dict(
-                c_type="pipe_char",
-                rule=SPACE_PIPE_CHAR_REGEX,
-                fix=SPACE_PIPE_CHAR_FIX,
-                func=self._space_pipe_char,
-                count=0,
-            ),
-            dict(c_type="date",
-                 rule=DATE_REGEX,
-                 fix=None,
-                 func=self._date,
-                 count=0),
-            dict(
-                c_type="date_time",
-                rule=DATE_REGEX_TIME,
-                fix=None,
-                func=self._date_time,
-                count=0,
-            ),
-            dict(c_type="int",
-                 rule=INT_REGEX,
-                 fix=None,
-                 func=self._int,
-                 count=0),
-            dict(c_type="float",
-                 rule=FLOAT_REGEX,
-                 fix=None,
-                 func=self._float,
-                 count=0),
-            dict(
-                c_type="percent",
-                rule=PERCENT_REGEX,
-                fix=None,
-                func=self._percent,
-                count=0,
-            ),
-            dict(c_type="pound",
-                 rule=POUND_REGEX,
-                 fix=None,
-                 func=self._pound,
-                 count=0),
-        ]
-        self.checks_l = len(self._checks)
-        self._analyse()
-
-    def _sort_checks(self):
+    def _analyse(self):
         """
-        Sorts the list of dicts in self._checks by their count, highest
-        first, so that when the fix methods run down them, they always have
-        a count with a value higher than 0 to run with, otherwise later
-        fixes might not get hit.
+        Returns the rules that match self.string, as (count, rule) pairs in
+        the order their fixes are to be applied.
         """
-        self._checks = sorted(self._checks,
-                              key=itemgetter("count"),
-                              reverse=True)
+        string = self.string
+        if _PLAIN.fullmatch(string):
+            return [(1, _INT_RULE)] if string.isdigit() else []
+        if _ANY_RULE.search(string) is None:
+            return []
+        checks = []
+        for rule in _COMPILED_RULES:
+            count = sum(1 for _ in rule[1].finditer(string))
+            if count:
+                checks.append((count, rule))
+        # stable, so equal counts stay in _RULES order
+        checks.sort(key=itemgetter(0), reverse=True)
+        return checks
 
     def _endash(self, regex, fix):
         """
         Turns – into -.
         """
-        return re.sub(regex, fix, self.string)
+        return regex.sub(fix, self.string)
 
     def _pound(self, regex, fix):
         """
         Turns £12.24 into 12.24 (a float).
         """
-        m = re.match(regex, self.string)
+        m = regex.match(self.string)
         sum_p = m.group(2)
         if m.group(1) == "-":
             return float(sum_p) * -1
@@ -168,7 +133,7 @@ class Cleanser:
         """
         Turns 100% into 1.0.
         """
-        m = re.match(regex, self.string)
+        m = regex.match(self.string)
         p = int(m.group(1))
         return p / 100
 
@@ -188,7 +153,7 @@ class Cleanser:
         """
         Handles dates in "03/05/2016" format.
         """
-        m = re.match(regex, self.string)
+        m = regex.match(self.string)
         if int(m.groups()[-1]) in range(1965, 1967):
             logger.warning(
                 ("Dates inputted as dd/mm/65 will migrate as dd/mm/2065. "
@@ -216,7 +181,7 @@ class Cleanser:
         csv file when we send it back out to templates/forms. Returns a Python
         date object.
         """
-        m = re.match(regex, self.string)
+        m = regex.match(self.string)
         year = int(m.group(1))
         month = int(m.group(3))
         day = int(m.group(5))
@@ -233,7 +198,7 @@ class Cleanser:
         # we want to sort the list first so self._checks has any item
         # with a count > 0 up front, otherwise if a count of 0 appears
         # before it in the list, the > 0 count never gets fixed
-        return re.sub(regex, fix, self.string)
+        return regex.sub(fix, self.string)
 
     def _apostrophe(self, regex, fix):
         """Handles apostrophes as first char of the string."""
@@ -241,11 +206,11 @@ class Cleanser:
 
     def _newline(self, regex, fix):
         """Handles newlines anywhere in string."""
-        return re.sub(regex, fix, self.string)
+        return regex.sub(fix, self.string)
 
     def _doublespace(self, regex, fix):
         """Handles double-spaces anywhere in string."""
-        return re.sub(regex, fix, self.string)
+        return regex.sub(fix, self.string)
 
     def _trailingspace(self, regex, fix):
         """Handles trailing space in the string."""
@@ -253,35 +218,127 @@ class Cleanser:
 
     def _space_pipe_char(self, regex, fix):
         """Handles space pipe char anywhere in string."""
-        return re.sub(regex, fix, self.string)
-
-    def _access_checks(self, c_type):
-        """Helper method returns the index of rule in self._checks
-        when given a c_type"""
-        return self._checks.index(
-            next(item for item in self._checks if item["c_type"] == c_type))
-
-    def _analyse(self):
-        """
-        Uses the self._checks table as a basis for counting the number of
-        each cleaning target required, and calling the appropriate method
-        to clean.
-        """
-        i = 0
-        while i < self.checks_l:
-            matches = re.finditer(self._checks[i]["rule"], self.string)
-            if matches:
-                self._checks[i]["count"] += len(list(matches))
-            i += 1
+        return regex.sub(fix, self.string)
 
     def clean(self):
         """Runs each applicable cleaning action and returns the cleaned
         string."""
-        self._sort_checks()
-        for check in self._checks:
-            if check["count"] > 0:
-                self.string = check["func"](check["rule"], check["fix"])
-                check["count"] = 0
-            else:
-                return self.string
+        for _, (c_type, regex, fix, func) in self._checks:
+            self.string = getattr(self, func)(regex, fix)
+        self._checks = []
         return self.string
+
+
+class CleanCache:
+    """
+    A bounded, least-recently-used store of Cleanser results, keyed by the
+    string cleaned. Counts hits, misses and evictions so that maxsize can be
+    tuned to the number of distinct values in a run.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._results: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clean(self, string):
+        try:
+            result = self._results[string]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self._results.move_to_end(string)
+            return result
+        self.misses += 1
+        result = Cleanser(string).clean()
+        self._results[string] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __repr__(self) -> str:
+        return ("CleanCache({} of {} entries, {} hits, {} misses, "
+                "{} evictions)").format(
+                    len(self), self.maxsize, self.hits, self.misses, self.evictions)
+
+
+_cache = None
+
+
+def set_clean_cache(maxsize: int):
+    """
+    Puts a CleanCache of maxsize entries in front of clean(), replacing any
+    existing one, and returns it. A maxsize of 0 or less turns caching off
+    and returns None.
+
+    Cleaning a cached value again does not repeat any warnings logged the
+    first time it was cleaned.
+    """
+    global _cache
+    _cache = CleanCache(maxsize) if maxsize > 0 else None
+    return _cache
+
+
+@contextmanager
+def cleaning_cache(maxsize: int):
+    """
+    set_clean_cache(maxsize) for the length of a with block, which gives the
+    new CleanCache, or None. The cache that was in use before is put back
+    when the block ends.
+    """
+    global _cache
+    previous = _cache
+    try:
+        yield set_clean_cache(maxsize)
+    finally:
+        _cache = previous
+
+
+def clean_cache():
+    """
+    Returns the CleanCache in use, or None.
+    """
+    return _cache
+
+
+def clean(string):
+    """
+    Returns Cleanser(string).clean(), from the cache set by set_clean_cache()
+    if there is one. As with Cleanser, raises TypeError if string is not a
+    string.
+    """
+    if _cache is None or not isinstance(string, str):
+        return Cleanser(string).clean()
+    return _cache.clean(string)
+
+
+def clean_many(values: Iterable) -> List:
+    """
+    Cleans every value in values, returning the results in the same order.
+
+    Each distinct string is cleaned once, however many times it appears.
+    Anything that is not a string (None, numbers, dates) cannot be cleaned
+    and is returned as it is.
+
+    >>> clean_many(["Text, with commas", None, "12", "Text, with commas"])
+    ['Text with commas', None, 12, 'Text with commas']
+    """
+    cleaned = {}
+    results = []
+    for value in values:
+        if not isinstance(value, str):
+            results.append(value)
+            continue
+        try:
+            results.append(cleaned[value])
+        except KeyError:
+            result = cleaned[value] = clean(value)
+            results.append(result)
+    return results
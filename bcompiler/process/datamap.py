@@ -1,9 +1,20 @@
 import csv
+import hashlib
 import sys
-from typing import List
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+from typing import Iterable, List
+
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.exceptions import CellCoordinatesException
 
 from .cell import Cell
 
+# A single datamap line, resolved for reading from a return. row and column
+# are None if the cell_reference cannot be parsed.
+DatamapTarget = namedtuple(
+    'DatamapTarget', ['index', 'cell_key', 'template_sheet', 'cell_reference', 'row', 'column'])
+
 
 class Datamap:
     """
@@ -60,3 +71,83 @@ class Datamap:
         except Exception:
             print(f"Cannot decode file {source_file}")
             sys.exit(1)
+
+
+class CompiledDatamap:
+    """
+    An immutable, pre-processed form of a Datamap, intended to be built once
+    per run and shared by everything that reads returns.
+
+    Lines with no template_sheet or cell_reference are dropped, keys have
+    trailing whitespace removed and cell references are converted to integer
+    (row, column) pairs. The lines are available in datamap order as
+    ``targets`` and grouped by sheet as ``by_sheet``.
+    """
+
+    def __init__(self, cells: Iterable[Cell]) -> None:
+        targets = []
+        for cell in cells:
+            if not cell.template_sheet or cell.cell_reference is None:
+                continue
+            try:
+                row, column = coordinate_to_tuple(cell.cell_reference)
+            except (CellCoordinatesException, ValueError):
+                row, column = None, None
+            target = DatamapTarget(len(targets), cell.cell_key.rstrip(), cell.template_sheet,
+                                   cell.cell_reference, row, column)
+            targets.append(target)
+        self._set_targets(tuple(targets))
+
+    def _set_targets(self, targets) -> None:
+        by_sheet: OrderedDict = OrderedDict()
+        for target in targets:
+            by_sheet.setdefault(target.template_sheet, []).append(target)
+        self._targets = targets
+        self._by_sheet = MappingProxyType(
+            OrderedDict((sheet, tuple(ts)) for sheet, ts in by_sheet.items()))
+
+    # mappingproxy cannot be pickled, so only the targets are sent to worker
+    # processes and the grouping is rebuilt there
+    def __getstate__(self):
+        return {'targets': self._targets}
+
+    def __setstate__(self, state):
+        self._set_targets(state['targets'])
+
+    @classmethod
+    def from_csv(cls, source_file: str) -> 'CompiledDatamap':
+        """
+        Read a datamap CSV file (see Datamap.cell_map_from_csv) and compile it.
+        """
+        datamap = Datamap()
+        datamap.cell_map_from_csv(source_file)
+        return cls(datamap.cell_map)
+
+    @property
+    def targets(self):
+        return self._targets
+
+    @property
+    def by_sheet(self):
+        return self._by_sheet
+
+    @property
+    def sheets(self):
+        return tuple(self._by_sheet.keys())
+
+    @property
+    def digest(self) -> str:
+        """
+        SHA-256 hex digest of the compiled lines. Two datamaps with the same
+        digest read the same cells into the same keys.
+        """
+        return hashlib.sha256(repr(self._targets).encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __iter__(self):
+        return iter(self._targets)
+
+    def __repr__(self) -> str:
+        return "CompiledDatamap({} lines, {} sheets)".format(len(self), len(self._by_sheet))
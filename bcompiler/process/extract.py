@@ -0,0 +1,297 @@
+"""
+Reads individual cell values from a return without loading the workbook.
+
+openpyxl's read-only worksheets re-parse the sheet XML for every
+``ws.cell()`` lookup, which makes reading a few hundred datamap cells from a
+return very slow. ReturnExtractor instead opens the spreadsheet as a zip
+file, reads the shared strings and the date styles once, and makes a single
+forward pass over each sheet it is asked about, keeping only the requested
+cells. Sheets that are not asked about are never read. It can also count the
+rows in a sheet, usually from the first few hundred bytes of its XML.
+
+Values are converted the same way as openpyxl does when a workbook is loaded
+with ``data_only=True``: numbers become int or float, date-formatted numbers
+become datetimes, shared and inline strings are resolved and formulae give
+their cached value.
+"""
+import logging
+import posixpath
+import zipfile
+from typing import Dict, Iterable, Set, Tuple
+from xml.etree.ElementTree import fromstring
+
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import builtin_format_code, is_date_format
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import (CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900,
+                                     from_excel, from_ISO8601)
+from openpyxl.xml.constants import REL_NS, SHEET_MAIN_NS
+from openpyxl.xml.functions import iterparse
+
+logger = logging.getLogger('bcompiler.process.extract')
+
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+SHEET_TAG = '{%s}sheet' % SHEET_MAIN_NS
+WORKBOOK_PR_TAG = '{%s}workbookPr' % SHEET_MAIN_NS
+NUMFMT_TAG = '{%s}numFmt' % SHEET_MAIN_NS
+CELL_XFS_TAG = '{%s}cellXfs' % SHEET_MAIN_NS
+XF_TAG = '{%s}xf' % SHEET_MAIN_NS
+ROW_TAG = '{%s}row' % SHEET_MAIN_NS
+CELL_TAG = '{%s}c' % SHEET_MAIN_NS
+VALUE_TAG = '{%s}v' % SHEET_MAIN_NS
+INLINE_STRING_TAG = '{%s}is' % SHEET_MAIN_NS
+DIMENSION_TAG = '{%s}dimension' % SHEET_MAIN_NS
+SHEET_DATA_TAG = '{%s}sheetData' % SHEET_MAIN_NS
+MERGE_CELL_TAG = '{%s}mergeCell' % SHEET_MAIN_NS
+RELATIONSHIP_TAG = '{%s}Relationship' % PKG_REL_NS
+RID_ATTR = '{%s}id' % REL_NS
+
+OFFICE_DOCUMENT_REL = '/officeDocument'
+SHARED_STRINGS_REL = '/sharedStrings'
+STYLES_REL = '/styles'
+
+Coordinate = Tuple[int, int]
+
+
+def _cast_number(value: str):
+    """
+    Converts a number stored as a string to an int or a float.
+    """
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _rels_path(part: str) -> str:
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+class ReturnExtractor:
+    """
+    Extracts cell values from a single xlsx/xlsm file.
+
+    Use it as a context manager, or call close() when finished::
+
+        with ReturnExtractor(path) as ex:
+            values = ex.cells('Summary', [(5, 2), (6, 2)])
+    """
+
+    def __init__(self, source_file: str) -> None:
+        self.source_file = source_file
+        self._archive = zipfile.ZipFile(source_file)
+        self._workbook_part = self._find_part('', OFFICE_DOCUMENT_REL)
+        self._epoch = CALENDAR_WINDOWS_1900
+        self._sheet_parts: Dict[str, str] = {}
+        self._parse_workbook()
+        self._shared_strings = None
+        self._date_styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self._archive.close()
+
+    def _relationships(self, part: str) -> Dict[str, Tuple[str, str]]:
+        """
+        Returns {rId: (type, absolute target path)} for part ('' for the
+        package itself).
+        """
+        rels_path = _rels_path(part) if part else '_rels/.rels'
+        try:
+            tree = fromstring(self._archive.read(rels_path))
+        except KeyError:
+            return {}
+        folder = posixpath.dirname(part)
+        rels = {}
+        for rel in tree.iter(RELATIONSHIP_TAG):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get('Id')] = (rel.get('Type'), target)
+        return rels
+
+    def _find_part(self, part: str, rel_type: str):
+        for typ, target in self._relationships(part).values():
+            if typ.endswith(rel_type):
+                return target
+        return None
+
+    def _parse_workbook(self) -> None:
+        tree = fromstring(self._archive.read(self._workbook_part))
+        props = tree.find(WORKBOOK_PR_TAG)
+        if props is not None and props.get('date1904') in ('1', 'true'):
+            self._epoch = CALENDAR_MAC_1904
+        rels = self._relationships(self._workbook_part)
+        for sheet in tree.iter(SHEET_TAG):
+            rel = rels.get(sheet.get(RID_ATTR))
+            if rel is not None:
+                self._sheet_parts[sheet.get('name')] = rel[1]
+
+    @property
+    def sheet_names(self):
+        return list(self._sheet_parts)
+
+    def sheet_part(self, sheet: str) -> str:
+        """
+        The path in the zip file of the XML for sheet.
+        """
+        try:
+            return self._sheet_parts[sheet]
+        except KeyError:
+            raise KeyError("Worksheet {0} does not exist.".format(sheet))
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            part = self._find_part(self._workbook_part, SHARED_STRINGS_REL)
+            if part is None:
+                self._shared_strings = []
+            else:
+                with self._archive.open(part) as src:
+                    self._shared_strings = read_string_table(src)
+        return self._shared_strings
+
+    @property
+    def date_styles(self) -> Set[int]:
+        """
+        Indices of the cell styles that have a date number format.
+        """
+        if self._date_styles is None:
+            self._date_styles = set()
+            part = self._find_part(self._workbook_part, STYLES_REL)
+            if part is not None:
+                tree = fromstring(self._archive.read(part))
+                custom = {int(fmt.get('numFmtId')): fmt.get('formatCode')
+                          for fmt in tree.iter(NUMFMT_TAG)}
+                xfs = tree.find(CELL_XFS_TAG)
+                for idx, xf in enumerate(xfs.iter(XF_TAG) if xfs is not None else []):
+                    fmt_id = int(xf.get('numFmtId', 0))
+                    fmt = custom.get(fmt_id) or builtin_format_code(fmt_id)
+                    if fmt and is_date_format(fmt):
+                        self._date_styles.add(idx)
+        return self._date_styles
+
+    def _cell_value(self, element):
+        data_type = element.get('t', 'n')
+        if data_type == 'inlineStr':
+            child = element.find(INLINE_STRING_TAG)
+            if child is None:
+                return None
+            return Text.from_tree(child).content
+        value = element.findtext(VALUE_TAG) or None
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = _cast_number(value)
+            if int(element.get('s', 0)) in self.date_styles:
+                try:
+                    value = from_excel(value, self._epoch)
+                except ValueError:
+                    logger.warning(
+                        "Cell {} in {} is marked as a date but {} is outside the "
+                        "limits for dates.".format(
+                            element.get('r'), self.source_file, value))
+                    value = "#VALUE!"
+        elif data_type == 's':
+            value = self.shared_strings[int(value)]
+        elif data_type == 'b':
+            value = bool(int(value))
+        elif data_type == 'd':
+            value = from_ISO8601(value)
+        return value
+
+    def row_count(self, sheet: str) -> int:
+        """
+        The number of rows in sheet, as given by len(list(ws.rows)) when the
+        workbook is loaded by openpyxl: the row of its last cell, or 0 if it
+        is empty. This is read from the sheet's <dimension> element, which
+        comes before the cells, so the rest of the sheet is not read. If the
+        sheet has no dimension, or its dimension is a single cell, the rows
+        are counted in a single pass over it. A file whose dimension was not
+        kept up to date by whatever wrote it gives the row of its dimension.
+        Raises KeyError if there is no such sheet.
+        """
+        part = self.sheet_part(sheet)
+        last_row = 0
+        row_idx = 0
+        with self._archive.open(part) as src:
+            counting = False
+            for event, element in iterparse(src, events=('start', 'end')):
+                tag = element.tag
+                if not counting:
+                    if tag == DIMENSION_TAG and event == 'start':
+                        try:
+                            min_col, min_row, max_col, max_row = range_boundaries(
+                                element.get('ref'))
+                        except (TypeError, ValueError):
+                            min_col = min_row = max_col = max_row = None
+                        # an empty sheet has a dimension of A1, so a sheet
+                        # whose dimension is a single cell is counted
+                        if max_row is not None and (min_col, min_row) != (max_col, max_row):
+                            return max_row
+                        counting = True
+                    elif tag == SHEET_DATA_TAG:
+                        counting = True
+                    continue
+                if tag == ROW_TAG:
+                    if event == 'start':
+                        row_idx = int(element.get('r', row_idx + 1))
+                    else:
+                        element.clear()
+                elif tag == CELL_TAG and event == 'end':
+                    last_row = max(last_row, row_idx)
+                elif tag == MERGE_CELL_TAG and event == 'end':
+                    # openpyxl gives every cell in a merged range a MergedCell
+                    last_row = max(last_row, range_boundaries(element.get('ref'))[3])
+        return last_row
+
+    def cells(self, sheet: str, coordinates: Iterable[Coordinate]) -> Dict[Coordinate, object]:
+        """
+        Returns {(row, column): value} for each of coordinates in sheet, in a
+        single pass over the sheet XML. Empty or missing cells are None.
+        Raises KeyError if there is no such sheet.
+        """
+        part = self.sheet_part(sheet)
+        wanted = set(coordinates)
+        found = dict.fromkeys(wanted)
+        remaining = len(wanted)
+        if not remaining:
+            return found
+        last_row = max(row for row, _ in wanted)
+
+        row_idx = 0
+        col_idx = 0
+        with self._archive.open(part) as src:
+            for event, element in iterparse(src, events=('start', 'end')):
+                tag = element.tag
+                if tag == ROW_TAG:
+                    if event == 'start':
+                        row_idx = int(element.get('r', row_idx + 1))
+                        col_idx = 0
+                        if row_idx > last_row:
+                            break
+                    else:
+                        element.clear()
+                        if not remaining:
+                            break
+                elif tag == CELL_TAG and event == 'end':
+                    coordinate = element.get('r')
+                    if coordinate is not None:
+                        row_idx, col_idx = coordinate_to_tuple(coordinate)
+                    else:
+                        col_idx += 1
+                    key = (row_idx, col_idx)
+                    if key in wanted:
+                        found[key] = self._cell_value(element)
+                        wanted.discard(key)
+                        remaining -= 1
+        return found
@@ -4,6 +4,7 @@ from openpyxl import load_workbook
 
 from bcompiler.utils import index_returns_directory
 from bcompiler.process import Cleanser
+from bcompiler.process.cleansers import clean_many
 
 logger = logging.getLogger('bcompiler.process.simple_comparitor')
 
@@ -27,6 +28,7 @@ class ParsedMaster:
         self._wb = load_workbook(self.master_file)
         self._ws = self._wb.active
         self._project_header_index = {}
+        self._column_index = {}
         self._parse()
 
     def _cleanse_key(self, key):
@@ -41,8 +43,9 @@ class ParsedMaster:
         self._projects = [cell.value for cell in self._ws[1][1:]]
 #       self._projects.sort()
         self._project_count = len(self.projects)
-        self._key_col = [self._cleanse_key(cell.value) for cell in self._ws['A']]
+        self._key_col = clean_many(cell.value for cell in self._ws['A'])
         self._index_projects()
+        self._index_columns()
 
     @property
     def projects(self):
@@ -84,6 +87,36 @@ class ParsedMaster:
             if cell.value in self.projects:
                 self._project_header_index[cell.value] = cell.col_idx
 
+    def _index_columns(self):
+        """
+        Builds a {column index: {key: value}} dict for every project column
+        so that looking up a single value is a dict lookup rather than a scan
+        of the column. Where a key appears more than once in the master, the
+        first occurrence wins, as it does in get_data_with_key().
+        """
+        self._column_index = {}
+        columns = self._ws.iter_cols(
+            min_col=2, max_row=len(self._key_col), values_only=True)
+        for col_idx, col_data in enumerate(columns, start=2):
+            pairs = list(zip(self._key_col, col_data))
+            self._column_index[col_idx] = dict(reversed(pairs))
+
+    @property
+    def project_header_index(self):
+        """
+        Returns a dict of project titles to their column index in the master.
+        """
+        return self._project_header_index
+
+    @property
+    def project_index(self):
+        """
+        Returns a dict of {project title: {key: value}} for every project in
+        the master.
+        """
+        return {project: self._column_index.get(col_idx, {})
+                for project, col_idx in self._project_header_index.items()}
+
     def print_project_index(self):
         print('{:<68}{:>5}'.format("Project Title", "Column Index"))
         print('{:*^80}'.format(''))
@@ -142,6 +175,19 @@ class ParsedMaster:
             logger.warning("No key {} in comparing master. Check for double spaces in cell in master. Skipping".format(key))
             return None
 
+    def get_value(self, col_index, key):
+        """
+        Returns the value of key for the project in column col_index, or None
+        (with a warning) if the key is not in the master. Equivalent to
+        get_data_with_key(get_project_data(col_index=col_index), key) but
+        without re-reading the column.
+        """
+        try:
+            return self._column_index[col_index][key]
+        except KeyError:
+            logger.warning("No key {} in comparing master. Check for double spaces in cell in master. Skipping".format(key))
+            return None
+
     def index_target_files_with_previous_master(self):
         """
         A previous master has a column-order of projects. If we are going
@@ -228,18 +274,9 @@ class FileComparitor:
         from the import spreadsheet or by ParsedMaster.print_project_index.
         """
         if self._comp_type == 'two':
-            project_data_early = self._early_master.get_project_data(
-                col_index=proj_index)
-            project_data_current = self._current_master.get_project_data(
-                col_index=proj_index)
             return(
-                self._early_master.get_data_with_key(
-                    project_data_early, key),
-                self._current_master.get_data_with_key(
-                    project_data_current, key))
+                self._early_master.get_value(proj_index, key),
+                self._current_master.get_value(proj_index, key))
 
         if self._comp_type == 'one':
-            project_data_early = self._early_master.get_project_data(
-                col_index=proj_index)
-            return(
-                self._early_master.get_data_with_key(project_data_early, key))
+            return self._early_master.get_value(proj_index, key)
@@ -0,0 +1,72 @@
+"""
+Times FileComparitor.compare() against a synthetic master of 1,500 keys
+by 150 projects, looking up every key for every project, as happens when
+bcompiler compiles with --compare. The older approach, which re-read and
+scanned the project column for every lookup, is timed on a sample of
+projects for comparison.
+
+Usage: python -m bcompiler.scripts.benchmark_comparitor [keys] [projects]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+from bcompiler.process.simple_comparitor import FileComparitor
+
+SAMPLE_PROJECTS = 3
+
+
+def make_master(path, keys, projects):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Project/Programme Name'] + [
+        'Project {}'.format(p) for p in range(projects)])
+    for k in range(1, keys):
+        ws.append(['Key {}'.format(k)] + [
+            'Value {} {}'.format(k, p) for p in range(projects)])
+    wb.save(path)
+
+
+def column_scan(parsed_master, col_index, key):
+    data = parsed_master.get_project_data(col_index=col_index)
+    return parsed_master.get_data_with_key(data, key)
+
+
+def main(keys=1500, projects=150):
+    path = os.path.join(tempfile.gettempdir(), 'benchmark_master.xlsx')
+    make_master(path, keys, projects)
+
+    start = time.perf_counter()
+    comparitor = FileComparitor([path])
+    load_time = time.perf_counter() - start
+
+    parsed = comparitor.data
+    key_col = parsed._key_col
+    columns = list(parsed.project_header_index.values())
+
+    start = time.perf_counter()
+    for col_index in columns:
+        for key in key_col:
+            comparitor.compare(col_index, key)
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for col_index in columns[:SAMPLE_PROJECTS]:
+        for key in key_col:
+            column_scan(parsed, col_index, key)
+    scan_time = (time.perf_counter() - start) * len(columns) / SAMPLE_PROJECTS
+
+    lookups = len(columns) * len(key_col)
+    print("Master: {} keys x {} projects ({} lookups)".format(
+        keys, projects, lookups))
+    print("Load and index master: {:.2f}s".format(load_time))
+    print("Indexed compare:       {:.3f}s".format(index_time))
+    print("Column scan (est.):    {:.1f}s".format(scan_time))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -1 +1,2 @@
-from .templates import CommissioningTemplate
+from .patcher import TemplatePatcher
+from .templates import CommissioningTemplate, TemplatePool
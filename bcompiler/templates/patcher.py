@@ -0,0 +1,674 @@
+"""
+Writes populated forms by patching the template's XML, without openpyxl.
+
+Populating a form changes a few hundred cells, but loading the template into
+openpyxl and saving it again rewrites every part of the workbook. A
+TemplatePatcher reads the template once, splits each worksheet's XML into
+rows, and then, for each form, rewrites only the rows that have cells
+written to them. Every other part of the file (other rows, other
+worksheets, data validations, the VBA project, and so on) is copied into
+the new file exactly as it is in the template; their compressed data is
+copied as it is, so it is not compressed again for every form.
+
+Values are given types and number formats the same way as openpyxl does
+when they are assigned to a cell, and are written as inline strings,
+numbers and date serial numbers. A number format that is not already used
+by the cell's style is added to the form's styles.xml as a new cell style.
+
+The XML is split with regular expressions rather than parsed, so it must be
+laid out as Excel and openpyxl write it, in the default spreadsheetml
+namespace. A template whose worksheets or styles are not is rejected with a
+ValueError rather than patched wrongly.
+"""
+import copy
+import io
+import posixpath
+import re
+import struct
+import zipfile
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import (ERROR_CODES, ILLEGAL_CHARACTERS_RE, STRING_TYPES,
+                                TIME_FORMATS, TIME_TYPES)
+from openpyxl.compat import NUMERIC_TYPES, safe_string
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import (BUILTIN_FORMATS_REVERSE, builtin_format_code,
+                                     is_date_format)
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, to_excel
+from openpyxl.utils.exceptions import IllegalCharacterError
+
+from bcompiler.process.extract import ReturnExtractor
+
+ROOT_RE = re.compile(rb'(?:\xef\xbb\xbf)?\s*(?:(?:<\?.*?\?>|<!--.*?-->)\s*)*<([^\s/>]+)([^>]*)>', re.S)
+ROW_RE = re.compile(rb'<row\b[^>]*?(?:/>|>.*?</row>)', re.S)
+CELL_RE = re.compile(rb'<c\b[^>]*?(?:/>|>.*?</c>)', re.S)
+OPEN_TAG_RE = re.compile(rb'<[^>]*?/?>', re.S)
+ATTR_RE = re.compile(rb'''([\w:]+)\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+DIMENSION_RE = re.compile(rb'<dimension\b[^>]*/>')
+SHEET_DATA_RE = re.compile(rb'<sheetData\s*/>|<sheetData\b[^>]*>(.*?)</sheetData>', re.S)
+DATE1904_RE = re.compile(rb'''<workbookPr\b[^>]*\bdate1904\s*=\s*["'](1|true)["']''')
+NUMFMTS_RE = re.compile(rb'<numFmts\b[^>]*?(?:/>|>(.*?)</numFmts>)', re.S)
+NUMFMT_RE = re.compile(rb'<numFmt\b[^>]*?(?:/>|>.*?</numFmt>)', re.S)
+CELL_XFS_RE = re.compile(rb'(<cellXfs\b[^>]*>)(.*?)(</cellXfs>)', re.S)
+XF_RE = re.compile(rb'<xf\b[^>]*?(?:/>|>.*?</xf>)', re.S)
+STYLESHEET_RE = re.compile(rb'<styleSheet\b[^>]*>')
+FORMULA_RE = re.compile(rb'<f\b[^>]*?(?:/>|>(.*?)</f>)', re.S)
+CALC_CHAIN_OVERRIDE_RE = re.compile(rb'<Override\b[^>]*calcChain[^>]*/>')
+CALC_CHAIN_REL_RE = re.compile(rb'<Relationship\b[^>]*calcChain[^>]*/>')
+
+STYLES_PART = 'xl/styles.xml'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+SPREADSHEETML_NS = b'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+LOCAL_FILE_HEADER = b'PK\x03\x04'
+
+Coordinate = Tuple[int, int]
+
+
+def _attributes(element: bytes) -> Dict[bytes, bytes]:
+    return _tag_attributes(OPEN_TAG_RE.match(element).group(0))
+
+
+def _tag_attributes(tag: bytes) -> Dict[bytes, bytes]:
+    return {name: double or single for name, double, single in ATTR_RE.findall(tag)}
+
+
+def _set_attribute(element: bytes, name: bytes, value: bytes) -> bytes:
+    """
+    Sets attribute name in the opening tag of element.
+    """
+    tag = OPEN_TAG_RE.match(element).group(0)
+    pattern = re.compile(rb'''\b''' + name + rb'''\s*=\s*(?:"[^"]*"|'[^']*')''')
+    if pattern.search(tag):
+        new_tag = pattern.sub(name + b'="' + value + b'"', tag, count=1)
+    else:
+        end = -2 if tag.endswith(b'/>') else -1
+        new_tag = tag[:end].rstrip() + b' ' + name + b'="' + value + b'"' + tag[end:]
+    return new_tag + element[len(tag):]
+
+
+def _root(part: str, xml: bytes) -> bytes:
+    """
+    The name of the root element of part, which must be in the default
+    spreadsheetml namespace. Raises ValueError if it is not.
+    """
+    root = ROOT_RE.match(xml)
+    if root is None or b':' in root.group(1) \
+            or _tag_attributes(root.group(2)).get(b'xmlns') != SPREADSHEETML_NS:
+        raise ValueError("{} is not in the default spreadsheetml namespace, so "
+                         "cannot be patched".format(part))
+    return root.group(1)
+
+
+def _elements(pattern, xml: bytes, part: str) -> List[bytes]:
+    """
+    The elements in xml matched by pattern, which must be all there is in
+    xml apart from whitespace. Raises ValueError if they are not.
+    """
+    elements = []
+    end = 0
+    for match in pattern.finditer(xml):
+        if xml[end:match.start()].strip():
+            break
+        elements.append(match.group(0))
+        end = match.end()
+    if xml[end:].strip():
+        raise ValueError("Unexpected XML in {}, so it cannot be patched: {!r}".format(
+            part, xml[end:end + 40]))
+    return elements
+
+
+class _Row:
+    """
+    A row of a worksheet, split into its opening tag and its cells the first
+    time one of its cells is needed.
+    """
+
+    def __init__(self, part: str, index: int, xml: bytes) -> None:
+        self.part = part
+        self.index = index
+        self.xml = xml
+        self.open_tag = OPEN_TAG_RE.match(xml).group(0)
+        self._cells = None
+
+    @property
+    def cells(self) -> Dict[int, bytes]:
+        if self._cells is None:
+            self._cells = {}
+            column = 0
+            content = b'' if self.open_tag.endswith(b'/>') else \
+                self.xml[len(self.open_tag):-len(b'</row>')]
+            for element in _elements(CELL_RE, content, self.part):
+                ref = _attributes(element).get(b'r')
+                if ref is not None:
+                    column = coordinate_to_tuple(ref.decode())[1]
+                else:
+                    column += 1
+                self._cells[column] = element
+        return self._cells
+
+
+class _Worksheet:
+    """
+    A worksheet's XML, split into the part before the rows, the rows and the
+    part after them.
+    """
+
+    def __init__(self, part: str, xml: bytes) -> None:
+        self.part = part
+        if _root(part, xml) != b'worksheet':
+            raise ValueError("{} is not a worksheet".format(part))
+        data = SHEET_DATA_RE.search(xml)
+        if data is None:
+            raise ValueError("Cannot find the cell data in {}".format(part))
+        self.rows: Dict[int, _Row] = {}
+        if data.group(1) is None:
+            # <sheetData/>
+            self.head = xml[:data.start()] + b'<sheetData>'
+        else:
+            self.head = xml[:data.start(1)]
+            index = 0
+            for element in _elements(ROW_RE, data.group(1), part):
+                ref = _attributes(element).get(b'r')
+                index = int(ref) if ref is not None else index + 1
+                self.rows[index] = _Row(part, index, element)
+        self.tail = b'</sheetData>' + xml[data.end():]
+        dimension = DIMENSION_RE.search(self.head)
+        ref = _attributes(dimension.group(0)).get(b'ref') if dimension else None
+        self.dimension = ref.decode() if ref is not None else None
+
+    def cell(self, row: int, column: int) -> Optional[bytes]:
+        try:
+            return self.rows[row].cells.get(column)
+        except KeyError:
+            return None
+
+
+class _Styles:
+    """
+    The template's styles.xml, and the number format of each cell style.
+    """
+
+    def __init__(self, xml: bytes) -> None:
+        if _root(STYLES_PART, xml) != b'styleSheet':
+            raise ValueError("{} is not a styleSheet".format(STYLES_PART))
+        self.xml = xml
+        self.custom_formats: Dict[int, str] = {}
+        numfmts = NUMFMTS_RE.search(xml)
+        if numfmts is not None and numfmts.group(1):
+            for element in _elements(NUMFMT_RE, numfmts.group(1), STYLES_PART):
+                attributes = _attributes(element)
+                if b'numFmtId' not in attributes or b'formatCode' not in attributes:
+                    raise ValueError("Unexpected number format in {}: {!r}".format(
+                        STYLES_PART, element))
+                self.custom_formats[int(attributes[b'numFmtId'])] = _unescape(
+                    attributes[b'formatCode'].decode())
+        xfs = CELL_XFS_RE.search(xml)
+        if xfs is None:
+            raise ValueError("Cannot find the cell styles in {}".format(STYLES_PART))
+        self.xfs: List[bytes] = _elements(XF_RE, xfs.group(2), STYLES_PART)
+        self.formats = [self._format(int(_attributes(xf).get(b'numFmtId', b'0')))
+                        for xf in self.xfs]
+
+    def _format(self, fmt_id: int) -> str:
+        return self.custom_formats.get(fmt_id) or builtin_format_code(fmt_id) or 'General'
+
+    def format_id(self, code: str, added: Dict[str, int]) -> int:
+        """
+        The numFmtId of the number format code, adding it to added if it is
+        neither built in nor in the template.
+        """
+        if code in BUILTIN_FORMATS_REVERSE:
+            return BUILTIN_FORMATS_REVERSE[code]
+        for fmt_id, custom in self.custom_formats.items():
+            if custom == code:
+                return fmt_id
+        if code not in added:
+            added[code] = max([163] + list(self.custom_formats) + list(added.values())) + 1
+        return added[code]
+
+    def patched(self, new_xfs: List[bytes], new_formats: Dict[str, int]) -> bytes:
+        xml = self.xml
+        if new_formats:
+            elements = b''.join(
+                b'<numFmt numFmtId="%d" formatCode="%s"/>' % (fmt_id, _escape_attribute(code))
+                for code, fmt_id in new_formats.items())
+            numfmts = NUMFMTS_RE.search(xml)
+            if numfmts is None:
+                start = STYLESHEET_RE.search(xml).end()
+                xml = (xml[:start] + b'<numFmts count="%d">' % len(new_formats)
+                       + elements + b'</numFmts>' + xml[start:])
+            else:
+                count = len(self.custom_formats) + len(new_formats)
+                xml = (xml[:numfmts.start()] + b'<numFmts count="%d">' % count
+                       + (numfmts.group(1) or b'') + elements + b'</numFmts>'
+                       + xml[numfmts.end():])
+        xfs = CELL_XFS_RE.search(xml)
+        open_tag = _set_attribute(xfs.group(1), b'count', b'%d' % (len(self.xfs) + len(new_xfs)))
+        return (xml[:xfs.start()] + open_tag + xfs.group(2) + b''.join(new_xfs)
+                + xfs.group(3) + xml[xfs.end():])
+
+
+def _unescape(text: str) -> str:
+    return (text.replace('&quot;', '"').replace('&lt;', '<').replace('&gt;', '>')
+            .replace('&amp;', '&'))
+
+
+def _escape_attribute(text: str) -> bytes:
+    return escape(text, {'"': '&quot;'}).encode('utf-8')
+
+
+class PatchedCell:
+    """
+    A cell written to in a :py:class:`FormPatch`. value and number_format
+    can be set as for an openpyxl cell, and the value is given a type, and
+    dates a number format, in the same way.
+    """
+    __slots__ = ('_sheet', 'row', 'column', '_value', 'data_type', '_number_format', 'written')
+
+    def __init__(self, sheet: 'SheetPatch', row: int, column: int) -> None:
+        self._sheet = sheet
+        self.row = row
+        self.column = column
+        self._value = None
+        self.data_type = 'n'
+        self._number_format = None
+        # a cell that is only looked at, as in openpyxl, is left as it is
+        self.written = False
+
+    @property
+    def coordinate(self) -> str:
+        return "{}{}".format(get_column_letter(self.column), self.row)
+
+    @property
+    def number_format(self) -> str:
+        if self._number_format is not None:
+            return self._number_format
+        return self._sheet.template_format(self.row, self.column)
+
+    @number_format.setter
+    def number_format(self, value: str) -> None:
+        self._number_format = value
+        self.written = True
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value) -> None:
+        self.data_type = 'n'
+        t = type(value)
+        if t in NUMERIC_TYPES:
+            pass
+        elif t in TIME_TYPES:
+            if not is_date_format(self.number_format):
+                self.number_format = TIME_FORMATS[t]
+            self.data_type = 'd'
+        elif t in STRING_TYPES:
+            if not isinstance(value, str):
+                value = str(value, 'utf-8')
+            value = value[:32767]
+            if ILLEGAL_CHARACTERS_RE.search(value):
+                raise IllegalCharacterError
+            self.data_type = 's'
+            if len(value) > 1 and value.startswith('='):
+                self.data_type = 'f'
+            elif value in ERROR_CODES:
+                self.data_type = 'e'
+        elif t is bool:
+            self.data_type = 'b'
+        elif value is not None:
+            raise ValueError("Cannot convert {0!r} to Excel".format(value))
+        self._value = value
+        self.written = True
+
+
+class SheetPatch:
+    """
+    The cells written to one worksheet of a :py:class:`FormPatch`.
+    """
+
+    def __init__(self, patcher: 'TemplatePatcher', title: str) -> None:
+        self._patcher = patcher
+        self.title = title
+        self.cells: Dict[Coordinate, PatchedCell] = {}
+
+    def __getitem__(self, reference: str) -> PatchedCell:
+        row, column = coordinate_to_tuple(reference)
+        try:
+            return self.cells[(row, column)]
+        except KeyError:
+            cell = self.cells[(row, column)] = PatchedCell(self, row, column)
+            return cell
+
+    def template_format(self, row: int, column: int) -> str:
+        return self._patcher.template_format(self.title, row, column)
+
+
+class FormPatch:
+    """
+    A form to be written from a :py:class:`TemplatePatcher`. Worksheets and
+    cells are got as from an openpyxl Workbook, but only for writing to::
+
+        form = patcher.copy()
+        form['Summary']['B5'].value = 'Project Name 1'
+        form.save('Project Name 1_Return.xlsm')
+    """
+
+    def __init__(self, patcher: 'TemplatePatcher') -> None:
+        self._patcher = patcher
+        self._sheets: Dict[str, SheetPatch] = {}
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return self._patcher.sheetnames
+
+    def __getitem__(self, title: str) -> SheetPatch:
+        try:
+            return self._sheets[title]
+        except KeyError:
+            if title not in self._patcher.sheetnames:
+                raise KeyError("Worksheet {0} does not exist.".format(title))
+            sheet = self._sheets[title] = SheetPatch(self._patcher, title)
+            return sheet
+
+    @property
+    def sheets(self) -> List[SheetPatch]:
+        return list(self._sheets.values())
+
+    def save(self, filename: str) -> None:
+        self._patcher.save(self, filename)
+
+
+class TemplatePatcher:
+    """
+    A template, read once, from which any number of forms can be written by
+    patching its XML. It has the same interface as
+    :py:class:`bcompiler.templates.TemplatePool`: copy() gives a form to write
+    cells to, which is then saved.
+
+    Only cells can be written to a form. The template must be an xlsx or
+    xlsm file whose worksheets and styles use the default spreadsheetml
+    namespace, as Excel and openpyxl write them; ValueError is raised if
+    they do not.
+    """
+
+    def __init__(self, source_file: str) -> None:
+        self.source_file = source_file
+        with ReturnExtractor(source_file) as extractor:
+            self._sheet_parts = {name: extractor.sheet_part(name)
+                                 for name in extractor.sheet_names}
+        with zipfile.ZipFile(source_file) as archive:
+            members = {info.filename: archive.read(info) for info in archive.infolist()}
+            infos = archive.infolist()
+        workbook = next((p for p in members if posixpath.basename(p) == 'workbook.xml'), None)
+        self._epoch = CALENDAR_WINDOWS_1900
+        if workbook and DATE1904_RE.search(members[workbook]):
+            self._epoch = CALENDAR_MAC_1904
+        # chartsheets have no cells, and are copied as they are
+        self._worksheets = {name: _Worksheet(part, members[part])
+                            for name, part in self._sheet_parts.items()
+                            if part in members and _root(part, members[part]) != b'chartsheet'}
+        self._styles = _Styles(members[STYLES_PART]) if STYLES_PART in members else None
+        self._calc_chain = next((p for p in members if p.endswith('calcChain.xml')), None)
+
+        # everything that can be changed in a form is kept uncompressed, and
+        # written to each one as it is saved; the rest of the template's
+        # contents are kept as they are stored in it, and copied into each form
+        patchable = {ws.part for ws in self._worksheets.values()}
+        patchable.add(STYLES_PART)
+        if self._calc_chain:
+            patchable.update({self._calc_chain, CONTENT_TYPES_PART, _workbook_rels(workbook)})
+        self._members = {name: members[name] for name in members if name in patchable}
+        self._entries: List[Tuple[zipfile.ZipInfo, Optional[bytes]]] = []
+        with open(source_file, 'rb') as source:
+            for info in infos:
+                raw = None if info.filename in patchable else _raw_member(source, info)
+                self._entries.append((info, raw))
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return list(self._sheet_parts)
+
+    def copy(self) -> FormPatch:
+        """
+        A new, empty form.
+        """
+        return FormPatch(self)
+
+    def template_format(self, title: str, row: int, column: int) -> str:
+        """
+        The number format of a cell in the template.
+        """
+        element = self._worksheets[title].cell(row, column)
+        if element is None or self._styles is None:
+            return 'General'
+        return self._styles.formats[int(_attributes(element).get(b's', b'0'))]
+
+    def _cell_xml(self, cell: PatchedCell, old: Optional[bytes], style: Optional[int]) -> Optional[bytes]:
+        attributes = _attributes(old) if old is not None else {}
+        if cell._value is None and old is None and style is None:
+            return None
+        attrs = [(b'r', cell.coordinate.encode())]
+        if style is not None:
+            attrs.append((b's', b'%d' % style))
+        elif b's' in attributes:
+            attrs.append((b's', attributes[b's']))
+        value = cell._value
+        if cell.data_type == 'd':
+            attrs.append((b't', b'n'))
+            value = to_excel(value, self._epoch)
+        elif cell.data_type == 's':
+            attrs.append((b't', b'inlineStr'))
+        elif cell.data_type != 'f':
+            attrs.append((b't', cell.data_type.encode()))
+        attrs.extend((k, v) for k, v in attributes.items() if k not in (b'r', b's', b't'))
+        open_tag = b'<c ' + b' '.join(k + b'="' + v + b'"' for k, v in attrs)
+        if value is None or value == '':
+            return open_tag + b'/>'
+        if cell.data_type == 'f':
+            content = b'<f>' + escape(value[1:]).encode('utf-8') + b'</f><v></v>'
+        elif cell.data_type == 's':
+            text = escape(value, {'\r': '&#13;'}).encode('utf-8')
+            space = b' xml:space="preserve"' if value != value.strip() else b''
+            content = b'<is><t' + space + b'>' + text + b'</t></is>'
+        else:
+            text = safe_string(value)
+            if text == '':
+                return open_tag + b'/>'
+            content = b'<v>' + escape(text).encode('utf-8') + b'</v>'
+        return open_tag + b'>' + content + b'</c>'
+
+    def _patched_worksheet(self, sheet: SheetPatch, new_xfs: List[bytes],
+                           new_formats: Dict[str, int], styles_added: Dict) -> Tuple[bytes, bool]:
+        """
+        The worksheet XML with sheet's cells written into it, and whether any
+        cell that had a formula was overwritten.
+        """
+        worksheet = self._worksheets[sheet.title]
+        by_row: Dict[int, Dict[int, PatchedCell]] = {}
+        for (row, column), cell in sheet.cells.items():
+            if cell.written:
+                by_row.setdefault(row, {})[column] = cell
+        replaced_formula = False
+        written: List[Coordinate] = []
+        unshared = self._unshared_formulas(
+            worksheet, {(row, column) for row, cells in by_row.items() for column in cells})
+        unshared_by_row: Dict[int, Dict[int, bytes]] = {}
+        for (row, column), element in unshared.items():
+            unshared_by_row.setdefault(row, {})[column] = element
+            by_row.setdefault(row, {})
+
+        patched_rows = {}
+        for row_idx, cells in by_row.items():
+            row = worksheet.rows.get(row_idx)
+            row_cells = dict(row.cells) if row is not None else {}
+            row_cells.update(unshared_by_row.get(row_idx, {}))
+            for column, cell in cells.items():
+                old = row_cells.get(column)
+                if old is not None and b'<f' in old:
+                    replaced_formula = True
+                style = None
+                if cell._number_format is not None and self._styles is not None:
+                    xf_idx = int(_attributes(old).get(b's', b'0')) if old is not None else 0
+                    fmt_id = self._styles.format_id(cell._number_format, new_formats)
+                    current = int(_attributes(self._styles.xfs[xf_idx]).get(b'numFmtId', b'0'))
+                    if fmt_id != current:
+                        key = (xf_idx, fmt_id)
+                        if key not in styles_added:
+                            xf = _set_attribute(self._styles.xfs[xf_idx], b'numFmtId', b'%d' % fmt_id)
+                            xf = _set_attribute(xf, b'applyNumberFormat', b'1')
+                            styles_added[key] = len(self._styles.xfs) + len(new_xfs)
+                            new_xfs.append(xf)
+                        style = styles_added[key]
+                element = self._cell_xml(cell, old, style)
+                if element is None:
+                    continue
+                row_cells[column] = element
+                written.append((row_idx, column))
+            if row is None:
+                if row_cells:
+                    patched_rows[row_idx] = (b'<row r="%d">' % row_idx
+                                             + b''.join(row_cells[c] for c in sorted(row_cells))
+                                             + b'</row>')
+            else:
+                open_tag = row.open_tag
+                if set(row_cells) - set(row.cells):
+                    # spans is only a hint, and may no longer be right
+                    open_tag = re.sub(rb'''\s+spans\s*=\s*(?:"[^"]*"|'[^']*')''', b'', open_tag)
+                if open_tag.endswith(b'/>'):
+                    open_tag = open_tag[:-2].rstrip() + b'>'
+                patched_rows[row_idx] = (open_tag
+                                         + b''.join(row_cells[c] for c in sorted(row_cells))
+                                         + b'</row>')
+
+        row_order = sorted(set(worksheet.rows) | set(patched_rows))
+        body = b''.join(patched_rows[r] if r in patched_rows else worksheet.rows[r].xml
+                        for r in row_order)
+        head = worksheet.head
+        if worksheet.dimension is not None and written:
+            head = DIMENSION_RE.sub(
+                b'<dimension ref="' + self._dimension(worksheet.dimension, written).encode() + b'"/>',
+                head, count=1)
+        return head + body + worksheet.tail, replaced_formula
+
+    @staticmethod
+    def _unshared_formulas(worksheet: _Worksheet, written) -> Dict[Coordinate, bytes]:
+        """
+        Cells that share the formula of a cell in written, rewritten with
+        their own copy of it. A shared formula's text is only stored in its
+        first cell, so the others would be left with nothing to refer to
+        when that cell is overwritten.
+        """
+        unshared: Dict[Coordinate, bytes] = {}
+        for row, column in written:
+            old = worksheet.cell(row, column)
+            formula = FORMULA_RE.search(old) if old is not None else None
+            if formula is None or formula.group(1) is None:
+                continue
+            attributes = _attributes(formula.group(0))
+            if attributes.get(b't') != b'shared' or b'ref' not in attributes:
+                continue
+            translator = Translator('=' + _unescape(formula.group(1).decode('utf-8')),
+                                    "{}{}".format(get_column_letter(column), row))
+            min_col, min_row, max_col, max_row = range_boundaries(attributes[b'ref'].decode())
+            for dep_row in range(min_row, max_row + 1):
+                for dep_column in range(min_col, max_col + 1):
+                    if (dep_row, dep_column) in written:
+                        continue
+                    element = worksheet.cell(dep_row, dep_column)
+                    shared = FORMULA_RE.search(element) if element is not None else None
+                    if (shared is None
+                            or _attributes(shared.group(0)).get(b'si') != attributes.get(b'si')):
+                        continue
+                    text = translator.translate_formula(
+                        "{}{}".format(get_column_letter(dep_column), dep_row))[1:]
+                    unshared[(dep_row, dep_column)] = (
+                        element[:shared.start()] + b'<f>' + escape(text).encode('utf-8')
+                        + b'</f>' + element[shared.end():])
+        return unshared
+
+    @staticmethod
+    def _dimension(ref: str, written: List[Coordinate]) -> str:
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(ref)
+        except (ValueError, TypeError):
+            return ref
+        if None in (min_col, min_row, max_col, max_row):
+            return ref
+        rows = [r for r, _ in written]
+        columns = [c for _, c in written]
+        min_row, max_row = min([min_row] + rows), max([max_row] + rows)
+        min_col, max_col = min([min_col] + columns), max([max_col] + columns)
+        return "{}{}:{}{}".format(get_column_letter(min_col), min_row,
+                                  get_column_letter(max_col), max_row)
+
+    def save(self, form: FormPatch, filename: str) -> None:
+        """
+        Writes form to filename.
+        """
+        patched = {}
+        new_xfs: List[bytes] = []
+        new_formats: Dict[str, int] = {}
+        styles_added: Dict = {}
+        drop_calc_chain = False
+        for sheet in form.sheets:
+            if not any(cell.written for cell in sheet.cells.values()):
+                continue
+            xml, replaced_formula = self._patched_worksheet(sheet, new_xfs, new_formats, styles_added)
+            patched[self._worksheets[sheet.title].part] = xml
+            drop_calc_chain = drop_calc_chain or (replaced_formula and self._calc_chain is not None)
+        if new_xfs:
+            patched[STYLES_PART] = self._styles.patched(new_xfs, new_formats)
+        if drop_calc_chain:
+            # Excel reports the file as damaged if the calculation chain
+            # lists a cell that no longer has a formula
+            patched[CONTENT_TYPES_PART] = CALC_CHAIN_OVERRIDE_RE.sub(
+                b'', self._members[CONTENT_TYPES_PART])
+            rels = next(p for p in self._members if p.endswith('workbook.xml.rels'))
+            patched[rels] = CALC_CHAIN_REL_RE.sub(b'', self._members[rels])
+
+        with zipfile.ZipFile(filename, 'w') as out:
+            for info, raw in self._entries:
+                if raw is not None:
+                    _write_raw(out, info, raw)
+                elif not (drop_calc_chain and info.filename == self._calc_chain):
+                    out.writestr(copy.copy(info),
+                                 patched.get(info.filename, self._members[info.filename]))
+
+
+def _raw_member(source, info: zipfile.ZipInfo) -> bytes:
+    """
+    The data of the member info of the zip file source, as it is stored,
+    without decompressing it.
+    """
+    source.seek(info.header_offset)
+    header = source.read(30)
+    if header[:4] != LOCAL_FILE_HEADER:
+        raise ValueError("Bad zip file header for {}".format(info.filename))
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.seek(name_length + extra_length, io.SEEK_CUR)
+    return source.read(info.compress_size)
+
+
+def _write_raw(out: zipfile.ZipFile, info: zipfile.ZipInfo, raw: bytes) -> None:
+    """
+    Adds raw, the stored data of info from another zip file, to out without
+    compressing it again.
+    """
+    info = copy.copy(info)
+    # the sizes and CRC are written in the header, not after the data
+    info.flag_bits &= ~0x08
+    info.header_offset = out.fp.tell()
+    out.fp.write(info.FileHeader())
+    out.fp.write(raw)
+    out.filelist.append(info)
+    out.NameToInfo[info.filename] = info
+    out.start_dir = out.fp.tell()
+
+
+def _workbook_rels(workbook: str) -> str:
+    folder, name = posixpath.split(workbook)
+    return posixpath.join(folder, '_rels', name + '.rels')
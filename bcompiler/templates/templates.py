@@ -1,7 +1,27 @@
+import copy
+from typing import Dict, Iterable, Optional, Set, Tuple
+
 from openpyxl import load_workbook
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.styles.differential import DifferentialStyleList
+from openpyxl.styles.named_styles import NamedStyleList
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.exceptions import CellCoordinatesException
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.dimensions import DimensionHolder
+from openpyxl.worksheet.worksheet import Worksheet
 
 from bcompiler.utils import TEMPLATE
 
+# workbook style tables which grow when a cell in a copy is given a new style
+STYLE_TABLES = ('_fonts', '_alignments', '_borders', '_fills', '_number_formats',
+                '_protections', '_cell_styles')
+
+# worksheet contents, other than cells, that populating or saving a copy can
+# change, so each copy has its own
+WORKSHEET_CONTAINERS = ('merged_cells', 'data_validations', 'conditional_formatting',
+                        '_images', '_charts', '_tables')
+
 
 class CommissioningTemplate():
     """
@@ -10,11 +30,107 @@ class CommissioningTemplate():
     project data in it.
     """
 
-    def __init__(self):
-        self.source_file = TEMPLATE
+    def __init__(self, source_file: Optional[str] = None):
+        self.source_file = source_file or TEMPLATE
         self.openpyxl_obj = self._load_workbook()
         self.sheets = self.openpyxl_obj.sheetnames
         self.blank = True
 
     def _load_workbook(self):
         return load_workbook(filename=self.source_file, keep_vba=True)
+
+
+def _copy_cell(cell: Cell, worksheet) -> Cell:
+    new = Cell(worksheet, row=cell.row, column=cell.column,
+               style_array=copy.copy(cell._style))
+    new._value = cell._value
+    new.data_type = cell.data_type
+    new._hyperlink = copy.copy(cell._hyperlink)
+    new._comment = copy.copy(cell._comment)
+    return new
+
+
+class TemplatePool(CommissioningTemplate):
+    """
+    A template that is parsed once and then copied, rather than loaded again,
+    for each form to be populated::
+
+        pool = TemplatePool(path, cells=[('Summary', 'B5'), ('Summary', 'C15')])
+        blank = pool.copy()
+        blank['Summary']['B5'].value = 'Project Name 1'
+        blank.save('Project Name 1_Return.xlsm')
+
+    cells is every (sheet name, cell reference) that will be written to in a
+    copy. Those cells are copied for each form and every other cell is shared
+    with the template, which is what makes copying cheap. If cells is not
+    given, every cell in the template is copied. Writing to a cell that was
+    not in cells, but has a value or style in the template, would change the
+    template and every later copy.
+
+    Besides those cells, each copy has its own styles, defined names, merged
+    cells, data validations, conditional formatting, images, charts and
+    tables, so changing them does not change the template. Anything else
+    (column widths, sheet views, page setup and the like) is shared with the
+    template and should not be changed. The VBA project is shared too, and is
+    written unchanged into each copy that is saved.
+    """
+
+    def __init__(self, source_file: Optional[str] = None,
+                 cells: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        super().__init__(source_file)
+        self._writable: Optional[Dict[str, Set[Tuple[int, int]]]] = None
+        if cells is not None:
+            self._writable = {}
+            for sheet, reference in cells:
+                try:
+                    self._writable.setdefault(sheet, set()).add(coordinate_to_tuple(reference))
+                except (CellCoordinatesException, ValueError, TypeError):
+                    # a cell that cannot be written to does not need copying
+                    continue
+
+    def _copy_worksheet(self, ws, workbook, memo: Dict):
+        new = copy.copy(ws)
+        new._parent = workbook
+        # anything deep copied that refers to the template's worksheet refers
+        # to the copy instead
+        memo[id(ws)] = new
+        if not isinstance(ws, Worksheet):
+            # chartsheets have no cells
+            new._charts = copy.deepcopy(ws._charts, memo)
+            return new
+        for name in WORKSHEET_CONTAINERS:
+            setattr(new, name, copy.deepcopy(getattr(ws, name), memo))
+        new._cells = dict(ws._cells)
+        # saving a workbook changes these, so each copy needs its own
+        new.sheet_format = copy.copy(ws.sheet_format)
+        new._comments = list(ws._comments)
+        new.row_dimensions = DimensionHolder(worksheet=new, default_factory=new._add_row)
+        new.row_dimensions.update(ws.row_dimensions)
+        new.column_dimensions = DimensionHolder(worksheet=new, default_factory=new._add_column)
+        new.column_dimensions.update(ws.column_dimensions)
+        if self._writable is None:
+            to_copy = ws._cells
+        else:
+            to_copy = self._writable.get(ws.title, ())
+        for key in to_copy:
+            cell = ws._cells.get(key)
+            if cell is not None and not isinstance(cell, MergedCell):
+                new._cells[key] = _copy_cell(cell, new)
+        return new
+
+    def copy(self):
+        """
+        A fresh copy of the template, as an openpyxl Workbook.
+        """
+        template = self.openpyxl_obj
+        workbook = copy.copy(template)
+        for name in STYLE_TABLES:
+            setattr(workbook, name, IndexedList(getattr(template, name)))
+        workbook._named_styles = NamedStyleList(template._named_styles)
+        workbook._differential_styles = DifferentialStyleList(
+            dxf=list(template._differential_styles.dxf))
+        workbook._pivots = []
+        memo = {id(template): workbook}
+        workbook.defined_names = copy.deepcopy(template.defined_names, memo)
+        workbook._sheets = [self._copy_worksheet(ws, workbook, memo) for ws in template._sheets]
+        return workbook
@@ -88,3 +88,29 @@ def test_for_new_projects_in_current_master(previous_quarter_master, tmpdir, mas
     ws = wb.active
     assert ws['D7'].value is None
 
+
+def test_annex_jobs_match_serial(previous_quarter_master, tmpdir, master):
+    serial = tmpdir.mkdir('serial')
+    parallel = tmpdir.mkdir('parallel')
+    annex_run(previous_quarter_master, [str(serial)], master)
+    annex_run(previous_quarter_master, [str(parallel)], master, jobs=2)
+    names = sorted(f.basename for f in serial.listdir())
+    assert names == sorted(f.basename for f in parallel.listdir())
+    assert len(names) == len(project_titles_in_master(master))
+    for name in names:
+        ws1 = load_workbook(serial.join(name)).active
+        ws2 = load_workbook(parallel.join(name)).active
+        assert ([[c.value for c in r] for r in ws1.iter_rows()] ==
+                [[c.value for c in r] for r in ws2.iter_rows()])
+
+
+def test_annex_key_rows_follow_master_layout():
+    from ..analysers.annex import ANNEX_KEYS, annex_key_rows
+    keys = ['Project/Programme Name', 'Inserted row'] + list(reversed(ANNEX_KEYS.values()))
+    keys.remove('GMPP - IPA DCA')
+    keys.append('Total Forecast')
+    rows = annex_key_rows(keys)
+    assert rows['SRO_Comm'] == 3
+    assert rows['SRO_name'] == len(keys) - 1
+    assert rows['WLC_value'] == keys.index('Total Forecast') + 1
+    assert rows['ipa_rag'] is None
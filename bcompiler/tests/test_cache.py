@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from ..process.cache import ReturnCache
+from ..process.cell import Cell
+from ..process.datamap import CompiledDatamap
+
+
+def _datamap(cellref):
+    return CompiledDatamap([Cell(cell_key='Project/Programme Name',
+                                 cell_value=None,
+                                 cell_reference=cellref,
+                                 template_sheet='Summary',
+                                 bg_colour=None,
+                                 fg_colour=None,
+                                 number_format=None,
+                                 verification_list=None)])
+
+
+def test_return_cache_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        ret = os.path.join(tmp, 'return.xlsm')
+        with open(ret, 'wb') as f:
+            f.write(b'first version')
+        out_map = [dict(gmpp_key='Project/Programme Name', gmpp_key_value='PROJECT 1')]
+
+        cache = ReturnCache(tmp, _datamap('B5'))
+        assert cache.get(ret) is None
+        cache.put(ret, out_map)
+        out_map[0]['gmpp_key_value'] = 'changed after caching'
+        cache.save()
+
+        cache = ReturnCache(tmp, _datamap('B5'))
+        assert cache.get(ret)[0]['gmpp_key_value'] == 'PROJECT 1'
+        assert (cache.hits, cache.misses) == (1, 0)
+
+        # a different datamap misses
+        assert ReturnCache(tmp, _datamap('C5')).get(ret) is None
+
+        # so does a changed return
+        with open(ret, 'wb') as f:
+            f.write(b'second version')
+        assert ReturnCache(tmp, _datamap('B5')).get(ret) is None
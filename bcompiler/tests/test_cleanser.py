@@ -1,5 +1,6 @@
 import datetime
-from ..process.cleansers import Cleanser
+from ..process import cleansers
+from ..process.cleansers import CleanCache, Cleanser, clean_many
 
 
 def test_cleaning_dot_date():
@@ -39,3 +40,98 @@ def test_double_trailing_space():
     assert c.clean() == 'Pre 14-15 BL - Incoming both Revenue and Capital'
     c = Cleanser(contains_single_trailing)
     assert c.clean() == 'Pre 14-15 BL - Incoming both Revenue and Capital'
+
+
+def _outcome(cls, value):
+    try:
+        return cls(value).clean()
+    except Exception as e:
+        return type(e)
+
+
+def test_cleanser_matches_legacy_cleanser(master):
+    from openpyxl import load_workbook
+    from .legacy_cleanser import LegacyCleanser
+
+    values = [
+        "", " ", "Green", "Amber/Green", "Yes", "12", "0012", "-12", "+3", "1.5",
+        ".5", "3.", "50%", "100%", "1000%", "£12.24", "-£5", "£1,000", "£12.245",
+        "25/1/72", "25.01.1972", "2017-05-01", "2017-05-01 0:00:00",
+        "2017-13-01 0:00:00", "01/02/2017\n", "31/02/2017", "2017-05-01 and more",
+        "Text, with commas", "a,b, c", "'leading", "''double", "line\nbreak\n",
+        "two  spaces  here", "trailing  ", "trailing ", "a |b", "x | y",
+        "Pre 14-15 BL – Income", "– ", "١٢", "12\n", "ǅ", "abc123", "ABC def",
+        "1,2", "50% ", "£12 ", "12 ", "2016.5", "5/5/65", "5/5/66",
+        None, 12, 1.5, datetime.date(2017, 1, 1), b"bytes",
+    ]
+    ws = load_workbook(master).active
+    values += [cell.value for row in ws.iter_rows(max_col=2) for cell in row]
+    for value in values:
+        assert _outcome(Cleanser, value) == _outcome(LegacyCleanser, value), repr(value)
+
+
+def test_cleanser_matches_legacy_cleanser_fuzz():
+    import random
+    from .legacy_cleanser import LegacyCleanser
+
+    alphabet = "aZ09 ,'\n|–£%./-:+" + "0123456789"
+    rng = random.Random(4)
+    for _ in range(5000):
+        value = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        assert _outcome(Cleanser, value) == _outcome(LegacyCleanser, value), repr(value)
+
+
+def test_clean_many():
+    values = ["Green", "Text, with commas", None, "12", "Green", 3.5, "25/01/1972"]
+    assert clean_many(values) == [
+        "Green", "Text with commas", None, 12, "Green", 3.5, datetime.date(1972, 1, 25)]
+    assert clean_many(iter(values)) == clean_many(values)
+    assert clean_many([]) == []
+
+
+def test_clean_cache_counts_and_evicts():
+    cache = CleanCache(2)
+    assert cache.clean("Text, with commas") == "Text with commas"
+    assert cache.clean("12") == 12
+    assert cache.clean("Text, with commas") == "Text with commas"
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 0)
+    # "12" is now least recently used, so goes first
+    cache.clean("Green")
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 3, 1)
+    assert len(cache) == 2
+    cache.clean("12")
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 2)
+
+
+def test_clean_uses_cache_when_set():
+    try:
+        cache = cleansers.set_clean_cache(10)
+        assert clean_many(["Green", "Green", None]) == ["Green", "Green", None]
+        assert cleansers.clean("Green") == "Green"
+        assert (cache.hits, cache.misses) == (1, 1)
+        try:
+            cleansers.clean(None)
+        except TypeError:
+            pass
+        else:
+            assert False, "clean(None) should raise TypeError"
+    finally:
+        cleansers.set_clean_cache(0)
+    assert cleansers.clean_cache() is None
+
+
+def test_cleaning_cache_puts_back_previous_cache():
+    try:
+        previous = cleansers.set_clean_cache(10)
+        with cleansers.cleaning_cache(5) as cache:
+            assert cleansers.clean_cache() is cache
+            assert cache.maxsize == 5
+        assert cleansers.clean_cache() is previous
+        try:
+            with cleansers.cleaning_cache(5):
+                raise ValueError
+        except ValueError:
+            pass
+        assert cleansers.clean_cache() is previous
+    finally:
+        cleansers.set_clean_cache(0)
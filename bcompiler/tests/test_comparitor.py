@@ -0,0 +1,24 @@
+from ..process.simple_comparitor import FileComparitor, ParsedMaster
+
+
+def test_parsed_master_project_index(master):
+    pm = ParsedMaster(master)
+    assert pm.project_header_index['PROJECT/PROGRAMME NAME 1'] == 2
+    assert pm.project_header_index['PROJECT/PROGRAMME NAME 3'] == 4
+    p2 = pm.project_index['PROJECT/PROGRAMME NAME 2']
+    assert p2['SRO Full Name'] == 'SRO FULL NAME 2'
+
+
+def test_get_value_matches_column_scan(master):
+    pm = ParsedMaster(master)
+    for col_index in pm.project_header_index.values():
+        data = pm.get_project_data(col_index=col_index)
+        for key, _ in data:
+            assert pm.get_value(col_index, key) == pm.get_data_with_key(data, key)
+
+
+def test_compare_missing_key_returns_none(master):
+    comparitor = FileComparitor([master])
+    assert comparitor.compare(2, 'SRO Full Name') == 'SRO FULL NAME 1'
+    assert comparitor.compare(2, 'Not a key in the master') is None
+    assert comparitor.compare(99, 'SRO Full Name') is None
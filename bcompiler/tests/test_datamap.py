@@ -1,4 +1,6 @@
-from ..process.datamap import Datamap
+import pickle
+
+from ..process.datamap import CompiledDatamap, Datamap
 from ..process.cell import Cell
 
 
@@ -20,3 +22,18 @@ def test_datamap_from_csv(datamap):
     assert d.cell_map[0].cell_reference == 'B5'
 
 
+def test_compiled_datamap_from_csv(datamap):
+    dm = CompiledDatamap.from_csv(datamap)
+    first = dm.targets[0]
+    assert first.cell_key == 'Project/Programme Name'
+    assert (first.row, first.column) == (5, 2)
+    assert dm.sheets[0] == 'Summary'
+    assert all(t.template_sheet == 'Summary' for t in dm.by_sheet['Summary'])
+    assert sum(len(ts) for ts in dm.by_sheet.values()) == len(dm)
+
+
+def test_compiled_datamap_is_picklable(datamap):
+    dm = CompiledDatamap.from_csv(datamap)
+    dm_copy = pickle.loads(pickle.dumps(dm))
+    assert dm_copy.targets == dm.targets
+    assert dm_copy.by_sheet == dm.by_sheet
@@ -0,0 +1,79 @@
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from ..process.extract import ReturnExtractor
+
+TEMPDIR = tempfile.gettempdir()
+
+
+@pytest.fixture
+def mixed_workbook():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Summary"
+    ws['A1'] = "Project/Programme Name"
+    ws['B1'] = "PROJECT 1"
+    ws['B2'] = 12
+    ws['B3'] = 32.3333
+    ws['B4'] = date(2017, 6, 20)
+    ws['B5'] = datetime(2016, 1, 1, 10, 30)
+    ws['B6'] = True
+    ws['B7'] = "=1+1"
+    ws['C9'] = "Text with trailing space "
+    ws['B12'] = -1.5e-05
+    ws['D30'] = "far away"
+    other = wb.create_sheet("Finance & Benefits")
+    other['C20'] = "PROJECT 1"
+    wb.create_sheet("Never read")
+    path = os.path.join(TEMPDIR, 'extract_test.xlsx')
+    wb.save(path)
+    return path
+
+
+def test_extract_matches_openpyxl(mixed_workbook):
+    coords = [(r, c) for r in range(1, 32) for c in range(1, 5)]
+    wb = load_workbook(mixed_workbook, read_only=True, data_only=True)
+    with ReturnExtractor(mixed_workbook) as ex:
+        for sheet in ["Summary", "Finance & Benefits"]:
+            values = ex.cells(sheet, coords)
+            ws = wb[sheet]
+            for row, col in coords:
+                assert values[(row, col)] == ws.cell(row=row, column=col).value
+
+
+def test_extract_missing_sheet(mixed_workbook):
+    with ReturnExtractor(mixed_workbook) as ex:
+        assert ex.sheet_names == ["Summary", "Finance & Benefits", "Never read"]
+        with pytest.raises(KeyError):
+            ex.cells("Not there", [(1, 1)])
+
+
+def test_extract_returns_only_requested_cells(mixed_workbook):
+    with ReturnExtractor(mixed_workbook) as ex:
+        values = ex.cells("Summary", [(1, 2), (4, 2), (100, 100)])
+    assert values == {(1, 2): "PROJECT 1", (4, 2): datetime(2017, 6, 20), (100, 100): None}
+
+
+def test_row_count_matches_openpyxl(mixed_workbook):
+    wb = load_workbook(mixed_workbook)
+    wb['Finance & Benefits'].merge_cells('A30:B42')
+    wb.save(mixed_workbook)
+    # the same workbook with no <dimension> elements, so the rows are counted
+    no_dimension = os.path.join(TEMPDIR, 'extract_test_no_dimension.xlsx')
+    with zipfile.ZipFile(mixed_workbook) as src, zipfile.ZipFile(no_dimension, 'w') as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name.startswith('xl/worksheets/'):
+                data = re.sub(rb'<dimension[^>]*/>', b'', data)
+            dst.writestr(name, data)
+    expected = [len(list(wb[sheet].rows)) for sheet in wb.sheetnames]
+    assert expected == [30, 42, 0]
+    for path in [mixed_workbook, no_dimension]:
+        with ReturnExtractor(path) as ex:
+            assert [ex.row_count(sheet) for sheet in ex.sheet_names] == expected
@@ -2,14 +2,16 @@ import os
 import tempfile
 from datetime import date
 
-from openpyxl import load_workbook
+from openpyxl import load_workbook, Workbook
 
 import bcompiler.compile as compile_module
 from bcompiler.utils import runtime_config as config
 from ..compile import parse_comparison_master
 from ..compile import parse_source_cells as parse
 from ..compile import run
-from ..process.datamap import Datamap
+from ..compile import write_excel, _master_column, _write_streamed_master
+from ..process.cleansers import clean_cache, cleaning_cache
+from ..process.datamap import CompiledDatamap, Datamap
 
 TODAY = date.today().isoformat()
 TEMPDIR = tempfile.gettempdir()
@@ -121,3 +123,81 @@ def test_datamap_class(datamap):
     dm = Datamap()
     dm.cell_map_from_csv(datamap)
     assert dm.cell_map[1].cell_reference == 'B49'
+
+
+def test_streamed_master_matches_in_memory_master():
+    keys = ['Project/Programme Name', 'SRO Full Name', 'Total Forecast']
+    out_maps = [
+        [dict(gmpp_key=k, gmpp_key_value=v) for k, v in zip(keys, values)]
+        for values in [('PROJECT 1', 'SRO 1', 32.3), ('PROJECT 2', None, 12)]]
+
+    wb = Workbook()
+    for count, out_map in enumerate(out_maps, start=1):
+        write_excel(None, count, wb, out_map=[dict(d) for d in out_map])
+    in_memory = [[c.value for c in row] for row in wb.active.iter_rows()]
+
+    streamed_file = os.path.join(TEMPDIR, 'streamed_master.xlsx')
+    columns = [_master_column([dict(d) for d in out_map], count)
+               for count, out_map in enumerate(out_maps, start=1)]
+    _write_streamed_master(keys, columns, streamed_file)
+    ws = load_workbook(streamed_file).active
+    assert ws.title == "Constructed BICC Data Master"
+    assert [[c.value for c in row] for row in ws.iter_rows()] == in_memory
+
+
+def _returns(directory):
+    """
+    A datamap and three returns in directory, with values that need cleaning
+    and values that are the same in every return.
+    """
+    datamap = os.path.join(directory, 'datamap.csv')
+    with open(datamap, 'w') as f:
+        f.write("cell_key,template_sheet,cell_reference\n"
+                "Project/Programme Name,Summary,B5\n"
+                "SRO Sign-Off,Summary,C15\n"
+                "DCA,Summary,C16\n"
+                "Total Forecast,Finance & Benefits,E11\n")
+    returns_dir = os.path.join(directory, 'returns')
+    os.makedirs(returns_dir)
+    for n in range(3):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Summary'
+        ws['B5'] = 'PROJECT, {}'.format(n)
+        ws['C15'] = '20/06/2017'
+        ws['C16'] = 'Amber, Green'
+        wb.create_sheet('Finance & Benefits')['E11'] = 10.5 * n
+        wb.save(os.path.join(returns_dir, 'return_{}.xlsx'.format(n)))
+    return returns_dir, datamap
+
+
+def test_clean_cache_counts_include_worker_processes(tmpdir):
+    returns_dir, datamap = _returns(str(tmpdir))
+    files = compile_module._return_files(returns_dir)
+    compiled = CompiledDatamap.from_csv(datamap)
+    counts = {}
+    for jobs in [1, 2]:
+        with cleaning_cache(100) as cache:
+            list(compile_module._parsed_returns(files, compiled, jobs))
+            counts[jobs] = cache.hits + cache.misses
+    assert clean_cache() is None
+    # every string value in every return is cleaned once
+    assert counts[1] == counts[2] == 9
+
+
+def test_compile_jobs_match_serial(tmpdir, monkeypatch):
+    returns_dir, datamap = _returns(str(tmpdir))
+    monkeypatch.setattr(compile_module, 'RETURNS_DIR', returns_dir)
+    monkeypatch.setattr(compile_module, 'DATAMAP_RETURN_TO_MASTER', datamap)
+
+    def compiled(jobs):
+        output_dir = tmpdir.mkdir('output_{}'.format(jobs))
+        monkeypatch.setattr(compile_module, 'OUTPUT_DIR', str(output_dir))
+        run(jobs=jobs)
+        wb = load_workbook(os.path.join(str(output_dir), 'compiled_master_{}_{}.xlsx'.format(
+            compile_module.TODAY, q_string)))
+        return [[cell.value for cell in column] for column in wb.active.iter_cols()]
+
+    serial = compiled(1)
+    assert [column[0] for column in serial[1:]] == ['PROJECT 0', 'PROJECT 1', 'PROJECT 2']
+    assert compiled(2) == serial
@@ -0,0 +1,35 @@
+from openpyxl import Workbook
+
+from ..analysers.financial import _calc_quarter_totals, _financial_data
+from ..core import Master, Quarter
+
+KEYS = ['RDEL Total Forecast', 'CDEL Total Forecast']
+
+
+def _master(path, quarter, columns):
+    wb = Workbook()
+    ws = wb.active
+    for row, key in enumerate(['Project/Programme Name'] + KEYS, start=1):
+        ws.cell(row=row, column=1, value=key)
+    for col, values in enumerate(columns, start=2):
+        for row, value in enumerate(values, start=1):
+            ws.cell(row=row, column=col, value=value)
+    wb.save(str(path))
+    return Master(quarter, str(path))
+
+
+def test_financial_totals_mask_non_numbers(tmpdir):
+    q1 = _master(tmpdir.join('master_1_2017.xlsx'), Quarter(1, 2017),
+                 [['P1', 10, 'TBC'], ['P2', 2.5, 4]])
+    q2 = _master(tmpdir.join('master_2_2017.xlsx'), Quarter(2, 2017),
+                 [['P1', None, 1.005]])
+    pulled, values = _financial_data(['P1', 'P2'], [q1, q2], KEYS)
+    assert pulled['P1', 0] == [10, 'TBC']
+    assert ('P2', 1) not in pulled
+    assert values.shape == (2, 2, 2)
+    assert values.mask[0, 0].tolist() == [False, True]
+    assert values.mask[1, 1].all()
+    totals = _calc_quarter_totals(values, [q1, q2])
+    assert totals[1] == [12.5, 4]
+    assert totals[2] == [0, 1.0]
+    assert totals[3] == [0, 0]
@@ -0,0 +1,37 @@
+import os
+
+from openpyxl import load_workbook
+
+from ..analysers import keyword
+from ..analysers.keyword import KeyIndex, search_master
+from ..utils import project_data_from_master
+
+
+def test_key_index_search():
+    keys = ['SRO Full Name', 'SRO Tenure Start Date', None, 'Overall RAG', 'SRO Full Name', 'RAG']
+    index = KeyIndex(keys)
+    assert index.search('SRO') == ['SRO Full Name', 'SRO Tenure Start Date']
+    assert index.search('RAG') == ['Overall RAG', 'RAG']
+    assert index.search('Full Name') == ['SRO Full Name']
+    assert index.search('e') == ['SRO Full Name', 'SRO Tenure Start Date', 'Overall RAG']
+    assert index.search('Not there') == []
+
+
+def test_search_master_matches_scan(master):
+    data = project_data_from_master(master)
+    results = search_master(data, ['SRO', 'RAG', 'Date'])
+    for term, projects in results.items():
+        assert [p for p, _ in projects] == list(data)
+        for project_name, found in projects:
+            expected = [item for item in data[project_name].items()
+                        if item[0] is not None and term in item[0]]
+            assert found == expected
+
+
+def test_keyword_run_to_xlsx(master, tmpdir):
+    output = os.path.join(str(tmpdir), 'keyword.xlsx')
+    keyword.run(user_provided_master_path=master, search_term=['SRO Full', 'Quarter Joined'], xlsx=[output])
+    wb = load_workbook(output)
+    assert wb.sheetnames == ['Results for SRO Full', 'Results for Quarter Joined']
+    assert [c.value for c in wb['Results for SRO Full'][1]] == [
+        'PROJECT/PROGRAMME NAME 1', 'SRO Full Name', 'SRO FULL NAME 1']
@@ -98,3 +98,100 @@ def test_duplicate_keys_in_master(master, caplog):
     m = Master(Quarter(1, 2017), master)
     m.duplicate_keys(True)
     assert "WARNING" in caplog.text
+
+
+def test_lazy_master_matches_master(master):
+    q1_2017 = Quarter(1, 2017)
+    m = Master(q1_2017, master)
+    lazy = Master(q1_2017, master, lazy=True)
+    assert lazy.projects == m.projects
+    assert lazy._data == {}
+    p1 = lazy['PROJECT/PROGRAMME NAME 1']
+    assert list(lazy._data) == ['PROJECT/PROGRAMME NAME 1']
+    assert p1['SRO Full Name'] == 'SRO FULL NAME 1'
+    assert len(p1) == len(m['PROJECT/PROGRAMME NAME 1'])
+    assert lazy.data == m.data
+    with pytest.raises(KeyError):
+        lazy['NOT A PROJECT']
+    lazy.close()
+
+
+def test_master_cache(master, tmpdir):
+    import os
+    import shutil
+    from ..core.cache import MasterCache
+    from ..utils import project_data_from_master
+
+    path = os.path.join(str(tmpdir), 'master_copy.xlsx')
+    shutil.copy(master, path)
+    cache = MasterCache(os.path.join(str(tmpdir), 'cache'))
+    assert cache.get(path) is None
+    data = cache.project_data(path)
+    assert data == project_data_from_master(master)
+    assert cache.get(path) == data
+
+    # touched but unchanged is still a hit
+    os.utime(path, ns=(0, 0))
+    assert cache.get(path) == data
+
+    # changed is a miss
+    with open(path, 'ab') as f:
+        f.write(b'\0')
+    assert cache.get(path) is None
+
+
+def test_master_cache_is_opt_in(master, tmpdir, monkeypatch):
+    import os
+    from ..core import cache
+
+    monkeypatch.setattr(cache, 'CACHE_DIR', os.path.join(str(tmpdir), 'default'))
+    uncached = Master(Quarter(1, 2017), master)
+    assert not os.path.exists(cache.CACHE_DIR)
+
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+    cached = Master(Quarter(1, 2017), master, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == [os.path.basename(cache.MasterCache(cache_dir).cache_file(master))]
+    assert Master(Quarter(1, 2017), master, cache_dir=cache_dir).data == cached.data == uncached.data
+
+
+def _legacy_pull_keys(data, input_iter, flat=False):
+    # ProjectData.pull_keys before it was indexed
+    import unicodedata
+    from ..core.master import _convert_str_date_to_object
+    en_dash, hyphen = unicodedata.lookup('EN DASH'), unicodedata.lookup('HYPHEN-MINUS')
+    if flat is True:
+        xs = [item for item in data.items()
+              for i in input_iter if item[0].strip().replace(en_dash, hyphen) == i]
+        xs = [_convert_str_date_to_object(x) for x in xs]
+        ts = sorted(xs, key=lambda x: input_iter.index(x[0].strip().replace(en_dash, hyphen)))
+        return [item[1] for item in ts]
+    xs = [item for item in data.items() for i in input_iter if item[0] == i]
+    xs = [_convert_str_date_to_object(x) for x in xs]
+    return sorted(xs, key=lambda x: input_iter.index(x[0].replace(en_dash, hyphen)))
+
+
+def test_pull_keys_matches_legacy_pull_keys():
+    import random
+    from collections import OrderedDict
+    data = OrderedDict([
+        ('SRO Full Name', 'SRO 1'),
+        ('Total – Capital', 10),
+        ('Total - Capital', 11),
+        ('Total - Capital ', 12),
+        ('Start Date', '2017-06-20'),
+        ('Notes', None),
+    ] + [('Key {}'.format(n), n) for n in range(40)])
+    pd = ProjectData(data)
+    keys = list(data) + ['Total - Capital', 'Not a key', 'Key 3 ']
+    rng = random.Random(12)
+    for _ in range(500):
+        wanted = [rng.choice(keys) for _ in range(rng.randint(0, 8))]
+        assert pd.pull_keys(wanted, flat=True) == _legacy_pull_keys(data, wanted, flat=True)
+        try:
+            expected = _legacy_pull_keys(data, wanted)
+        except ValueError:
+            # an EN DASH key asked for without its hyphenated form
+            with pytest.raises(ValueError):
+                pd.pull_keys(wanted)
+        else:
+            assert pd.pull_keys(wanted) == expected
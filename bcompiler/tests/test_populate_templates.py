@@ -3,11 +3,13 @@ import os
 import tempfile
 from datetime import datetime
 
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
 
 import bcompiler.main as main_module
 from ..core import Quarter, Master
 from ..main import get_list_projects
+from ..process.cell import Cell
+from ..main import populate_all
 from ..main import populate_blank_bicc_form as populate
 from ..utils import project_data_from_master
 
@@ -63,3 +65,62 @@ def test_populate_date_cell(master, blank_template):
     assert ws['C15'].value == datetime(2017, 8, 10)
     # for f in glob.glob('/'.join([OUTPUT_DIR, '*_Return.xlsm'])):
     #     os.remove(f)
+
+
+def test_populate_all_jobs_match_serial(tmpdir, monkeypatch):
+    source_dir = tmpdir.mkdir('source')
+    with open(os.path.join(source_dir, 'datamap.csv'), 'w') as f:
+        f.write("cell_key,template_sheet,cell_reference\n"
+                "Project/Programme Name,Summary,B5\n"
+                "SRO Sign-Off,Summary,C15\n"
+                "Total Forecast,Finance & Benefits,E11\n")
+    template = Workbook()
+    template.active.title = 'Summary'
+    template.create_sheet('Finance & Benefits')
+    template.save(os.path.join(source_dir, 'blank.xlsm'))
+    master_file = os.path.join(tmpdir, 'master.xlsx')
+    master_wb = Workbook()
+    for row in [['Project/Programme Name', 'P1', 'P2/A', 'P3'],
+                ['SRO Sign-Off', datetime(2017, 8, 10), 'Yes', None],
+                ['Total Forecast', 10.5, 20, 'TBC']]:
+        master_wb.active.append(row)
+    master_wb.save(master_file)
+
+    monkeypatch.setattr(main_module, 'SOURCE_DIR', str(source_dir))
+    monkeypatch.setattr(main_module, 'BLANK_TEMPLATE_FN', '/blank.xlsm')
+    monkeypatch.setitem(main_module.config['Datamap'], 'name', 'datamap.csv')
+    m = Master(Quarter(3, 2017), master_file)
+
+    def populated(jobs, patch_xml=False):
+        output_dir = tmpdir.mkdir(f'output_{jobs}_{patch_xml}')
+        monkeypatch.setattr(main_module, 'OUTPUT_DIR', str(output_dir))
+        populate_all(m, jobs=jobs, patch_xml=patch_xml)
+        values = {}
+        for p in ['P1', 'P2_A', 'P3']:
+            wb = load_workbook(os.path.join(output_dir, f'{p}_{current_quarter}_Return.xlsm'))
+            values[p] = [(ws.title, c.coordinate, c.value)
+                         for ws in wb.worksheets for row in ws.iter_rows() for c in row]
+        return values
+
+    serial = populated(1)
+    # a serial run does not leave a FormWriter behind for later runs
+    assert main_module._form_writer is None
+    assert ('Summary', 'B5', 'P2/A') in serial['P2_A']
+    assert ('Summary', 'C15', datetime(2017, 8, 10)) in serial['P1']
+    assert ('Finance & Benefits', 'E11', 20) in serial['P2_A']
+    assert populated(2) == serial
+    assert populated(1, patch_xml=True) == serial
+
+
+def test_form_routes():
+    cell_map = [Cell(cell_key=key, cell_value=None, cell_reference=reference,
+                     template_sheet=sheet, bg_colour=None, fg_colour=None,
+                     number_format=None, verification_list=None)
+                for key, sheet, reference in [('Project/Programme Name', 'Summary', 'B5'),
+                                              ('Total Forecast', 'Finance & Benefits', 'E11'),
+                                              ('Project/Programme Name', 'Finance & Benefits', 'B1')]]
+    summary, routes = main_module._form_routes(cell_map)
+    assert summary == 'Summary'
+    assert [route.kind for route in routes] == [main_module.ROUTE_NAME, main_module.ROUTE_VALUE,
+                                                main_module.ROUTE_NAME_IF_MISSING]
+    assert routes[1] == ('Finance & Benefits', 'E11', 'Total Forecast', main_module.ROUTE_VALUE)
@@ -28,3 +28,21 @@ def test_rcf_chart_data_columns(master_with_quarter_year_in_filename, tmpdir):
     assert ws['C12'].value is None  # need to verify why this passes
     assert ws['D12'].value == 3
 
+
+def test_rcf_project_new_in_later_master(master_with_quarter_year_in_filename, tmpdir):
+    wb_master = load_workbook(master_with_quarter_year_in_filename)
+    wb_master.save(tmpdir.join('master_1_2017.xlsx'))
+    ws = wb_master.active
+    new_col = ws.max_column + 1
+    for row in range(1, ws.max_row + 1):
+        ws.cell(row=row, column=new_col, value=ws.cell(row=row, column=2).value)
+    ws.cell(row=1, column=new_col, value="NEW PROJECT")
+    wb_master.save(tmpdir.join('master_2_2017.xlsx'))
+    rcf_run(tmpdir, tmpdir, jobs=2)
+    wb = load_workbook(tmpdir.join('NEW_PROJECT_RCF.xlsx'))
+    ws = wb.active
+    assert ws['B3'].value is None
+    assert ws['C4'].value == "APPROVAL MM1 1"
+    assert ws['B10'].value is None
+    assert ws['B11'].value == "SOBC"
+    assert len(ws._charts) == 1
@@ -0,0 +1,68 @@
+import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from ..core import MasterSeries, Quarter
+
+
+def _master(path, keys, columns):
+    wb = Workbook()
+    ws = wb.active
+    for row, key in enumerate(keys, start=1):
+        ws.cell(row=row, column=1, value=key)
+    for col, values in enumerate(columns, start=2):
+        for row, value in enumerate(values, start=1):
+            ws.cell(row=row, column=col, value=value)
+    wb.save(str(path))
+
+
+@pytest.fixture
+def master_dir(tmpdir):
+    keys = ['Project/Programme Name', 'Total Forecast', 'SRO Full Name']
+    _master(tmpdir.join('master_1_2017.xlsx'), keys,
+            [['P1', 10, 'Jo'], ['P2', 'TBC', 'Sam']])
+    _master(tmpdir.join('master_4_2016.xlsx'), keys[:2],
+            [['P1', 8.5]])
+    _master(tmpdir.join('master_2_2017.xlsx'), keys + ['Start date'],
+            [['P1', 12, 'Jo', datetime.datetime(2017, 1, 1)], ['P3', 3, 'Al', None]])
+    tmpdir.join('notes.xlsx').write('')
+    return str(tmpdir)
+
+
+def test_quarter_equality():
+    assert Quarter(1, 2017) == Quarter(1, 2017)
+    assert Quarter(1, 2017) != Quarter(1, 2018)
+    assert Quarter(1, 2017) != "Q1 17/18"
+    assert len({Quarter(1, 2017), Quarter(1, 2017), Quarter(2, 2017)}) == 2
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_series_aligns_quarters(master_dir, jobs):
+    series = MasterSeries(master_dir, jobs=jobs)
+    assert series.quarters == [Quarter(4, 2016), Quarter(1, 2017), Quarter(2, 2017)]
+    assert series.projects == ['P1', 'P2', 'P3']
+    assert list(series['P1', 'Total Forecast'].items()) == [
+        (Quarter(4, 2016), 8.5), (Quarter(1, 2017), 10), (Quarter(2, 2017), 12)]
+    assert list(series['P2', 'SRO Full Name'].items()) == [(Quarter(1, 2017), 'Sam')]
+    assert series['P3', 'Start date'] == {Quarter(2, 2017): None}
+    assert series['P1', 'Start date'][Quarter(2, 2017)] == datetime.date(2017, 1, 1)
+    with pytest.raises(KeyError):
+        series['P4', 'Total Forecast']
+    with pytest.raises(KeyError):
+        series['P1', 'Nothing']
+
+
+def test_series_numeric_slices(master_dir):
+    series = MasterSeries(master_dir)
+    totals = series.numeric('Total Forecast')
+    assert totals.shape == (len(series.projects), len(series.quarters))
+    assert totals.sum(axis=0).tolist() == [8.5, 10, 15]
+    p2 = series.projects.index('P2')
+    assert totals.mask[p2].tolist() == [True, True, True]
+    assert series.column('Total Forecast')[p2].tolist() == [None, 'TBC', None]
+
+
+def test_series_needs_masters(tmpdir):
+    with pytest.raises(ValueError):
+        MasterSeries(str(tmpdir))
@@ -123,3 +123,44 @@ def test_swimlane_assurance_data(tmpdir, master):
     assert ws['C8'].value is None
     assert ws['C9'].value is None
     assert ws['C10'].value is None
+
+
+def test_master_block_matches_master(master):
+    from ..analysers.utils import MasterBlock, projects_in_master
+    wb = load_workbook(master)
+    ws = wb.active
+    block = MasterBlock(master, 90, 271)
+    assert len(block.projects) == projects_in_master(master)
+    for row in (1, 90, 93, 180, 271):
+        for col in range(1, ws.max_column + 2):
+            assert block.cell(row=row, column=col).value == ws.cell(row=row, column=col).value
+    with pytest.raises(IndexError):
+        block.cell(row=2, column=2)
+
+
+def test_day_offsets_match_date_lists():
+    import random
+    import numpy as np
+    from ..analysers.utils import days_ahead, days_in_window, diff_date_list
+    random.seed(15)
+    start = datetime.date(2017, 1, 1)
+    end = datetime.date(2019, 6, 30)
+    today = datetime.date(2017, 10, 1)
+    dates = [start, end, start - datetime.timedelta(days=1), end + datetime.timedelta(days=1),
+             today, today + datetime.timedelta(days=1), today + datetime.timedelta(days=364),
+             today + datetime.timedelta(days=365)]
+    dates += [start + datetime.timedelta(days=random.randint(-400, 1400)) for _ in range(500)]
+    ordinals = np.array([d.toordinal() for d in dates] + [np.nan], dtype=float)
+
+    window = diff_date_list(start, end)
+    in_window = days_in_window(ordinals, start, end)
+    ahead = days_ahead(ordinals, today, 365)
+    for d, w, a in zip(dates, in_window, ahead):
+        assert (w is np.ma.masked) == (d not in window)
+        if d in window:
+            assert w == (d - start).days
+        assert (a is np.ma.masked) == ((d - today).days not in range(1, 365))
+        if a is not np.ma.masked:
+            assert a == (d - today).days
+    assert in_window[-1] is np.ma.masked
+    assert ahead[-1] is np.ma.masked
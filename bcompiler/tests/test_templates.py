@@ -0,0 +1,245 @@
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from ..templates import TemplatePatcher, TemplatePool
+
+
+def _template(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Summary'
+    ws['A5'] = 'Project/Programme Name'
+    ws['B5'].fill = PatternFill(patternType='solid', fgColor='00fce553')
+    dv = DataValidation(type="list", formula1='"Yes,No"', allow_blank=True)
+    ws.add_data_validation(dv)
+    dv.add('B6')
+    ws.column_dimensions['B'].width = 40
+    wb.create_sheet('Finance & Benefits')['A1'] = 'Total'
+    wb.save(path)
+
+
+def _populate(wb, project):
+    wb['Summary']['B5'].value = project
+    wb['Summary']['B6'].value = 'Yes'
+    wb['Finance & Benefits']['C3'].value = datetime(2017, 6, 20)
+    wb['Finance & Benefits']['C3'].number_format = 'dd/mm/yyyy'
+
+
+def test_template_pool_copies_are_independent():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+        cells = [('Summary', 'B5'), ('Summary', 'B6'), ('Finance & Benefits', 'C3')]
+        for pool in [TemplatePool(template, cells=cells), TemplatePool(template)]:
+            first = pool.copy()
+            _populate(first, 'PROJECT 1')
+            second = pool.copy()
+            assert second['Summary']['B5'].value is None
+            assert second['Summary']['B5'].fill.fgColor.rgb == '00fce553'
+            assert second['Finance & Benefits']['C3'].value is None
+            assert pool.openpyxl_obj['Summary']['B5'].value is None
+
+
+def test_template_pool_copy_saves_as_loaded_template():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+        pool = TemplatePool(template, cells=[('Summary', 'B5'), ('Summary', 'B6'),
+                                             ('Finance & Benefits', 'C3')])
+        for project in ['PROJECT 1', 'PROJECT 2']:
+            copied = pool.copy()
+            _populate(copied, project)
+            copied.save(os.path.join(tmp, 'copied.xlsx'))
+            loaded = load_workbook(template, keep_vba=True)
+            _populate(loaded, project)
+            loaded.save(os.path.join(tmp, 'loaded.xlsx'))
+
+            with zipfile.ZipFile(os.path.join(tmp, 'copied.xlsx')) as copied_zip, \
+                    zipfile.ZipFile(os.path.join(tmp, 'loaded.xlsx')) as loaded_zip:
+                assert copied_zip.namelist() == loaded_zip.namelist()
+                for name in copied_zip.namelist():
+                    if name != 'docProps/core.xml':  # holds the time it was saved
+                        assert copied_zip.read(name) == loaded_zip.read(name), name
+
+
+def test_template_pool_copies_do_not_share_worksheet_contents():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+        pool = TemplatePool(template, cells=[('Summary', 'B5')])
+        changed = pool.copy()
+        ws = changed['Summary']
+        ws.merge_cells('C1:D1')
+        ws.data_validations.dataValidation[0].add('B7')
+        ws.add_data_validation(DataValidation(type="whole"))
+        ws.conditional_formatting.add('B5', CellIsRule(operator='equal', formula=['1'],
+                                                       fill=PatternFill(bgColor='00ff0000')))
+        changed.create_named_range('Total', ws, '$B$5')
+        changed.save(os.path.join(tmp, 'changed.xlsx'))
+        pool.copy().save(os.path.join(tmp, 'copied.xlsx'))
+
+        copied = load_workbook(os.path.join(tmp, 'copied.xlsx'))
+        ws = copied['Summary']
+        assert not ws.merged_cells.ranges
+        assert [str(dv.sqref) for dv in ws.data_validations.dataValidation] == ['B6']
+        assert not list(ws.conditional_formatting)
+        assert not copied.defined_names.definedName
+        assert load_workbook(os.path.join(tmp, 'changed.xlsx'))['Summary'].merged_cells.ranges
+
+
+def test_template_patcher_reads_back_as_populated_template():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+        patcher = TemplatePatcher(template)
+        for project in ['PROJECT 1', 'PROJECT 2']:
+            patched = patcher.copy()
+            _populate(patched, project)
+            patched.save(os.path.join(tmp, 'patched.xlsx'))
+            loaded = load_workbook(template)
+            _populate(loaded, project)
+            loaded.save(os.path.join(tmp, 'loaded.xlsx'))
+
+            patched_wb = load_workbook(os.path.join(tmp, 'patched.xlsx'))
+            loaded_wb = load_workbook(os.path.join(tmp, 'loaded.xlsx'))
+            assert patched_wb.sheetnames == loaded_wb.sheetnames
+            for title in loaded_wb.sheetnames:
+                assert patched_wb[title].dimensions == loaded_wb[title].dimensions
+                for p_row, l_row in zip(patched_wb[title].iter_rows(),
+                                        loaded_wb[title].iter_rows()):
+                    for p_cell, l_cell in zip(p_row, l_row):
+                        assert p_cell.value == l_cell.value, p_cell.coordinate
+                        assert p_cell.number_format == l_cell.number_format
+                        assert p_cell.fill.patternType == l_cell.fill.patternType
+                        assert p_cell.fill.fgColor.rgb == l_cell.fill.fgColor.rgb
+            assert patched_wb['Summary']['B5'].value == project
+            assert patched_wb['Finance & Benefits']['C3'].value == datetime(2017, 6, 20)
+
+
+def test_template_patcher_leaves_other_parts_unchanged():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+        patched = TemplatePatcher(template).copy()
+        patched['Summary']['B5'].value = 'PROJECT 1'
+        patched.save(os.path.join(tmp, 'patched.xlsx'))
+        with zipfile.ZipFile(template) as template_zip, \
+                zipfile.ZipFile(os.path.join(tmp, 'patched.xlsx')) as patched_zip:
+            assert sorted(patched_zip.namelist()) == sorted(template_zip.namelist())
+            changed = [name for name in template_zip.namelist()
+                       if template_zip.read(name) != patched_zip.read(name)]
+            assert patched_zip.testzip() is None
+            # the other parts are copied without being compressed again
+            for name in template_zip.namelist():
+                if name not in changed:
+                    assert (patched_zip.getinfo(name).compress_size
+                            == template_zip.getinfo(name).compress_size)
+        assert changed == ['xl/worksheets/sheet1.xml']
+
+
+def _rewrite_members(path, rewrite):
+    with zipfile.ZipFile(path) as src:
+        members = {name: src.read(name) for name in src.namelist()}
+    rewrite(members)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for name, data in members.items():
+            dst.writestr(name, data)
+
+
+def test_template_patcher_rejects_prefixed_worksheet_xml():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _template(template)
+
+        def prefix(members):
+            sheet = members['xl/worksheets/sheet1.xml']
+            sheet = re.sub(rb'<(/?)(?![?!])', rb'<\1x:', sheet)
+            members['xl/worksheets/sheet1.xml'] = sheet.replace(b' xmlns=', b' xmlns:x=', 1)
+
+        _rewrite_members(template, prefix)
+        with pytest.raises(ValueError):
+            TemplatePatcher(template)
+
+
+def _formula_template(path, shared=False):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Summary'
+    for row in range(1, 4):
+        ws.cell(row=row, column=1, value=row)
+        ws.cell(row=row, column=2, value='=A{}*2'.format(row))
+    wb.create_sheet('Finance & Benefits')['A1'] = 'Total'
+    wb.save(path)
+    if shared:
+        # openpyxl does not write shared formulas, but Excel does when a
+        # formula is filled down
+        def share(members):
+            sheet = members['xl/worksheets/sheet1.xml']
+            sheet = sheet.replace(b'<f>A1*2</f>', b'<f t="shared" ref="B1:B3" si="0">A1*2</f>')
+            sheet = re.sub(rb'<f>A[23]\*2</f>', b'<f t="shared" si="0"/>', sheet)
+            members['xl/worksheets/sheet1.xml'] = sheet
+
+        _rewrite_members(path, share)
+
+
+def test_template_patcher_overwrites_formula_without_calc_chain():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _formula_template(template)
+        form = TemplatePatcher(template).copy()
+        form['Summary']['B2'].value = 'PROJECT 1'
+        form.save(os.path.join(tmp, 'patched.xlsx'))
+        ws = load_workbook(os.path.join(tmp, 'patched.xlsx'))['Summary']
+        assert [ws['B1'].value, ws['B2'].value, ws['B3'].value] == ['=A1*2', 'PROJECT 1', '=A3*2']
+
+
+def test_template_patcher_overwrites_shared_formula():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _formula_template(template, shared=True)
+        form = TemplatePatcher(template).copy()
+        form['Summary']['B1'].value = 'PROJECT 1'
+        form.save(os.path.join(tmp, 'patched.xlsx'))
+        ws = load_workbook(os.path.join(tmp, 'patched.xlsx'))['Summary']
+        assert [ws['B1'].value, ws['B2'].value, ws['B3'].value] == ['PROJECT 1', '=A2*2', '=A3*2']
+
+
+def test_template_patcher_drops_calc_chain():
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.xlsx')
+        _formula_template(template)
+
+        def add_calc_chain(members):
+            members['xl/calcChain.xml'] = (
+                b'<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<c r="B1" i="1"/><c r="B2"/><c r="B3"/></calcChain>')
+            members['[Content_Types].xml'] = members['[Content_Types].xml'].replace(
+                b'</Types>', b'<Override PartName="/xl/calcChain.xml" ContentType="application/'
+                b'vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/></Types>')
+            members['xl/_rels/workbook.xml.rels'] = members['xl/_rels/workbook.xml.rels'].replace(
+                b'</Relationships>', b'<Relationship Id="rIdCalc" Target="calcChain.xml" Type="http://'
+                b'schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain"/>'
+                b'</Relationships>')
+
+        _rewrite_members(template, add_calc_chain)
+        form = TemplatePatcher(template).copy()
+        form['Summary']['B2'].value = 'PROJECT 1'
+        form.save(os.path.join(tmp, 'patched.xlsx'))
+        with zipfile.ZipFile(os.path.join(tmp, 'patched.xlsx')) as patched_zip:
+            names = patched_zip.namelist()
+            assert len(names) == len(set(names))
+            assert 'xl/calcChain.xml' not in names
+            assert b'calcChain' not in patched_zip.read('[Content_Types].xml')
+            assert b'calcChain' not in patched_zip.read('xl/_rels/workbook.xml.rels')
+        ws = load_workbook(os.path.join(tmp, 'patched.xlsx'))['Summary']
+        assert [ws['B1'].value, ws['B2'].value, ws['B3'].value] == ['=A1*2', 'PROJECT 1', '=A3*2']
@@ -4,7 +4,9 @@ import fnmatch
 import logging
 import os
 import sys
+import time
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime
 from math import isclose
 
@@ -12,7 +14,8 @@ from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill
 from openpyxl.utils import quote_sheetname
 
-from .process.cleansers import Cleanser
+from .process.cleansers import clean_many
+from .process.extract import ReturnExtractor
 
 logger = logging.getLogger("bcompiler.utils")
 
@@ -52,27 +55,29 @@ def directory_has_returns_check(dir: str):
 
 
 def row_check(excel_file: str):
-    wb = load_workbook(excel_file)
-    data = []
-    for sheet in wb.sheetnames:
-        ws = wb[sheet]
-        rows = ws.rows
-        data.append(
+    """
+    The number of rows in each sheet of excel_file, as a list of dicts with
+    workbook, sheet and row_count keys. The counts are read from the sheets'
+    XML (see ReturnExtractor.row_count) rather than by loading the workbook.
+    """
+    with ReturnExtractor(excel_file) as extractor:
+        return [
             dict(
                 workbook=excel_file.split("/")[-1],
                 sheet=sheet,
-                row_count=len(list(rows)),
-            ))
-    return data
+                row_count=extractor.row_count(sheet),
+            ) for sheet in extractor.sheet_names
+        ]
 
 
-def row_data_formatter(csv_output=False, quiet=False) -> None:
+def row_data_formatter(csv_output=False, quiet=False, jobs=1) -> None:
     """
     Prints counts of rows in each sheet in each return spreadsheet.
     :param: csv_output - provide True to write output to csv file in output
     directory.
     :param: quiet - output differing row counts only. Cannot be used with
     csv_output argument.
+    :param: jobs - number of processes used to count the rows in the returns.
     """
     if csv_output and quiet:
         logger.critical("Cannot use --csv and --quiet option. Choose one"
@@ -111,44 +116,55 @@ def row_data_formatter(csv_output=False, quiet=False) -> None:
                 f"{line['workbook']:<90}{line['sheet']:<40}{line['row_count']:<10}"
             )
     print("{:#<150}".format(""))
+    start = time.perf_counter()
+    returns = []
     for f in os.listdir(returns_dir):
         if fnmatch.fnmatch(f, "*.xlsm"):
-            d = row_check(os.path.join(returns_dir, f))
-            zipped_data = zip(tmpl_data, d)
-            for line in zipped_data:
-                counts = [i["row_count"] for i in line]
-                flag = counts[0] != counts[-1]
-                if not flag:
-                    if csv_output:
-                        csv_writer.writerow([
-                            line[1]["workbook"],
-                            line[1]["sheet"],
-                            line[1]["row_count"],
-                        ])
-                    elif quiet:
-                        pass
-                    else:
-                        print(
-                            f"{line[1]['workbook']:<90}{line[1]['sheet']:<40}{line[1]['row_count']:<10}"
-                        )
+            returns.append(os.path.join(returns_dir, f))
+        else:
+            logger.critical(f"{f} does not have .xlsm file extension.")
+    if jobs > 1 and len(returns) > 1:
+        logger.info(f"Counting rows in {len(returns)} returns using {jobs} processes")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            counted = list(executor.map(row_check, returns))
+    else:
+        counted = map(row_check, returns)
+    for d in counted:
+        zipped_data = zip(tmpl_data, d)
+        for line in zipped_data:
+            counts = [i["row_count"] for i in line]
+            flag = counts[0] != counts[-1]
+            if not flag:
+                if csv_output:
+                    csv_writer.writerow([
+                        line[1]["workbook"],
+                        line[1]["sheet"],
+                        line[1]["row_count"],
+                    ])
+                elif quiet:
+                    pass
                 else:
-                    if csv_output:
-                        csv_writer.writerow([
-                            line[1]["workbook"],
-                            line[1]["sheet"],
-                            line[1]["row_count"],
-                            "INCONSISTENT WITH bicc_template.xlsm",
-                        ])
-                    else:
-                        print(
-                            f"{line[1]['workbook']:<90}{line[1]['sheet']:<40}{line[1]['row_count']:<10} *"
-                        )
-            if not quiet:
-                print("{:#<150}".format(""))
+                    print(
+                        f"{line[1]['workbook']:<90}{line[1]['sheet']:<40}{line[1]['row_count']:<10}"
+                    )
             else:
-                print(".")
+                if csv_output:
+                    csv_writer.writerow([
+                        line[1]["workbook"],
+                        line[1]["sheet"],
+                        line[1]["row_count"],
+                        "INCONSISTENT WITH bicc_template.xlsm",
+                    ])
+                else:
+                    print(
+                        f"{line[1]['workbook']:<90}{line[1]['sheet']:<40}{line[1]['row_count']:<10} *"
+                    )
+        if not quiet:
+            print("{:#<150}".format(""))
         else:
-            logger.critical(f"{f} does not have .xlsm file extension.")
+            print(".")
+    logger.info(f"Counted rows in {len(returns)} returns in "
+                f"{time.perf_counter() - start:.2f}s")
     if csv_output:
         print(f"csv output file available at {csv_output_path}")
         csv_output_file.close()
@@ -241,12 +257,11 @@ def project_data_from_master(master_file: str, opened_wb=False):
         wb = master_file
         ws = wb.active
     # cleanse the keys
-    for cell in ws["A"]:
+    keys = clean_many(cell.value for cell in ws["A"])
+    for cell, key in zip(ws["A"], keys):
         # we don't want to clean None...
-        if cell.value is None:
-            continue
-        c = Cleanser(cell.value)
-        cell.value = c.clean()
+        if cell.value is not None:
+            cell.value = key
     p_dict = {}
     for col in ws.iter_cols(min_col=2):
         project_name = ""
@@ -256,7 +271,7 @@ def project_data_from_master(master_file: str, opened_wb=False):
                 project_name = cell.value
                 p_dict[project_name] = o
             else:
-                val = ws.cell(row=cell.row, column=1).value
+                val = keys[cell.row - 1]
                 if type(cell.value) == datetime:
                     d_value = date(cell.value.year, cell.value.month,
                                    cell.value.day)
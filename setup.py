@@ -55,5 +55,5 @@ setup(
         'bcompiler = bcompiler.main:main',
         'bcompiler-init = bcompiler.process.bootstrap:main',
     ]},
-    install_requires=['openpyxl == 2.6.2', 'python-dateutil', 'colorlog'],
+    install_requires=['openpyxl == 2.6.2', 'python-dateutil', 'colorlog', 'numpy'],
     test_suite='bcompiler.tests')